@@ -1,16 +1,25 @@
+import os
 from flask import Flask
-from config import Config
+from config import configs, engine_options
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from app.json_provider import create_json_provider
 
 app = Flask(__name__)
-app.config.from_object(Config)
+app_env = os.getenv('APP_ENV', 'development')
+if app_env not in configs:
+    raise ValueError(f"Unknown APP_ENV '{app_env}', expected one of: {', '.join(configs)}")
+app.config.from_object(configs[app_env])
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+app.json = create_json_provider(app)
 db = SQLAlchemy(app)
 migrate = Migrate(app, db=db)
 
 
 from app import routes
 from app import models
+from app import duplicates
+from app import pool_metrics
 
 # Create tables from models
 with app.app_context():
@@ -0,0 +1,87 @@
+import json
+import time
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+from werkzeug.exceptions import HTTPException
+from app import app
+from app.metrics import RECEIVED_AT
+from app.routes.quizzes import parse_quiz_request, PREGENERATED_QUESTIONS
+from quiz_generator.question_generator import generate_questions_async
+
+# ASGI entry point, for serving the app with an async server: uvicorn app.asgi:asgi_app (see SERVER_MODE in entrypoint.sh)
+# Flask handles every request on a pool of ASGI_THREADS threads, except that requests to create a quiz (without async,
+# stream or reuse) first generate their questions on the event loop with generate_questions_async, and are only passed
+# to Flask to save the quiz. So however many requests are waiting for the generator, they don't hold a thread or
+# a database connection, and other requests are not queued behind them like they are with gunicorn's sync workers
+# The database is still used through Flask-SQLAlchemy's sync session in the threads: its queries take milliseconds,
+# while a call to the generator takes seconds
+wsgi_app = WSGIMiddleware(app, workers=app.config['ASGI_THREADS'])
+url_adapter = app.url_map.bind('localhost')
+
+
+async def asgi_app(scope, receive, send):
+    if scope['type'] == 'http':
+        scope = {**scope, RECEIVED_AT: time.perf_counter()}
+        if endpoint(scope) == 'create_quiz':
+            receive = await pregenerate_questions(scope, receive)
+    await wsgi_app(scope, receive, send)
+
+
+def endpoint(scope) -> str:
+    try:
+        return url_adapter.match(scope['path'], method=scope['method'])[0]
+    except HTTPException:
+        return None
+
+
+# Read the body of a request to create a quiz and generate its questions, storing them (or the error) in the scope
+# Requests that create_quiz will reject, or that don't generate all of their questions at once, are passed on unchanged
+# Returns a receive function that replays the body to Flask
+async def pregenerate_questions(scope, receive):
+    body = await read_body(receive)
+    args = parse_qs(scope['query_string'].decode('latin1'))
+    if is_json(scope) and not any(args.get(name, ['false'])[0].lower() == 'true' for name in ['async', 'stream', 'reuse']):
+        try:
+            quiz_data = json.loads(body)
+        except ValueError:
+            quiz_data = None
+        if isinstance(quiz_data, dict):
+            (subject, question_count, choice_count), error = parse_quiz_request(quiz_data)
+            if error is None:
+                try:
+                    scope[PREGENERATED_QUESTIONS] = await generate_questions_async(
+                        subject=subject, question_count=question_count, choice_count=choice_count)
+                except Exception as error:
+                    scope[PREGENERATED_QUESTIONS] = error
+
+    body_sent = False
+
+    async def replay_receive():
+        nonlocal body_sent
+        if body_sent:
+            return await receive()
+        body_sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return replay_receive
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+# Whether Flask's request.get_json() will parse the body
+def is_json(scope) -> bool:
+    for name, value in scope.get('headers', []):
+        if name == b'content-type':
+            mimetype = value.decode('latin1').split(';')[0].strip().lower()
+            return mimetype == 'application/json' or mimetype.startswith('application/') and mimetype.endswith('+json')
+    return False
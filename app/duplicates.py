@@ -0,0 +1,81 @@
+import click
+from itertools import groupby
+from sqlalchemy import select, update, func
+from app import app, db
+from app.models import Question, QuestionSignature, QuestionBucket, index_questions
+from quiz_generator import dedup
+
+
+# Index the questions that have no signature yet (e.g. questions added before signatures were stored), batch_size at a time
+def index_missing_questions(batch_size: int = 1000) -> int:
+    indexed_count = 0
+    while True:
+        questions = db.session.execute(
+            select(Question.id, Question.text)
+            .outerjoin(QuestionSignature, QuestionSignature.question_id == Question.id)
+            .where(QuestionSignature.question_id.is_(None)).order_by(Question.id).limit(batch_size)).all()
+        if not questions:
+            return indexed_count
+        index_questions(questions)
+        db.session.commit()
+        indexed_count += len(questions)
+
+
+# Group all near-duplicate questions into clusters and point each question to the earliest question of its cluster
+# Only questions that share a bucket are compared, and each one only with the earliest member of each cluster in the bucket
+# Returns the number of clusters and the number of questions that are near-duplicates of another question
+def cluster_duplicates() -> dict:
+    shared_buckets = select(QuestionBucket.bucket).group_by(QuestionBucket.bucket).having(func.count() > 1)
+    signatures = {question_id: dedup.unpack_signature(signature) for question_id, signature in db.session.execute(
+        select(QuestionSignature.question_id, QuestionSignature.signature).where(QuestionSignature.question_id.in_(
+            select(QuestionBucket.question_id).where(QuestionBucket.bucket.in_(shared_buckets)))))}
+
+    # Union-find over question ids, where the root of each cluster is its earliest question
+    parents = {}
+
+    def find(question_id: int) -> int:
+        root = question_id
+        while parents.get(root, root) != root:
+            root = parents[root]
+        while question_id != root:
+            parents[question_id], question_id = root, parents.get(question_id, root)
+        return root
+
+    rows = db.session.execute(
+        select(QuestionBucket.bucket, QuestionBucket.question_id).where(QuestionBucket.bucket.in_(shared_buckets))
+        .order_by(QuestionBucket.bucket, QuestionBucket.question_id))
+    for _, bucket_rows in groupby(rows, key=lambda row: row.bucket):
+        representatives = []
+        for _, question_id in bucket_rows:
+            for representative in representatives:
+                if dedup.similarity(signatures[question_id], signatures[representative]) >= dedup.DUPLICATE_THRESHOLD:
+                    a, b = find(question_id), find(representative)
+                    parents[max(a, b)] = min(a, b)
+                    break
+            else:
+                representatives.append(question_id)
+
+    canonical_ids = {question_id: find(question_id) for question_id in signatures if find(question_id) != question_id}
+    current_ids = dict(db.session.execute(
+        select(Question.id, Question.canonical_id).where(Question.canonical_id.is_not(None))).all())
+    changes = [{'id': question_id, 'canonical_id': canonical_ids.get(question_id)}
+               for question_id in current_ids.keys() | canonical_ids.keys()
+               if current_ids.get(question_id) != canonical_ids.get(question_id)]
+    if changes:
+        db.session.execute(update(Question), changes)
+
+    return {
+        'clusters': len(set(canonical_ids.values())),
+        'duplicates': len(canonical_ids)
+    }
+
+
+@app.cli.command('cluster-duplicates')
+@click.option('--batch-size', default=1000, help='Number of questions to index at a time')
+def cluster_duplicates_command(batch_size: int):
+    """Index all questions for near-duplicate detection and group the near-duplicates by canonical_id."""
+    indexed_count = index_missing_questions(batch_size)
+    result = cluster_duplicates()
+    db.session.commit()
+    click.echo(f"Indexed {indexed_count} questions, "
+               f"found {result['duplicates']} near-duplicates in {result['clusters']} clusters")
@@ -0,0 +1,72 @@
+import threading
+from cachetools import TTLCache
+from sqlalchemy import select, and_
+from app import app, db
+from app.models import Choice, Question
+
+# Answer keys map each question_id of a quiz to the ids of its correct choices (none if it has no correct choice)
+# Quizzes don't change after they are created, so a quiz's answer key is loaded once and kept until the quiz is deleted
+# The TTL bounds how long another server process can keep the answer key of a deleted quiz
+
+
+class AnswerKeyCache(object):
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.keys = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    # Get the answer keys of the given quizzes, loading the ones that aren't cached with a single query
+    def get_many(self, quiz_ids) -> dict[int, dict[int, frozenset]]:
+        with self.lock:
+            answer_keys = {quiz_id: self.keys[quiz_id] for quiz_id in quiz_ids if quiz_id in self.keys}
+
+        missing_quiz_ids = set(quiz_ids) - answer_keys.keys()
+        if missing_quiz_ids:
+            loaded_keys = {quiz_id: {} for quiz_id in missing_quiz_ids}
+            # Questions without a correct choice are in the answer key too, with no choice ids
+            for quiz_id, question_id, choice_id in db.session.execute(
+                    select(Question.quiz_id, Question.id, Choice.id)
+                    .outerjoin(Choice, and_(Choice.question_id == Question.id, Choice.correct))
+                    .where(Question.quiz_id.in_(missing_quiz_ids))):
+                choice_ids = loaded_keys[quiz_id].setdefault(question_id, set())
+                if choice_id is not None:
+                    choice_ids.add(choice_id)
+
+            loaded_keys = {quiz_id: {question_id: frozenset(choice_ids) for question_id, choice_ids in answer_key.items()}
+                           for quiz_id, answer_key in loaded_keys.items()}
+            with self.lock:
+                self.keys.update(loaded_keys)
+            answer_keys.update(loaded_keys)
+
+        return answer_keys
+
+    def get(self, quiz_id: int) -> dict[int, frozenset]:
+        return self.get_many([quiz_id])[quiz_id]
+
+    def invalidate(self, quiz_id: int) -> None:
+        with self.lock:
+            self.keys.pop(quiz_id, None)
+
+    def invalidate_all(self) -> None:
+        with self.lock:
+            self.keys.clear()
+
+
+answer_keys = AnswerKeyCache(maxsize=app.config['ANSWER_KEY_CACHE_SIZE'], ttl=app.config['ANSWER_KEY_CACHE_TTL'])
+
+
+# Grade answers, given as (question_id, choice_id) pairs, against an answer key without querying the database
+# choice_id is None for questions that were not answered
+def grade_answers(answer_key: dict[int, frozenset], answers: list[tuple[int, int]]) -> dict:
+    questions = [{
+        'question_id': question_id,
+        'choice_id': choice_id,
+        'correct': choice_id in answer_key.get(question_id, ()),
+        'correct_choice_ids': sorted(answer_key.get(question_id, ()))
+    } for question_id, choice_id in answers]
+
+    return {
+        'questions': questions,
+        'answered_count': sum(1 for question in questions if question['choice_id'] is not None),
+        'correct_count': sum(1 for question in questions if question['correct']),
+        'question_count': len(answer_key)
+    }
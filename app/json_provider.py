@@ -0,0 +1,41 @@
+from flask.json.provider import DefaultJSONProvider
+
+# orjson serializes much faster than the json module, so it is used when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Serializes with orjson, producing the same JSON as DefaultJSONProvider: keys are sorted, output is indented in debug
+# mode, and dates and other types that orjson handles differently are passed to DefaultJSONProvider.default
+class OrjsonProvider(DefaultJSONProvider):
+    def options(self, indent: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        # Fall back to the json module for arguments that orjson has no option for
+        if set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options(bool(kwargs.get('indent')))).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    # Build the response body directly as bytes instead of encoding a str
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self.options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def create_json_provider(app) -> DefaultJSONProvider:
+    return OrjsonProvider(app) if orjson is not None else DefaultJSONProvider(app)
@@ -0,0 +1,149 @@
+import click
+from datetime import date, timedelta
+from sqlalchemy import select, delete, insert, func, case, tuple_
+from app import app, db
+from app.models import Quiz, QuizAttempt, UserStat, UserSubjectStat
+
+
+# Lengths of the streak ending on the last of the given days and of the longest streak, given distinct days in order
+def streaks(days: list[date]) -> tuple[int, int]:
+    current_streak = best_streak = 0
+    previous_day = None
+    for day in days:
+        current_streak = current_streak + 1 if previous_day and (day - previous_day).days == 1 else 1
+        best_streak = max(best_streak, current_streak)
+        previous_day = day
+    return current_streak, best_streak
+
+
+# Recompute the leaderboard stats of the given users (or of all users if user_ids is None) from their attempts, without committing
+# Attempts are aggregated by user, subject and day in the database, so this reads one row per day on which a user made attempts
+# Used for backfilling and after deletions; saved attempts are applied to the stored stats by record_attempts instead
+def refresh_leaderboard(user_ids=None):
+    criteria = [QuizAttempt.user_id.is_not(None)]
+    if user_ids is not None:
+        user_ids = set(user_ids) - {None}
+        if not user_ids:
+            return
+        criteria.append(QuizAttempt.user_id.in_(user_ids))
+
+    score = case((Quiz.question_count > 0, QuizAttempt.correct_count * 100.0 / Quiz.question_count), else_=0.0)
+    day = func.date(QuizAttempt.timestamp)
+    rows = db.session.execute(
+        select(QuizAttempt.user_id, Quiz.subject, day, func.count(), func.max(score), func.sum(score))
+        .join(Quiz, Quiz.id == QuizAttempt.quiz_id)
+        .where(*criteria).group_by(QuizAttempt.user_id, Quiz.subject, day).order_by(day))
+
+    user_stats, subject_stats = {}, {}
+    for user_id, subject, attempt_day, attempt_count, best_score, total_score in rows:
+        # SQLite returns dates as strings
+        attempt_day = attempt_day if isinstance(attempt_day, date) else date.fromisoformat(attempt_day)
+        for stats in (user_stats.setdefault(user_id, {'user_id': user_id}),
+                      subject_stats.setdefault((user_id, subject), {'user_id': user_id, 'subject': subject})):
+            stats['attempt_count'] = stats.get('attempt_count', 0) + attempt_count
+            stats['best_score'] = max(stats.get('best_score', 0), best_score)
+            stats['total_score'] = stats.get('total_score', 0) + total_score
+            if stats.get('days', [None])[-1] != attempt_day:
+                stats.setdefault('days', []).append(attempt_day)
+
+    stats_rows = {UserStat: list(user_stats.values()), UserSubjectStat: list(subject_stats.values())}
+    for model, model_rows in stats_rows.items():
+        for stats in model_rows:
+            days = stats.pop('days')
+            stats['average_score'] = stats.pop('total_score') / stats['attempt_count']
+            stats['current_streak'], stats['best_streak'] = streaks(days)
+            stats['last_attempt_date'] = days[-1]
+
+        db.session.execute(delete(model).where(model.user_id.in_(user_ids)) if user_ids is not None else delete(model))
+        if model_rows:
+            db.session.execute(insert(model), model_rows)
+
+
+# Score of an attempt as a percentage, like the score computed by refresh_leaderboard
+def attempt_score(correct_count: int, question_count: int) -> float:
+    return correct_count * 100.0 / question_count if question_count > 0 else 0.0
+
+
+# Apply saved attempts to the stored leaderboard stats of their users, without committing or reading their other attempts
+# New attempts are added to the counts, scores and streaks; existing attempts whose answers changed (previous_correct_counts
+# has their correct_count before the change) only change the scores
+# Users for whom the stored stats aren't enough are recomputed by refresh_leaderboard instead: when a score went down
+# (which may lower their best_score) or a new attempt is dated before their last attempt
+def record_attempts(quiz_attempts: list[QuizAttempt], previous_correct_counts: dict[int, int]):
+    # An attempt can be in more than one submission
+    quiz_attempts = list({quiz_attempt.id: quiz_attempt for quiz_attempt in quiz_attempts
+                          if quiz_attempt.user_id is not None}.values())
+    if not quiz_attempts:
+        return
+    quizzes = {quiz_id: (subject, question_count) for quiz_id, subject, question_count in db.session.execute(
+        select(Quiz.id, Quiz.subject, Quiz.question_count)
+        .where(Quiz.id.in_({quiz_attempt.quiz_id for quiz_attempt in quiz_attempts})))}
+    # Attempts of deleted quizzes aren't counted
+    # New attempts are applied in order, and the timestamps of existing attempts (as read from the database) aren't
+    # compared with theirs, since they may be naive
+    quiz_attempts = sorted((quiz_attempt for quiz_attempt in quiz_attempts if quiz_attempt.quiz_id in quizzes),
+                           key=lambda quiz_attempt: (quiz_attempt.id in previous_correct_counts, quiz_attempt.timestamp))
+
+    user_ids = {quiz_attempt.user_id for quiz_attempt in quiz_attempts}
+    keys = {(quiz_attempt.user_id, quizzes[quiz_attempt.quiz_id][0]) for quiz_attempt in quiz_attempts}
+    stored_stats = {
+        **{(UserStat, stats.user_id): stats for stats in db.session.scalars(
+            select(UserStat).where(UserStat.user_id.in_(user_ids)))},
+        **{(UserSubjectStat, stats.user_id, stats.subject): stats for stats in db.session.scalars(
+            select(UserSubjectStat).where(tuple_(UserSubjectStat.user_id, UserSubjectStat.subject).in_(keys)))}
+    }
+
+    changes = []  # (user_id, stats keys, day of a new attempt or None, score, previous score or None)
+    recomputed_user_ids = set()
+    for quiz_attempt in quiz_attempts:
+        subject, question_count = quizzes[quiz_attempt.quiz_id]
+        stats_keys = [(UserStat, quiz_attempt.user_id), (UserSubjectStat, quiz_attempt.user_id, subject)]
+        score = attempt_score(quiz_attempt.correct_count, question_count)
+        if quiz_attempt.id in previous_correct_counts:
+            previous_score = attempt_score(previous_correct_counts[quiz_attempt.id], question_count)
+            if score < previous_score or any(key not in stored_stats for key in stats_keys):
+                recomputed_user_ids.add(quiz_attempt.user_id)
+            changes.append((quiz_attempt.user_id, stats_keys, None, score, previous_score))
+        else:
+            day = quiz_attempt.timestamp.date()
+            if any(key in stored_stats and day < stored_stats[key].last_attempt_date for key in stats_keys):
+                recomputed_user_ids.add(quiz_attempt.user_id)
+            changes.append((quiz_attempt.user_id, stats_keys, day, score, None))
+
+    for user_id, stats_keys, day, score, previous_score in changes:
+        if user_id in recomputed_user_ids:
+            continue
+        for key in stats_keys:
+            stats = stored_stats.get(key)
+            if day is None:
+                stats.average_score += (score - previous_score) / stats.attempt_count
+                stats.best_score = max(stats.best_score, score)
+            elif stats is None:
+                stats = stored_stats[key] = key[0](
+                    user_id=user_id, **({'subject': key[2]} if len(key) > 2 else {}), attempt_count=1,
+                    best_score=score, average_score=score, current_streak=1, best_streak=1, last_attempt_date=day)
+                db.session.add(stats)
+            else:
+                stats.average_score = (stats.average_score * stats.attempt_count + score) / (stats.attempt_count + 1)
+                stats.attempt_count += 1
+                stats.best_score = max(stats.best_score, score)
+                if day != stats.last_attempt_date:
+                    consecutive = day - stats.last_attempt_date == timedelta(days=1)
+                    stats.current_streak = stats.current_streak + 1 if consecutive else 1
+                    stats.best_streak = max(stats.best_streak, stats.current_streak)
+                    stats.last_attempt_date = day
+
+    if recomputed_user_ids:
+        # Leave the session without the loaded stats of these users, which are replaced by the recomputed rows
+        for key, stats in stored_stats.items():
+            if key[1] in recomputed_user_ids:
+                db.session.expunge(stats)
+        refresh_leaderboard(recomputed_user_ids)
+
+
+@app.cli.command('refresh-leaderboard')
+def refresh_leaderboard_command():
+    """Recompute the leaderboard stats of all users from their attempts."""
+    refresh_leaderboard()
+    db.session.commit()
+    click.echo('Recomputed the leaderboard stats')
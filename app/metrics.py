@@ -0,0 +1,201 @@
+import time
+import threading
+from bisect import bisect_left
+from flask import request, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+from app.pool_metrics import pool_stats
+from quiz_generator.question_generator import generation_cache, backend_call_observers
+
+# Request latency, the SQL statements that each request runs and the latency of calls to the question generator are
+# recorded in the memory of the server process and exposed in the Prometheus text format at /metrics
+# With several server processes (e.g. gunicorn workers), each one only reports its own requests, so Prometheus should
+# scrape each process, or the values should be summed across them
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+GENERATOR_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# The ASGI server (app/asgi.py) stores when it received each request in the ASGI scope under this key
+RECEIVED_AT = 'quiz_api.received_at'
+
+
+# A set of Prometheus histograms with the same buckets, one for each combination of label values
+class Histogram(object):
+    def __init__(self, name: str, description: str, label_names: tuple, buckets: tuple) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}  # label values -> [count of each bucket, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((label_values, [list(bucket_counts), total, count])
+                            for label_values, (bucket_counts, total, count) in self.series.items())
+        for label_values, (bucket_counts, total, count) in series:
+            labels = format_labels(self.label_names, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+# A set of Prometheus counters, one for each combination of label values
+class Counter(object):
+    def __init__(self, name: str, description: str, label_names: tuple) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def increment(self, label_values: tuple, amount: float = 1) -> None:
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = sorted(self.series.items())
+        lines += [f'{self.name}{{{format_labels(self.label_names, label_values)}}} {value}'
+                  for label_values, value in series]
+        return lines
+
+
+def format_labels(label_names: tuple, label_values: tuple) -> str:
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(label_names, label_values))
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_gauges(name: str, description: str, values: dict, label_name: str) -> list[str]:
+    return [f'# HELP {name} {description}', f'# TYPE {name} gauge'] + [
+        f'{name}{{{label_name}="{escape_label(label_value)}"}} {value}' for label_value, value in values.items()]
+
+
+request_latency = Histogram('http_request_duration_seconds', 'Time taken to handle requests, until the response is returned',
+                            ('method', 'endpoint', 'status'), LATENCY_BUCKETS)
+request_statements = Histogram('http_request_sql_statements', 'Number of SQL statements run by each request',
+                               ('method', 'endpoint'), STATEMENT_BUCKETS)
+sql_statements = Counter('sql_statements_total', 'SQL statements run, by the endpoint that ran them', ('endpoint',))
+sql_duration = Counter('sql_statement_duration_seconds_total', 'Time spent running SQL statements, by the endpoint that ran them',
+                       ('endpoint',))
+generator_latency = Histogram('quiz_generator_call_duration_seconds', 'Time taken by calls to the question generator backend',
+                              ('backend', 'outcome'), GENERATOR_BUCKETS)
+
+
+# Requests that don't match a route are grouped together so that scanning for URLs doesn't create a series per URL
+def endpoint_label() -> str:
+    return request.endpoint or 'unmatched'
+
+
+# Under the ASGI server, requests are timed from when they were received, so that their time waiting for a thread
+# and generating questions before reaching Flask is included
+@app.before_request
+def start_request_timer():
+    g.request_started_at = request.environ.get('asgi.scope', {}).get(RECEIVED_AT) or time.perf_counter()
+    g.sql_statements = 0
+    g.sql_duration = 0.0
+    g.request_recorded = False
+
+
+def observe_request(status_code: int) -> float:
+    duration = time.perf_counter() - g.request_started_at
+    endpoint = endpoint_label()
+    request_latency.observe((request.method, endpoint, str(status_code)), duration)
+    request_statements.observe((request.method, endpoint), g.sql_statements)
+    g.request_recorded = True
+    return duration
+
+
+# Streamed responses are only timed until their headers are returned
+@app.after_request
+def record_request(response):
+    if 'request_started_at' not in g:
+        return response
+    duration = observe_request(response.status_code)
+
+    if app.config['METRICS_SERVER_TIMING']:
+        response.headers.add('Server-Timing', f'db;dur={g.sql_duration * 1000:.1f};desc="{g.sql_statements} queries"')
+        response.headers.add('Server-Timing', f'total;dur={duration * 1000:.1f}')
+    return response
+
+
+# Record requests that failed with an exception that skipped the after_request handlers (e.g. when exceptions are
+# propagated instead of turned into 500 responses, or when an after_request handler failed) as 500s
+@app.teardown_request
+def record_failed_request(error):
+    if error is not None and 'request_started_at' in g and not g.request_recorded:
+        observe_request(500)
+
+
+# Time each statement on its execution context, so that statements that fail don't leave anything behind
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(connection, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started_at = time.perf_counter()
+
+
+# Statements run outside of a request (e.g. by quiz generation jobs or CLI commands) are counted as 'background'
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(connection, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, 'metrics_started_at', None)
+    if started_at is None:
+        return
+    duration = time.perf_counter() - started_at
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_duration += duration
+        endpoint = endpoint_label()
+    else:
+        endpoint = 'background'
+    sql_statements.increment((endpoint,))
+    sql_duration.increment((endpoint,), duration)
+
+
+def record_generator_call(backend_name: str, duration: float, succeeded: bool) -> None:
+    generator_latency.observe((backend_name or 'unknown', 'success' if succeeded else 'error'), duration)
+
+
+backend_call_observers.append(record_generator_call)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in [request_latency, request_statements, sql_statements, sql_duration, generator_latency]:
+        lines += metric.render()
+
+    cache_stats = generation_cache.stats()
+    lines += ['# HELP quiz_generation_cache_entries Question sets in the in-memory generation cache',
+              '# TYPE quiz_generation_cache_entries gauge', f"quiz_generation_cache_entries {cache_stats.pop('size')}"]
+    lines += ['# HELP quiz_generation_cache_requests_total Lookups in the generation cache, by result',
+              '# TYPE quiz_generation_cache_requests_total counter']
+    lines += [f'quiz_generation_cache_requests_total{{result="{result}"}} {count}' for result, count in cache_stats.items()]
+
+    stats = pool_stats()
+    lines += render_gauges('db_pool_connections', 'Connections of the database connection pool, by state',
+                           {state: stats[state] for state in ['checked_out', 'idle', 'overflow'] if state in stats},
+                           label_name='state')
+    lines += ['# HELP db_pool_events_total Connection pool events, by type', '# TYPE db_pool_events_total counter']
+    lines += [f'db_pool_events_total{{event="{event_name}"}} {stats[event_name]}'
+              for event_name in ['connections_opened', 'connections_invalidated', 'checkouts']]
+    return '\n'.join(lines) + '\n'
@@ -1,14 +1,21 @@
+import json
+import math
 import random
+import binascii
+from base64 import urlsafe_b64encode, urlsafe_b64decode
 from typing import Optional
-from app import db
-from datetime import datetime, timezone
-from sqlalchemy import String, ForeignKey, PrimaryKeyConstraint, ForeignKeyConstraint
+from app import app, db
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import String, LargeBinary, BigInteger, ForeignKey, PrimaryKeyConstraint, ForeignKeyConstraint, Index, select, insert, update, func, tuple_, literal
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import mapped_column, Mapped, WriteOnlyMapped, relationship
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
 from sqlite3 import Connection as SQLiteConnection
-from flask import url_for
+from flask import url_for, abort, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
+from quiz_generator import dedup
 
 
 @event.listens_for(Engine, 'connect')
@@ -16,30 +23,199 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     if isinstance(dbapi_connection, SQLiteConnection):
         cursor = dbapi_connection.cursor()
         cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT']}")
         cursor.close()
 
 
 class PaginatedMixin(object):
+    # Columns that items are serialized from. Collections select these columns instead of whole ORM objects, and
+    # row_to_dict() and to_dict_list() accept either ORM objects or rows of these columns, which are much cheaper to load
+    # Models that don't define them are loaded as ORM objects and serialized with to_dict()
+    @classmethod
+    def row_columns(cls) -> Optional[list]:
+        return None
+
+    # Relationships that can be embedded in items with expand=, mapped to the keys of the columns needed to load them,
+    # and the relationships that are embedded when expand= isn't passed
+    EXPANDABLE: dict[str, tuple] = {}
+    DEFAULT_EXPAND: tuple = ()
+
+    @classmethod
+    def expanded(cls, fieldset: Optional['Fieldset'] = None) -> set[str]:
+        if fieldset is None or fieldset.expand is None:
+            return set(cls.DEFAULT_EXPAND)
+        return fieldset.expand
+
+    # Serialize the columns of an item with row_to_dict(), or only the fields picked with fields=
+    @classmethod
+    def fields_to_dict(cls, item, fieldset: Optional['Fieldset'] = None) -> dict:
+        if fieldset is None or fieldset.fields is None:
+            return cls.row_to_dict(item)
+        return {key: json_value(getattr(item, key)) for key in fieldset.fields}
+
+    # Serialize a list of items
+    # Models whose to_dict() touches related rows override this to load them in a fixed number of batched queries
+    @classmethod
+    def to_dict_list(cls, items, fieldset: Optional['Fieldset'] = None) -> list[dict]:
+        if cls.row_columns() is not None:
+            return [cls.fields_to_dict(item, fieldset) for item in items]
+        return [item.to_dict() for item in items]
+
+    # Select the row_columns() instead of the ORM objects of a select(Model) query, if the model has them
+    # With fields=, only the picked columns are selected, along with the ones needed for paging and expanding
+    @classmethod
+    def project(cls, query, fieldset: Optional['Fieldset'] = None):
+        columns = cls.row_columns()
+        if columns is None:
+            return query
+        if fieldset is not None and fieldset.fields is not None:
+            keys = fieldset.fields | {column.key for column in cls.cursor_columns()}
+            keys |= {key for name in cls.expanded(fieldset) for key in cls.EXPANDABLE[name]}
+            columns = [column for column in columns if column.key in keys]
+        return query.with_only_columns(*columns, maintain_column_froms=True)
+
+    # The items matching a select(Model) query, as rows of row_columns() or as ORM objects
+    @classmethod
+    def fetch_items(cls, query, fieldset: Optional['Fieldset'] = None) -> list:
+        if cls.row_columns() is not None:
+            return db.session.execute(cls.project(query, fieldset)).all()
+        return db.session.scalars(query).all()
+
+    # Serialize the item with the given id, or respond with 404 if there is none
+    @classmethod
+    def to_dict_or_404(cls, item_id: int, fieldset: Optional['Fieldset'] = None) -> dict:
+        items = cls.fetch_items(select(cls).where(cls.id == item_id), fieldset)
+        if not items:
+            abort(404)
+        return cls.to_dict_list(items, fieldset)[0]
+
+    # Columns that cursor pagination seeks on, which should be covered by an index
+    # Defaults to the primary key; models can override this to page in a different order
+    @classmethod
+    def cursor_columns(cls) -> list:
+        return list(cls.__mapper__.primary_key)
+
+    # Paginate by page number, or by cursor if a cursor is given (use an empty cursor to get the first page)
+    @classmethod
+    def to_collection_dict(cls, query, endpoint: str, page: int = 1, per_page: int = 20, cursor: str = None,
+                           include_total: bool = False, descending: bool = False, fieldset: 'Fieldset' = None, **kwargs):
+        if cursor is not None:
+            return cls.to_cursor_collection_dict(query, endpoint, cursor, per_page=per_page, include_total=include_total,
+                                                 descending=descending, fieldset=fieldset, **kwargs)
+
+        total_items = db.session.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+        items = cls.fetch_items(query.limit(per_page).offset((page - 1) * per_page), fieldset)
+
+        return cls.to_page_dict(cls.to_dict_list(items, fieldset), endpoint, page=page, per_page=per_page,
+                                total_items=total_items, **(fieldset.link_args() if fieldset else {}), **kwargs)
+
+    # Build the response for a page of already serialized items
     @staticmethod
-    def to_collection_dict(query, endpoint: str, page: int = 1, per_page: int = 20, **kwargs):
-        pagination = db.paginate(
-            query, page=page, per_page=per_page, error_out=False)
-
+    def to_page_dict(items: list[dict], endpoint: str, page: int, per_page: int, total_items: int, **kwargs):
+        total_pages = math.ceil(total_items / per_page)
         return {
-            'items': [item.to_dict() for item in pagination.items],
+            'items': items,
             '_meta': {
                 'page': page,
                 'per_page': per_page,
-                'total_pages': pagination.pages,
-                'total_items': pagination.total
+                'total_pages': total_pages,
+                'total_items': total_items
             },
             '_links': {
                 'self': url_for(endpoint, page=page, per_page=per_page, **kwargs),
-                'next': url_for(endpoint, page=page + 1, per_page=per_page, **kwargs) if pagination.has_next else None,
-                'prev': url_for(endpoint, page=page - 1, per_page=per_page, **kwargs) if pagination.has_prev else None
+                'next': url_for(endpoint, page=page + 1, per_page=per_page, **kwargs) if page < total_pages else None,
+                'prev': url_for(endpoint, page=page - 1, per_page=per_page, **kwargs) if page > 1 else None
+            }
+        }
+
+    # Keyset pagination: instead of counting and skipping rows with OFFSET, seek directly to the rows after the cursor
+    # using the index on cursor_columns(), so that every page costs the same no matter how deep it is.
+    # The query is reordered by cursor_columns(), and the total is only counted if include_total is set.
+    @classmethod
+    def to_cursor_collection_dict(cls, query, endpoint: str, cursor: str, per_page: int = 20,
+                                  include_total: bool = False, descending: bool = False, fieldset: 'Fieldset' = None,
+                                  **kwargs):
+        columns = cls.cursor_columns()
+        if fieldset:
+            kwargs.update(fieldset.link_args())
+        if include_total:
+            kwargs['count'] = 'true'
+            total = db.session.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+
+        query = query.order_by(None).order_by(*[column.desc() if descending else column.asc() for column in columns])
+        if cursor:
+            position = tuple_(*columns)
+            last_seen = tuple_(*[literal(value, column.type) for value, column in zip(decode_cursor(cursor, columns), columns)])
+            query = query.where(position < last_seen if descending else position > last_seen)
+
+        # Fetch one extra row to find out if there is a next page
+        items = cls.fetch_items(query.limit(per_page + 1), fieldset)
+        next_cursor = encode_cursor(items[per_page - 1], columns) if len(items) > per_page else None
+        items = items[:per_page]
+
+        meta = {'per_page': per_page}
+        if include_total:
+            meta['total_items'] = total
+
+        return {
+            'items': cls.to_dict_list(items, fieldset),
+            '_meta': meta,
+            '_links': {
+                'self': url_for(endpoint, cursor=cursor, per_page=per_page, **kwargs),
+                'next': url_for(endpoint, cursor=next_cursor, per_page=per_page, **kwargs) if next_cursor else None,
+                'cursor': cursor,
+                'next_cursor': next_cursor
             }
         }
 
+    # Yield every item matching the query as a line of JSON, for exporting collections too large to paginate
+    # Rows are fetched from a server-side cursor batch_size at a time, so memory use stays bounded
+    @classmethod
+    def to_ndjson_stream(cls, query, batch_size: int = 500, fieldset: 'Fieldset' = None):
+        query = query.execution_options(yield_per=batch_size)
+        result = (db.session.execute(cls.project(query, fieldset)) if cls.row_columns() is not None
+                  else db.session.scalars(query))
+        for items in result.partitions():
+            for item in cls.to_dict_list(items, fieldset):
+                yield current_app.json.dumps(item) + '\n'
+
+
+# The fields of items to return and the relationships to embed in them, as picked with fields= and expand=
+# None returns all the fields, or embeds the model's DEFAULT_EXPAND
+class Fieldset(object):
+    def __init__(self, fields: Optional[set[str]] = None, expand: Optional[set[str]] = None) -> None:
+        self.fields = fields
+        self.expand = expand
+
+    # Query string arguments that keep the same fieldset in links to other pages
+    def link_args(self) -> dict:
+        return {name: ','.join(sorted(names)) for name, names in [('fields', self.fields), ('expand', self.expand)]
+                if names is not None}
+
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+# Cursors are the cursor column values of the last item on a page, as base64-encoded JSON so that clients treat them as opaque
+def encode_cursor(item, columns) -> str:
+    values = [getattr(item, column.key) for column in columns]
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('wrong number of values')
+        return [datetime.fromisoformat(value) if column.type.python_type is datetime else value
+                for value, column in zip(values, columns)]
+    except (ValueError, TypeError, binascii.Error):
+        abort(400, description='Invalid cursor')
+
 
 class User(PaginatedMixin, db.Model):
     # Note that "user" is a reserved word in postgres, which is why we use another name here
@@ -53,10 +229,18 @@ class User(PaginatedMixin, db.Model):
     def __repr__(self) -> str:
         return f'User <{self.id}:{self.username}>'
 
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.id, cls.username]
+
     def to_dict(self):
+        return self.row_to_dict(self)
+
+    @staticmethod
+    def row_to_dict(user) -> dict:
         return {
-            'id': self.id,
-            'username': self.username,
+            'id': user.id,
+            'username': user.username,
         }
 
     def __init__(self, username: str, id: int = None) -> None:
@@ -72,32 +256,106 @@ class Quiz(PaginatedMixin, db.Model):
     created_at: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(tz=timezone.utc))
 
+    # Number of Questions in the Quiz, stored so that listing quizzes does not need to count them
+    # Set by create_quiz and reset by the endpoints that delete Questions
+    question_count: Mapped[int] = mapped_column(default=0, server_default='0')
+
     # If a Quiz is deleted, all related Questions should be deleted
     questions = relationship(
         'Question', back_populates='quiz', passive_deletes=True, cascade='all, delete')
 
     # If a Quiz is deleted, related QuizAttempts should remain
+    # The database sets their quiz_id to null, so the ORM does not need to load them
     attempts: WriteOnlyMapped['QuizAttempt'] = relationship(
-        'QuizAttempt', back_populates='quiz')
-
-    def question_count(self):
-        return len(self.questions)
+        'QuizAttempt', back_populates='quiz', passive_deletes=True)
 
     def __repr__(self) -> str:
         return f'Quiz <{self.id}>'
 
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.id, cls.subject, cls.created_at, cls.question_count]
+
     def to_dict(self):
+        return self.row_to_dict(self)
+
+    @staticmethod
+    def row_to_dict(quiz) -> dict:
         return {
-            'id': self.id,
-            'subject': self.subject,
-            'created_at': self.created_at.isoformat(),
-            'question_count': self.question_count()
+            'id': quiz.id,
+            'subject': quiz.subject,
+            'created_at': quiz.created_at.isoformat(),
+            'question_count': quiz.question_count
         }
 
+    # Add a new Quiz with the given generated questions and their choices to the session, without committing
+    # The questions are bulk inserted if the database can return the generated ids of a multi-row insert,
+    # otherwise they are inserted one at a time
+    @classmethod
+    def add_generated(cls, subject: str, questions_with_choices: list[dict], bulk: bool = None) -> 'Quiz':
+        quiz = cls(subject=subject)
+        db.session.add(quiz)
+        db.session.flush()
+
+        if bulk is None:
+            bulk = db.session.get_bind().dialect.insert_executemany_returning
+        if bulk:
+            quiz.bulk_add_questions(questions_with_choices)
+        else:
+            for question_data in questions_with_choices:
+                quiz.add_question(question_data)
+        return quiz
+
+    # Insert all the questions with a single INSERT ... RETURNING (to get their ids) and all their choices with one more
+    # INSERT, and index them for near-duplicates together, so a quiz takes the same number of statements at any size
+    # instead of the 8 per question that add_question takes
+    def bulk_add_questions(self, questions_with_choices: list[dict]) -> None:
+        if not questions_with_choices:
+            return
+
+        # Not every database returns the rows of a multi-row insert in order (SQLite doesn't, and SQLAlchemy falls back
+        # to one INSERT per row if asked to sort them), so match the returned ids to the questions by their text instead
+        # Questions with the same text are interchangeable, so it doesn't matter which of their ids each one gets
+        returned_rows = db.session.execute(
+            insert(Question).returning(Question.id, Question.text),
+            [{'text': question_data['question'], 'quiz_id': self.id} for question_data in questions_with_choices])
+        returned_rows = returned_rows.all()
+        ids_by_text: dict[str, list[int]] = {}
+        for question_id, text in returned_rows:
+            ids_by_text.setdefault(text, []).append(question_id)
+        index_questions(returned_rows)
+
+        db.session.execute(insert(Choice), [
+            {'text': choice['text'], 'correct': choice['correct'], 'question_id': question_id}
+            for question_data in questions_with_choices
+            for question_id in [ids_by_text[question_data['question']].pop()]
+            for choice in question_data['choices']])
+
+        self.question_count += len(questions_with_choices)
+
+    # Add a generated question and its choices to the Quiz, without committing
+    def add_question(self, question_data: dict) -> 'Question':
+        question = Question(text=question_data['question'], quiz_id=self.id)
+        db.session.add(question)
+        db.session.flush()
+
+        choices = [Choice(text=choice['text'], correct=choice['correct'],
+                          question_id=question.id) for choice in question_data['choices']]
+        db.session.bulk_save_objects(choices)
+        # The canonical_id is already written by index_questions
+        set_committed_value(question, 'canonical_id', index_questions([(question.id, question.text)]).get(question.id))
+
+        self.question_count += 1
+        return question
+
     def __init__(self, subject: str) -> None:
         self.subject = subject
 
 
+# For finding the quizzes on a subject regardless of case
+Index('ix_quiz_subject_lower', func.lower(Quiz.subject))
+
+
 class Question(PaginatedMixin, db.Model):
     __tablename__ = 'question'
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -108,6 +366,11 @@ class Question(PaginatedMixin, db.Model):
         ForeignKey(Quiz.id, ondelete='CASCADE'), index=True)
     quiz: Mapped[Quiz] = relationship('Quiz', back_populates='questions')
 
+    # Near-duplicates of a question point to it with canonical_id, which is null for questions that are not
+    # a near-duplicate of an earlier one. Set by index_questions when questions are added and by `flask cluster-duplicates`
+    canonical_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('question.id', ondelete='SET NULL'), index=True, nullable=True)
+
     # If a Question is deleted, all related Choices should be deleted
     choices = relationship(
         'Choice', back_populates='question', passive_deletes=True, cascade='all,delete')
@@ -115,25 +378,50 @@ class Question(PaginatedMixin, db.Model):
     attempted_questions: WriteOnlyMapped['AttemptQuestion'] = relationship(
         'AttemptQuestion', back_populates='question')
 
-    def choices_count(self):
-        return len(self.choices)
-
-    def shuffle_choices(self):
-        random.shuffle(self.choices)
-        return self.choices
+    # Return the choices (ORM objects or rows) in an order determined by the seed
+    # Sorting by a hash of the seed and choice id gives the same order for the same seed without creating a Random per question
+    @staticmethod
+    def shuffle_choices(choices: list, seed: int) -> list:
+        return sorted(choices, key=lambda choice: hash((seed, choice.id)))
 
     def __repr__(self) -> str:
         return f'Question <{self.id}>'
 
-    def to_dict(self):
+    EXPANDABLE = {'choices': ('id',)}
+    DEFAULT_EXPAND = ('choices',)
+
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.id, cls.text, cls.quiz_id, cls.canonical_id]
+
+    def to_dict(self, seed: int = None, fieldset: 'Fieldset' = None):
+        return self.to_dict_list([self], fieldset, seed=seed)[0]
+
+    @staticmethod
+    def row_to_dict(question) -> dict:
         return {
-            'id': self.id,
-            'text': self.text,
-            'quiz_id': self.quiz_id,
-            'choices': [choice.to_dict() for choice in self.shuffle_choices()],
-            'choices_count': self.choices_count()
+            'id': question.id,
+            'text': question.text,
+            'quiz_id': question.quiz_id,
+            'canonical_id': question.canonical_id
         }
 
+    # Load the choices of all given questions as rows in a single query instead of one lazy load per question
+    # The choices of each question are shuffled by the seed, or in a random order if there is none
+    @classmethod
+    def to_dict_list(cls, questions: list['Question'], fieldset: 'Fieldset' = None, seed: int = None) -> list[dict]:
+        items = [cls.fields_to_dict(question, fieldset) for question in questions]
+        if 'choices' not in cls.expanded(fieldset):
+            return items
+        if seed is None:
+            seed = random.getrandbits(32)
+        choices_by_question = load_choice_rows([question.id for question in questions])
+        for item, question in zip(items, questions):
+            choices = choices_by_question.get(question.id, [])
+            item['choices'] = [Choice.row_to_dict(choice) for choice in cls.shuffle_choices(choices, seed)]
+            item['choices_count'] = len(choices)
+        return items
+
     def __init__(self, text: str, quiz_id: int) -> None:
         self.text = text
         self.quiz_id = quiz_id
@@ -157,12 +445,20 @@ class Choice(PaginatedMixin, db.Model):
     def __repr__(self) -> str:
         return f'Choice <{self.id}>'
 
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.id, cls.text, cls.correct, cls.question_id]
+
     def to_dict(self):
+        return self.row_to_dict(self)
+
+    @staticmethod
+    def row_to_dict(choice) -> dict:
         return {
-            'id': self.id,
-            'text': self.text,
-            'correct': self.correct,
-            'question_id': self.question_id
+            'id': choice.id,
+            'text': choice.text,
+            'correct': choice.correct,
+            'question_id': choice.question_id
         }
 
     def __init__(self, text: str, correct: bool, question_id: int) -> None:
@@ -173,6 +469,11 @@ class Choice(PaginatedMixin, db.Model):
 
 class QuizAttempt(PaginatedMixin, db.Model):
     __tablename__ = 'quiz_attempt'
+    # Indexes for cursor pagination over all attempts and over the attempts of a user
+    __table_args__ = (
+        Index('ix_quiz_attempt_timestamp_id', 'timestamp', 'id'),
+        Index('ix_quiz_attempt_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     timestamp: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(tz=timezone.utc), index=True)
@@ -196,21 +497,62 @@ class QuizAttempt(PaginatedMixin, db.Model):
     user_choices: WriteOnlyMapped['UserChoice'] = relationship(
         'UserChoice', back_populates='attempt', passive_deletes=True, cascade='all, delete')
 
-    # Count number of correct choices
-    def count_correct(self) -> int:
-        return UserChoice.query.join(Choice, Choice.id == UserChoice.choice_id).filter(
-            UserChoice.attempt_id == self.id, Choice.correct).count()
+    # Number of UserChoices made and how many of them are correct, stored so that reading scores does not need to count them
+    # Kept up to date by add_quiz_attempt, add_user_choice and the endpoints that delete Choices
+    answered_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    correct_count: Mapped[int] = mapped_column(default=0, server_default='0')
 
-    def to_dict(self):
+    # Page through attempts in order of time, using the id to break ties
+    @classmethod
+    def cursor_columns(cls) -> list:
+        return [cls.timestamp, cls.id]
+
+    # Recompute answered_count and correct_count from the UserChoices of all attempts matching the given criteria
+    @staticmethod
+    def refresh_counts(*criteria):
+        answered_count = select(func.count()).select_from(UserChoice).where(
+            UserChoice.attempt_id == QuizAttempt.id).scalar_subquery()
+        correct_count = select(func.count()).select_from(UserChoice).join(Choice, Choice.id == UserChoice.choice_id).where(
+            UserChoice.attempt_id == QuizAttempt.id, Choice.correct).scalar_subquery()
+        db.session.execute(update(QuizAttempt).where(*criteria).values(
+            answered_count=answered_count, correct_count=correct_count))
+
+    EXPANDABLE = {'quiz': ('quiz_id',)}
+    DEFAULT_EXPAND = ('quiz',)
+
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.id, cls.timestamp, cls.quiz_id, cls.user_id, cls.answered_count, cls.correct_count]
+
+    # quiz_dict can be passed in when it has already been loaded for a batch of attempts
+    def to_dict(self, quiz_dict: dict = None):
+        if quiz_dict is None and self.quiz is not None:
+            quiz_dict = self.quiz.to_dict()
+        return {**self.row_to_dict(self), 'quiz': quiz_dict}
+
+    @staticmethod
+    def row_to_dict(attempt) -> dict:
         return {
-            'id': self.id,
-            'timestamp': self.timestamp.isoformat(),
-            'quiz_id': self.quiz_id,
-            'quiz': self.quiz.to_dict(),
-            'user_id': self.user_id,
-            'correct_count': self.count_correct()
+            'id': attempt.id,
+            'timestamp': attempt.timestamp.isoformat(),
+            'quiz_id': attempt.quiz_id,
+            'user_id': attempt.user_id,
+            'answered_count': attempt.answered_count,
+            'correct_count': attempt.correct_count
         }
 
+    # Serialize attempts with a single query for their quizzes, regardless of how many attempts there are
+    @classmethod
+    def to_dict_list(cls, attempts: list['QuizAttempt'], fieldset: 'Fieldset' = None) -> list[dict]:
+        if 'quiz' not in cls.expanded(fieldset):
+            return [cls.fields_to_dict(attempt, fieldset) for attempt in attempts]
+
+        quiz_ids = {attempt.quiz_id for attempt in attempts if attempt.quiz_id is not None}
+        quizzes = Quiz.fetch_items(select(Quiz).where(Quiz.id.in_(quiz_ids))) if quiz_ids else []
+        quiz_dicts = {quiz['id']: quiz for quiz in Quiz.to_dict_list(quizzes)}
+
+        return [{**cls.fields_to_dict(attempt, fieldset), 'quiz': quiz_dicts.get(attempt.quiz_id)} for attempt in attempts]
+
     def __init__(self, quiz_id: int, user_id: int) -> None:
         self.quiz_id = quiz_id
         self.user_id = user_id
@@ -235,20 +577,54 @@ class AttemptQuestion(PaginatedMixin, db.Model):
     # To determine the order in which the Question appeared in the QuizAttempt
     sequence_number: Mapped[int] = mapped_column()
 
-    def get_user_choice(self):
-        user_choice = UserChoice.query.join(Choice, Choice.id == UserChoice.choice_id).filter(
-            UserChoice.attempt_id == self.attempt_id, Choice.question_id == self.question_id).first()
-        return user_choice.to_dict() if user_choice else None
+    EXPANDABLE = {'question': ('question_id',), 'user_choice': ('attempt_id', 'question_id')}
+    DEFAULT_EXPAND = ('question', 'user_choice')
 
-    def to_dict(self):
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.attempt_id, cls.question_id, cls.sequence_number]
+
+    def to_dict(self) -> dict:
+        return self.to_dict_list([self])[0]
+
+    @staticmethod
+    def row_to_dict(attempt_question) -> dict:
         return {
-            'attempt_id': self.attempt_id,
-            'question_id': self.question_id,
-            'question': self.question.to_dict(),
-            'sequence_number': self.sequence_number,
-            'user_choice': self.get_user_choice()
+            'attempt_id': attempt_question.attempt_id,
+            'question_id': attempt_question.question_id,
+            'sequence_number': attempt_question.sequence_number
         }
 
+    # Serialize attempt questions with 3 queries in total, regardless of how many there are:
+    # two for the questions and their choices and one for the user choices made in the attempts
+    # Relationships that aren't expanded aren't loaded
+    @classmethod
+    def to_dict_list(cls, attempt_questions: list['AttemptQuestion'], fieldset: 'Fieldset' = None) -> list[dict]:
+        expand = cls.expanded(fieldset)
+        items = [cls.fields_to_dict(attempt_question, fieldset) for attempt_question in attempt_questions]
+
+        if 'question' in expand:
+            question_ids = {attempt_question.question_id for attempt_question in attempt_questions}
+            questions = Question.fetch_items(select(Question).where(Question.id.in_(question_ids))) if question_ids else []
+            question_dicts = {question['id']: question for question in Question.to_dict_list(questions)}
+            for item, attempt_question in zip(items, attempt_questions):
+                item['question'] = question_dicts.get(attempt_question.question_id)
+
+        if 'user_choice' in expand:
+            attempt_ids = {attempt_question.attempt_id for attempt_question in attempt_questions}
+            # Each row has the columns of both the user choice and its choice, with the user_id of its attempt
+            rows = db.session.execute(
+                select(UserChoice.attempt_id, QuizAttempt.user_id, *Choice.row_columns())
+                .join(Choice, Choice.id == UserChoice.choice_id)
+                .join(QuizAttempt, QuizAttempt.id == UserChoice.attempt_id)
+                .where(UserChoice.attempt_id.in_(attempt_ids))) if attempt_ids else []
+            user_choice_dicts = {(row.attempt_id, row.question_id): UserChoice.row_to_dict(row, row, row.user_id)
+                                 for row in rows}
+            for item, attempt_question in zip(items, attempt_questions):
+                item['user_choice'] = user_choice_dicts.get((attempt_question.attempt_id, attempt_question.question_id))
+
+        return items
+
     def __init__(self, attempt_id: int, question_id: int, sequence_number: int) -> None:
         self.attempt_id = attempt_id
         self.question_id = question_id
@@ -273,14 +649,274 @@ class UserChoice(PaginatedMixin, db.Model):
     def correct(self) -> bool:
         return self.choice.correct
 
-    def to_dict(self):
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.choice_id, cls.attempt_id]
+
+    # choice and user_id can be passed in when they have already been loaded for a batch of user choices
+    def to_dict(self, choice: Choice = None, user_id: Optional[int] = ...):
+        return self.row_to_dict(self, choice or self.choice, self.attempt.user_id if user_id is ... else user_id)
+
+    # choice is a Choice or a row of its row_columns()
+    @staticmethod
+    def row_to_dict(user_choice, choice, user_id: Optional[int]) -> dict:
         return {
-            'attempt_id': self.attempt_id,
-            'user_id': self.attempt.user_id,
-            'choice': self.choice.to_dict(),
-            'correct': self.correct()
+            'attempt_id': user_choice.attempt_id,
+            'user_id': user_id,
+            'choice': Choice.row_to_dict(choice),
+            'correct': choice.correct
         }
 
+    # Serialize user choices with 2 queries in total: one for the choices and one for the user_ids of the attempts
+    @classmethod
+    def to_dict_list(cls, user_choices: list['UserChoice'], fieldset: 'Fieldset' = None) -> list[dict]:
+        if not user_choices:
+            return []
+
+        choice_ids = {user_choice.choice_id for user_choice in user_choices}
+        choices = {choice.id: choice for choice in Choice.fetch_items(select(Choice).where(Choice.id.in_(choice_ids)))}
+
+        attempt_ids = {user_choice.attempt_id for user_choice in user_choices}
+        user_ids = dict(db.session.execute(
+            select(QuizAttempt.id, QuizAttempt.user_id).where(QuizAttempt.id.in_(attempt_ids))).all())
+
+        return [cls.row_to_dict(user_choice, choices[user_choice.choice_id], user_ids.get(user_choice.attempt_id))
+                for user_choice in user_choices]
+
     def __init__(self, attempt_id: int, choice_id: int) -> None:
         self.attempt_id = attempt_id
         self.choice_id = choice_id
+
+
+# Number of times each Choice has been picked, kept up to date as UserChoices are added and removed
+# so that question and quiz stats don't need to count UserChoices
+class ChoiceStat(db.Model):
+    __tablename__ = 'choice_stat'
+    choice_id: Mapped[int] = mapped_column(ForeignKey(
+        Choice.id, ondelete='CASCADE'), primary_key=True)
+    pick_count: Mapped[int] = mapped_column(default=0, server_default='0')
+
+    # Add picks to choices, given as {choice_id: number of picks} (negative to remove picks), with a single upsert
+    @staticmethod
+    def add_picks(picks: dict[int, int]):
+        values = [{'choice_id': choice_id, 'pick_count': count} for choice_id, count in picks.items() if count]
+        if not values:
+            return
+        dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+        statement = dialect.insert(ChoiceStat.__table__).values(values)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[ChoiceStat.choice_id],
+            set_={'pick_count': ChoiceStat.__table__.c.pick_count + statement.excluded.pick_count}))
+
+
+
+# Helpers used by to_dict_list to load related data for a batch of rows at once
+
+# Map each question_id to its Question, with the choices of all questions loaded in one extra query
+# The choices of the given questions as rows of Choice.row_columns(), by question id, in the order they were added
+def load_choice_rows(question_ids) -> dict[int, list]:
+    if not question_ids:
+        return {}
+    rows = db.session.execute(
+        select(*Choice.row_columns()).where(Choice.question_id.in_(set(question_ids))).order_by(Choice.id))
+    choices_by_question = {}
+    for row in rows:
+        choices_by_question.setdefault(row.question_id, []).append(row)
+    return choices_by_question
+
+
+# MinHash signature of the text of a Question, for estimating its similarity to other questions
+class QuestionSignature(db.Model):
+    __tablename__ = 'question_signature'
+    question_id: Mapped[int] = mapped_column(ForeignKey(
+        Question.id, ondelete='CASCADE'), primary_key=True)
+    signature: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+# LSH buckets of the signature of a Question, so that the questions that may be near-duplicates of a question
+# are found with one indexed lookup per band of its signature
+class QuestionBucket(db.Model):
+    __tablename__ = 'question_bucket'
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    question_id: Mapped[int] = mapped_column(ForeignKey(
+        Question.id, ondelete='CASCADE'), primary_key=True, index=True)
+
+
+# Store the signatures and buckets of new questions, given as (id, text) pairs, and set the canonical_id of the ones
+# that are near-duplicates of an indexed question or of an earlier question in the list
+# Uses a fixed number of queries for any number of questions, and returns the canonical_id that was set for each duplicate
+def index_questions(questions: list[tuple[int, str]]) -> dict[int, int]:
+    if not questions:
+        return {}
+    signatures = {question_id: dedup.signature(text) for question_id, text in questions}
+    question_buckets = {question_id: dedup.buckets(signature) for question_id, signature in signatures.items()}
+
+    candidate_ids = {}  # bucket -> ids of the indexed questions in it
+    for bucket, question_id in db.session.execute(select(QuestionBucket.bucket, QuestionBucket.question_id).where(
+            QuestionBucket.bucket.in_({bucket for buckets in question_buckets.values() for bucket in buckets}))):
+        candidate_ids.setdefault(bucket, []).append(question_id)
+    candidates = {question_id: (dedup.unpack_signature(signature), canonical_id)
+                  for question_id, signature, canonical_id in db.session.execute(
+                      select(QuestionSignature.question_id, QuestionSignature.signature, Question.canonical_id)
+                      .join(Question, Question.id == QuestionSignature.question_id)
+                      .where(QuestionSignature.question_id.in_({question_id for ids in candidate_ids.values() for question_id in ids})))}
+
+    canonical_ids = {}
+    new_questions = dedup.NearDuplicateIndex()
+    for question_id, signature in signatures.items():
+        duplicate_of = next((candidates[candidate_id][1] or candidate_id
+                             for bucket in question_buckets[question_id] for candidate_id in candidate_ids.get(bucket, ())
+                             if dedup.similarity(signature, candidates[candidate_id][0]) >= dedup.DUPLICATE_THRESHOLD),
+                            None)
+        if duplicate_of is None:
+            duplicate_of = new_questions.find(signature)
+        if duplicate_of is None:
+            new_questions.add(question_id, signature)
+        else:
+            canonical_ids[question_id] = canonical_ids.get(duplicate_of, duplicate_of)
+
+    db.session.execute(insert(QuestionSignature), [
+        {'question_id': question_id, 'signature': dedup.pack_signature(signature)} for question_id, signature in signatures.items()])
+    db.session.execute(insert(QuestionBucket), [
+        {'bucket': bucket, 'question_id': question_id}
+        for question_id, buckets in question_buckets.items() for bucket in set(buckets)])
+    if canonical_ids:
+        db.session.execute(update(Question), [
+            {'id': question_id, 'canonical_id': canonical_id} for question_id, canonical_id in canonical_ids.items()])
+    return canonical_ids
+
+
+# A request to generate a Quiz in the background, which clients poll for its status
+class QuizJob(PaginatedMixin, db.Model):
+    __tablename__ = 'quiz_job'
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    status: Mapped[str] = mapped_column(String(10), default=PENDING)
+    subject: Mapped[str] = mapped_column(String(25))
+    question_count: Mapped[int] = mapped_column()
+    choice_count: Mapped[int] = mapped_column()
+    error: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(tz=timezone.utc))
+    finished_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    # The Quiz created by the job once it is done
+    # If the Quiz is deleted, keep the job so that its status can still be checked
+    quiz_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey(Quiz.id, ondelete='SET NULL'), nullable=True)
+    quiz: Mapped[Optional[Quiz]] = relationship('Quiz')
+
+    def __repr__(self) -> str:
+        return f'QuizJob <{self.id}:{self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'subject': self.subject,
+            'question_count': self.question_count,
+            'choice_count': self.choice_count,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'quiz_id': self.quiz_id,
+            'quiz': self.quiz.to_dict() if self.quiz else None
+        }
+
+    def __init__(self, subject: str, question_count: int, choice_count: int) -> None:
+        self.subject = subject
+        self.question_count = question_count
+        self.choice_count = choice_count
+        self.status = QuizJob.PENDING
+
+
+# Leaderboard stats of a user, aggregated from their attempts by app.leaderboard.refresh_leaderboard
+# The score of an attempt is the percentage of the questions of its quiz that were answered correctly
+# Attempts whose quiz has been deleted are not counted
+class LeaderboardStatsMixin(PaginatedMixin):
+    # Columns that leaderboards can be sorted by, each of which has an index for reading the top users
+    SORT_COLUMNS = ('best_score', 'average_score', 'attempt_count', 'best_streak')
+
+    attempt_count: Mapped[int] = mapped_column(default=0)
+    best_score: Mapped[float] = mapped_column(default=0)
+    average_score: Mapped[float] = mapped_column(default=0)
+
+    # Streaks count consecutive days (in UTC) with at least one attempt
+    current_streak: Mapped[int] = mapped_column(default=0)
+    best_streak: Mapped[int] = mapped_column(default=0)
+    last_attempt_date: Mapped[date] = mapped_column()
+
+    # The current streak is broken once a whole day passes without an attempt
+    @staticmethod
+    def active_streak(stats) -> int:
+        yesterday = datetime.now(tz=timezone.utc).date() - timedelta(days=1)
+        return stats.current_streak if stats.last_attempt_date >= yesterday else 0
+
+    @classmethod
+    def row_columns(cls) -> list:
+        return [cls.user_id, cls.attempt_count, cls.best_score, cls.average_score, cls.current_streak, cls.best_streak,
+                cls.last_attempt_date]
+
+    # username can be passed in when it has already been loaded for a batch of stats
+    def to_dict(self, username: Optional[str] = ...):
+        return self.row_to_dict(self, db.session.get(User, self.user_id).username if username is ... else username)
+
+    @classmethod
+    def row_to_dict(cls, stats, username: Optional[str]) -> dict:
+        return {
+            'user_id': stats.user_id,
+            'username': username,
+            'attempt_count': stats.attempt_count,
+            'best_score': round(stats.best_score, 1),
+            'average_score': round(stats.average_score, 1),
+            'current_streak': cls.active_streak(stats),
+            'best_streak': stats.best_streak,
+            'last_attempt_date': stats.last_attempt_date.isoformat()
+        }
+
+    # Serialize stats with a single query for the usernames
+    @classmethod
+    def to_dict_list(cls, stats: list['LeaderboardStatsMixin'], fieldset: 'Fieldset' = None) -> list[dict]:
+        user_ids = {stat.user_id for stat in stats}
+        usernames = dict(db.session.execute(
+            select(User.id, User.username).where(User.id.in_(user_ids))).all()) if user_ids else {}
+        return [cls.row_to_dict(stat, usernames.get(stat.user_id)) for stat in stats]
+
+
+# Stats of a user over the attempts of all quizzes
+class UserStat(LeaderboardStatsMixin, db.Model):
+    __tablename__ = 'user_stat'
+    __table_args__ = tuple(Index(f'ix_user_stat_{column}', column, 'user_id')
+                           for column in LeaderboardStatsMixin.SORT_COLUMNS)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey(
+        User.id, ondelete='CASCADE'), primary_key=True)
+
+    def __repr__(self) -> str:
+        return f'UserStat <{self.user_id}>'
+
+
+# Stats of a user over the attempts of quizzes on one subject
+class UserSubjectStat(LeaderboardStatsMixin, db.Model):
+    __tablename__ = 'user_subject_stat'
+    __table_args__ = tuple(Index(f'ix_user_subject_stat_subject_{column}', 'subject', column, 'user_id')
+                           for column in LeaderboardStatsMixin.SORT_COLUMNS)
+
+    user_id: Mapped[int] = mapped_column(ForeignKey(
+        User.id, ondelete='CASCADE'), primary_key=True)
+    subject: Mapped[str] = mapped_column(String(25), primary_key=True)
+
+    def __repr__(self) -> str:
+        return f'UserSubjectStat <{self.user_id}:{self.subject}>'
+
+    @classmethod
+    def row_columns(cls) -> list:
+        return super().row_columns() + [cls.subject]
+
+    @classmethod
+    def row_to_dict(cls, stats, username: Optional[str]) -> dict:
+        return {**super().row_to_dict(stats, username), 'subject': stats.subject}
@@ -0,0 +1,76 @@
+import time
+from threading import Lock
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from app import app, db
+
+# Counters of the connection pool of this server process, since it started
+# Only the pool of the app's engine is counted, not those of other engines created in the process
+counters = {
+    'connections_opened': 0,
+    'connections_invalidated': 0,
+    'checkouts': 0,
+    'peak_checked_out': 0
+}
+checked_out = 0
+lock = Lock()
+started_at = time.monotonic()
+
+with app.app_context():
+    engine = db.engine
+
+
+@event.listens_for(engine, 'connect')
+def count_connect(dbapi_connection, connection_record):
+    with lock:
+        counters['connections_opened'] += 1
+
+
+@event.listens_for(engine, 'invalidate')
+def count_invalidate(dbapi_connection, connection_record, exception):
+    with lock:
+        counters['connections_invalidated'] += 1
+
+
+@event.listens_for(engine, 'checkout')
+def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    global checked_out
+    with lock:
+        counters['checkouts'] += 1
+        checked_out += 1
+        counters['peak_checked_out'] = max(counters['peak_checked_out'], checked_out)
+
+
+@event.listens_for(engine, 'checkin')
+def count_checkin(dbapi_connection, connection_record):
+    global checked_out
+    with lock:
+        checked_out = max(checked_out - 1, 0)
+
+
+# Current state of the connection pool of this server process
+# size, idle, overflow and utilization are only known for pools with a fixed size, which SQLite doesn't use
+def pool_stats() -> dict:
+    pool = db.engine.pool
+    with lock:
+        stats = {
+            'pool': type(pool).__name__,
+            'checked_out': checked_out,
+            **counters,
+            'uptime_seconds': round(time.monotonic() - started_at, 3)
+        }
+    if isinstance(pool, QueuePool):
+        # The pool has no public accessor for max_overflow, so it is read from the options the engine was created with
+        # (10 is SQLAlchemy's default)
+        max_overflow = app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('max_overflow', 10)
+        capacity = pool.size() + max(max_overflow, 0)
+        stats.update({
+            'checked_out': pool.checkedout(),
+            'size': pool.size(),
+            'max_overflow': max_overflow,
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'utilization': round(pool.checkedout() / capacity, 3) if capacity else None
+        })
+    return stats
+
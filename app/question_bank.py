@@ -0,0 +1,101 @@
+import random
+from sqlalchemy import select, func
+from app import db
+from app.models import Quiz, Question, Choice, QuizAttempt, AttemptQuestion, load_choice_rows
+from quiz_generator.question_generator import generate_questions
+from quiz_generator.dedup import NearDuplicateIndex
+
+# Number of random candidates whose choices are checked at a time, per question still needed
+# Some candidates are left out for having a different number of choices or the same text as a picked question
+SAMPLE_BATCH_FACTOR = 2
+MIN_SAMPLE_BATCH = 20
+
+
+# Randomly pick up to question_count existing questions on the subject (ignoring case) that have choice_count choices,
+# in the same format as generate_questions returns
+# Only one question is picked from each group of near-duplicates (or of questions with the same text), and questions
+# that have the same text as, or are near-duplicates of, a question that the user has already seen in one of their
+# attempts are left out
+# A batch of candidates is sampled in the database with ORDER BY random() and LIMIT, so only the ids of that batch are
+# read. Only if too few of them can be picked are the ids of all the other candidates read and shuffled
+def sample_questions(subject: str, question_count: int, choice_count: int, user_id: int = None) -> list[dict]:
+    group_id = func.coalesce(Question.canonical_id, Question.id)
+    candidates = (select(Question.id, group_id)
+                  .join(Quiz, Quiz.id == Question.quiz_id)
+                  .where(func.lower(Quiz.subject) == subject.strip().lower()))
+    if user_id is not None:
+        seen_questions = (select(Question.__table__)
+                          .join(AttemptQuestion, AttemptQuestion.question_id == Question.id)
+                          .join(QuizAttempt, QuizAttempt.id == AttemptQuestion.attempt_id)
+                          .where(QuizAttempt.user_id == user_id)).subquery()
+        candidates = candidates.where(
+            group_id.not_in(select(func.coalesce(seen_questions.c.canonical_id, seen_questions.c.id))),
+            Question.text.not_in(select(seen_questions.c.text)))
+
+    picked = {}  # question_id -> text of the picked questions, in the order they were picked
+    picked_groups = set()
+    sample_size = max(SAMPLE_BATCH_FACTOR * question_count, MIN_SAMPLE_BATCH)
+    sampled = db.session.execute(candidates.order_by(func.random()).limit(sample_size)).all()
+    pick_candidates(sampled, question_count, choice_count, picked, picked_groups)
+
+    if len(picked) < question_count and len(sampled) == sample_size:
+        sampled_ids = {question_id for question_id, _ in sampled}
+        remaining = [candidate for candidate in db.session.execute(candidates) if candidate[0] not in sampled_ids]
+        random.shuffle(remaining)
+        pick_candidates(remaining, question_count, choice_count, picked, picked_groups)
+
+    choices_by_question = load_choice_rows(picked.keys())
+    return [{
+        'question': text,
+        'choices': [{'text': choice.text, 'correct': choice.correct} for choice in choices_by_question[question_id]]
+    } for question_id, text in picked.items()]
+
+
+# Pick candidates, given as (question_id, group_id) in a random order, until question_count questions have been picked
+# Their choices and texts are checked for a batch of candidates at a time
+def pick_candidates(candidates: list, question_count: int, choice_count: int, picked: dict[int, str],
+                    picked_groups: set) -> None:
+    picked_texts = set(picked.values())
+    position = 0
+    while len(picked) < question_count and position < len(candidates):
+        batch = []
+        while len(batch) < max(SAMPLE_BATCH_FACTOR * (question_count - len(picked)), MIN_SAMPLE_BATCH) \
+                and position < len(candidates):
+            if candidates[position][1] not in picked_groups:
+                batch.append(candidates[position])
+            position += 1
+        if not batch:
+            break
+
+        texts = dict(db.session.execute(
+            select(Question.id, Question.text).join(Choice, Choice.question_id == Question.id)
+            .where(Question.id.in_([question_id for question_id, _ in batch]))
+            .group_by(Question.id, Question.text).having(func.count(Choice.id) == choice_count)).all())
+        for question_id, question_group in batch:
+            if question_id not in texts or question_group in picked_groups or texts[question_id] in picked_texts:
+                continue
+            picked[question_id] = texts[question_id]
+            picked_groups.add(question_group)
+            picked_texts.add(texts[question_id])
+            if len(picked) == question_count:
+                break
+
+
+# Assemble the questions of a new quiz from existing questions, and only generate as many as are missing
+# Returns the questions and how many of them were reused
+def assemble_questions(subject: str, question_count: int, choice_count: int, user_id: int = None) -> tuple[list[dict], int]:
+    questions_with_choices = sample_questions(subject, question_count, choice_count, user_id=user_id)
+    reused_count = len(questions_with_choices)
+    # End the read transaction rather than holding it open while waiting for the generator
+    db.session.commit()
+
+    if reused_count < question_count:
+        seen_questions = NearDuplicateIndex()
+        for question_data in questions_with_choices:
+            seen_questions.add_if_new(question_data['question'])
+        generated = generate_questions(subject=subject, question_count=question_count - reused_count,
+                                       choice_count=choice_count)
+        questions_with_choices += [question_data for question_data in generated
+                                   if seen_questions.add_if_new(question_data['question'])]
+
+    return questions_with_choices, reused_count
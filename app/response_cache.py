@@ -0,0 +1,133 @@
+import hashlib
+import json
+import threading
+import uuid
+from functools import wraps
+from cachetools import TTLCache
+from flask import request, make_response
+from app import app
+
+# Responses of read-mostly endpoints are cached by URL and served with a strong ETag, so that clients can revalidate them
+# with If-None-Match and get an empty 304 response if they haven't changed
+# Each cached response is tagged with the rows it was built from (e.g. 'quiz:1'), and invalidating a tag drops every response
+# tagged with it. Tags are random tokens stored in the backend alongside the responses: a response is only served if
+# the tokens of its tags are the same as when it was cached, and invalidating a tag deletes its token
+
+
+# Keeps responses in the memory of the server process, bounded by the total size of the cached response bodies
+class MemoryBackend(object):
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.cache = TTLCache(maxsize=max_bytes, ttl=ttl,
+                              getsizeof=lambda value: len(value['body']) if isinstance(value, dict) else 1)
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: list[str]) -> list:
+        with self.lock:
+            return [self.cache.get(key) for key in keys]
+
+    def set(self, key: str, value) -> None:
+        with self.lock:
+            try:
+                self.cache[key] = value
+            except ValueError:
+                # Larger than the whole cache
+                pass
+
+    def delete_many(self, keys: list[str]) -> None:
+        with self.lock:
+            for key in keys:
+                self.cache.pop(key, None)
+
+
+# Shares cached responses between server processes, so that invalidating them in one process applies to all of them
+class RedisBackend(object):
+    def __init__(self, url: str, ttl: float) -> None:
+        # Only needed if RESPONSE_CACHE_REDIS_URL is set
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    def get_many(self, keys: list[str]) -> list:
+        return [json.loads(value) if value is not None else None for value in self.client.mget(keys)]
+
+    def set(self, key: str, value) -> None:
+        self.client.set(key, json.dumps(value), ex=self.ttl)
+
+    def delete_many(self, keys: list[str]) -> None:
+        if keys:
+            self.client.delete(*keys)
+
+
+class ResponseCache(object):
+    # Every response is tagged with this, so that invalidating it drops all cached responses
+    GLOBAL_TAG = 'all'
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+
+    def tag_keys(self, tags: list[str]) -> list[str]:
+        return [f'tag:{tag}' for tag in [ResponseCache.GLOBAL_TAG, *tags]]
+
+    # Returns the cached response for the key, or None, along with the current tokens of the tags
+    # Missing tokens are created here, before the response is built, so that an invalidation while it is being built
+    # changes the tokens and prevents the outdated response from being served
+    def get(self, key: str, tags: list[str]) -> tuple[dict | None, list[str]]:
+        tag_keys = self.tag_keys(tags)
+        entry, *tokens = self.backend.get_many([f'response:{key}', *tag_keys])
+        for i, token in enumerate(tokens):
+            if token is None:
+                tokens[i] = uuid.uuid4().hex
+                self.backend.set(tag_keys[i], tokens[i])
+        if entry is None or entry['tokens'] != tokens:
+            return None, tokens
+        return entry, tokens
+
+    def set(self, key: str, body: bytes, tokens: list[str]) -> dict:
+        entry = {
+            'body': body.decode(),
+            'etag': hashlib.sha1(body).hexdigest(),
+            'tokens': tokens
+        }
+        self.backend.set(f'response:{key}', entry)
+        return entry
+
+    def invalidate(self, *tags: str) -> None:
+        self.backend.delete_many([f'tag:{tag}' for tag in tags])
+
+    def invalidate_all(self) -> None:
+        self.invalidate(ResponseCache.GLOBAL_TAG)
+
+
+if app.config['RESPONSE_CACHE_REDIS_URL']:
+    response_cache = ResponseCache(RedisBackend(
+        app.config['RESPONSE_CACHE_REDIS_URL'], ttl=app.config['RESPONSE_CACHE_TTL']))
+else:
+    response_cache = ResponseCache(MemoryBackend(
+        max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'], ttl=app.config['RESPONSE_CACHE_TTL']))
+
+
+# Cache the successful responses of a view
+# get_tags is called with the arguments of the view and returns the tags of the response, or None to not cache it
+def cached_response(get_tags):
+    def decorator(view):
+        @wraps(view)
+        def cached_view(**view_args):
+            tags = get_tags(**view_args)
+            if tags is None:
+                return view(**view_args)
+
+            entry, tokens = response_cache.get(request.full_path, tags)
+            if entry is None:
+                response = make_response(view(**view_args))
+                if response.status_code != 200:
+                    return response
+                entry = response_cache.set(request.full_path, response.get_data(), tokens)
+
+            response = app.response_class(entry['body'], mimetype='application/json')
+            response.set_etag(entry['etag'])
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['RESPONSE_CACHE_MAX_AGE']
+            # Responds with 304 Not Modified if the request's If-None-Match matches the ETag
+            return response.make_conditional(request)
+        return cached_view
+    return decorator
@@ -1 +1 @@
-from app.routes import quizzes, users, questions, choices, quiz_attempts, user_choices, errors
+from app.routes import quizzes, users, questions, choices, quiz_attempts, user_choices, quiz_jobs, stats, leaderboard, metrics, errors
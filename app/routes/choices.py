@@ -1,16 +1,27 @@
 from app import app, db
-from app.models import Choice
+from app.models import Choice, QuizAttempt
+from app.routes.pagination import collection_response
+from app.grading import answer_keys
+from app.leaderboard import refresh_leaderboard
+from app.response_cache import cached_response, response_cache
+from sqlalchemy import select
 
 @app.get('/choices')
 def get_all_choices():
-    return [choice.to_dict() for choice in Choice.query.all()]
+    return collection_response(Choice, select(Choice).order_by(Choice.id), endpoint='get_all_choices')
 
 @app.get('/questions/<int:question_id>/choices')
+@cached_response(lambda question_id: [f'question:{question_id}'])
 def get_question_choices(question_id: int):
     return [choice.to_dict() for choice in Choice.query.filter_by(question_id=question_id).all()]
 
 @app.delete('/choices')
 def delete_all_choices():
     Choice.query.delete()
+    # All UserChoices are deleted along with the choices
+    QuizAttempt.query.update({QuizAttempt.answered_count: 0, QuizAttempt.correct_count: 0})
+    refresh_leaderboard()
     db.session.commit()
+    answer_keys.invalidate_all()
+    response_cache.invalidate_all()
     return '', 204
\ No newline at end of file
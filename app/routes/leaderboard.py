@@ -0,0 +1,46 @@
+from flask import request
+from app import app, db
+from app.models import User, UserStat, UserSubjectStat
+from app.routes.errors import error_response
+from app.routes.pagination import pagination_args
+from sqlalchemy import select
+
+
+# Rank users by one of the sort columns, reading the top of the leaderboard from the index on that column
+def leaderboard_response(model, query, endpoint: str, **kwargs):
+    sort = request.args.get('sort', 'best_score')
+    if sort not in model.SORT_COLUMNS:
+        return error_response(status_code=400, message=f'sort must be one of {", ".join(model.SORT_COLUMNS)}')
+
+    args = pagination_args()
+    page, per_page = args['page'], args['per_page']
+    query = query.order_by(getattr(model, sort).desc(), model.user_id.desc())
+    leaderboard = model.to_collection_dict(query, endpoint=endpoint, page=page, per_page=per_page, sort=sort, **kwargs)
+    for rank, item in enumerate(leaderboard['items'], start=(page - 1) * per_page + 1):
+        item['rank'] = rank
+    return leaderboard
+
+
+@app.get('/leaderboard')
+def get_leaderboard():
+    return leaderboard_response(UserStat, select(UserStat), endpoint='get_leaderboard')
+
+
+@app.get('/subjects/<subject>/leaderboard')
+def get_subject_leaderboard(subject: str):
+    return leaderboard_response(UserSubjectStat, select(UserSubjectStat).where(UserSubjectStat.subject == subject),
+                                endpoint='get_subject_leaderboard', subject=subject)
+
+
+@app.get('/users/<int:user_id>/stats')
+def get_user_stats(user_id: int):
+    user = db.get_or_404(User, user_id)
+    user_stat = db.session.get(UserStat, user_id)
+    subject_stats = db.session.scalars(
+        select(UserSubjectStat).where(UserSubjectStat.user_id == user_id).order_by(UserSubjectStat.subject)).all()
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'overall': user_stat.to_dict(username=user.username) if user_stat else None,
+        'subjects': [subject_stat.to_dict(username=user.username) for subject_stat in subject_stats]
+    }
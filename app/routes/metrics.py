@@ -0,0 +1,8 @@
+from app import app
+from app.metrics import render_metrics
+
+
+# Metrics of this server process in the Prometheus text exposition format
+@app.get('/metrics')
+def get_metrics():
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,39 @@
+from flask import request, Response, stream_with_context, abort
+from app.models import Fieldset
+
+
+# Read the pagination options shared by the paginated endpoints from the query string
+# Passing a cursor (an empty one for the first page) switches from page numbers to cursor pagination,
+# in which case the total number of items is only counted if count=true is also passed
+def pagination_args(default_per_page: int = 20, max_per_page: int = 100) -> dict:
+    return {
+        'page': max(request.args.get('page', 1, type=int), 1),
+        'per_page': max(min(request.args.get('per_page', default_per_page, type=int), max_per_page), 1),
+        'cursor': request.args.get('cursor'),
+        'include_total': request.args.get('count', 'false').lower() == 'true'
+    }
+
+
+# Read the comma-separated names of the fields of each item to return (fields=) and of the relationships to embed
+# in each item (expand=) from the query string. An empty expand= embeds nothing, and leaving either out uses the default
+def fieldset_args(model) -> Fieldset:
+    fieldset = Fieldset()
+    allowed = {'fields': {column.key for column in model.row_columns()}, 'expand': set(model.EXPANDABLE)}
+    for name, allowed_names in allowed.items():
+        if name not in request.args:
+            continue
+        names = {value.strip() for value in request.args[name].split(',') if value.strip()}
+        if names - allowed_names:
+            abort(400, description=f"Unknown {name}: {', '.join(sorted(names - allowed_names))}. "
+                                   f"Allowed {name}: {', '.join(sorted(allowed_names)) or 'none'}")
+        # An empty fields= returns all the fields
+        setattr(fieldset, name, (names or None) if name == 'fields' else names)
+    return fieldset
+
+
+# Respond with a page of the collection, or with the whole collection streamed as NDJSON if format=ndjson is passed
+def collection_response(model, query, endpoint: str, fieldset: Fieldset = None, **kwargs):
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(model.to_ndjson_stream(query, fieldset=fieldset)),
+                        mimetype='application/x-ndjson')
+    return model.to_collection_dict(query, endpoint=endpoint, fieldset=fieldset, **pagination_args(), **kwargs)
@@ -1,27 +1,56 @@
+import random
 from app import app, db
-from app.models import Question
+from app.models import Question, Quiz, QuizAttempt
+from app.routes.pagination import pagination_args, fieldset_args
+from app.grading import answer_keys
+from app.leaderboard import refresh_leaderboard
+from app.response_cache import cached_response, response_cache
 from flask import request
-from sqlalchemy.sql.expression import func
 from sqlalchemy import select
 
 
 @app.get('/questions')
 def get_all_questions():
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 20, type=int), 100)
-    return Question.to_collection_dict(select(Question), page=page, per_page=per_page, endpoint='get_quizzes')
+    return Question.to_collection_dict(select(Question), endpoint='get_all_questions', fieldset=fieldset_args(Question),
+                                       **pagination_args())
 
 
+# Questions (and their choices) are returned in a random order determined by a seed
+# The seed is returned in _meta and included in the page links, so passing it back gives consistent pages
+# Responses are only cached if a seed is passed, since they are in a different order each time otherwise
 @app.get('/quizzes/<int:quiz_id>/questions')
+@cached_response(lambda quiz_id: [f'quiz:{quiz_id}'] if 'seed' in request.args else None)
 def get_quiz_questions(quiz_id: int):
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 20, type=int), 100)
-    return Question.to_collection_dict(select(Question).where(Question.quiz_id == quiz_id).order_by(func.random()),
-                                       page=page, per_page=per_page, endpoint='get_quiz_questions', quiz_id=quiz_id)
+    args = pagination_args()
+    page, per_page = args['page'], args['per_page']
+    seed = request.args.get('seed', type=int)
+    if seed is None:
+        seed = random.getrandbits(32)
+
+    # Shuffle only the ids of the questions, then load the questions on the requested page
+    question_ids = db.session.scalars(
+        select(Question.id).where(Question.quiz_id == quiz_id).order_by(Question.id)).all()
+    random.Random(seed).shuffle(question_ids)
+    page_ids = question_ids[(page - 1) * per_page:page * per_page]
+    fieldset = fieldset_args(Question)
+    questions = {question.id: question for question in
+                 Question.fetch_items(select(Question).where(Question.id.in_(page_ids)), fieldset)}
+    items = Question.to_dict_list([questions[question_id] for question_id in page_ids], fieldset, seed=seed)
+
+    collection = Question.to_page_dict(items, endpoint='get_quiz_questions', page=page, per_page=per_page,
+                                       total_items=len(question_ids), quiz_id=quiz_id, seed=seed, **fieldset.link_args())
+    collection['_meta']['seed'] = seed
+    return collection
 
 
 @app.delete('/questions')
 def delete_all_questions():
     Question.query.delete()
+    # All UserChoices are deleted along with the choices of the questions
+    Quiz.query.update({Quiz.question_count: 0})
+    QuizAttempt.query.update({QuizAttempt.answered_count: 0, QuizAttempt.correct_count: 0})
+    refresh_leaderboard()
     db.session.commit()
+    answer_keys.invalidate_all()
+    response_cache.invalidate_all()
     return '', 204
@@ -1,39 +1,47 @@
+from collections import Counter
 from app import app, db
-from app.models import QuizAttempt, AttemptQuestion, UserChoice
+from app.models import QuizAttempt, AttemptQuestion, UserChoice, Choice, ChoiceStat, Question, Quiz, User
 from flask import request
 from app.routes.errors import error_response
-from sqlalchemy import select
+from app.routes.pagination import pagination_args, fieldset_args, collection_response
+from app.grading import answer_keys, grade_answers
+from app.leaderboard import record_attempts
+from sqlalchemy import select, insert, delete, tuple_
 
 
 @app.get('/attempts')
 def get_all_attempts():
-    return [attempt.to_dict() for attempt in QuizAttempt.query.all()]
+    return collection_response(QuizAttempt, select(QuizAttempt).order_by(QuizAttempt.timestamp.desc()),
+                               endpoint='get_all_attempts', descending=True, fieldset=fieldset_args(QuizAttempt))
 
 
 @app.get('/attempts/<int:attempt_id>')
 def get_attempt_by_id(attempt_id: int):
-    return QuizAttempt.query.get_or_404(ident=attempt_id).to_dict()
+    return QuizAttempt.to_dict_or_404(attempt_id, fieldset_args(QuizAttempt))
 
 
 @app.get('/quizzes/<int:quiz_id>/attempts')
 def get_quiz_attempts(quiz_id: int):
-    return [attempt.to_dict() for attempt in QuizAttempt.query.filter(QuizAttempt.quiz_id == quiz_id).all()]
+    return collection_response(QuizAttempt, select(QuizAttempt).where(QuizAttempt.quiz_id == quiz_id).order_by(QuizAttempt.timestamp.desc()),
+                               endpoint='get_quiz_attempts', descending=True, fieldset=fieldset_args(QuizAttempt),
+                               quiz_id=quiz_id)
 
 
 # Get questions done on given attempt
 @app.get('/attempts/<int:attempt_id>/questions')
 def get_attempt_questions(attempt_id: int):
-    return [question.to_dict() for question in AttemptQuestion.query.filter(AttemptQuestion.attempt_id == attempt_id).order_by(AttemptQuestion.sequence_number).all()]
+    fieldset = fieldset_args(AttemptQuestion)
+    return AttemptQuestion.to_dict_list(AttemptQuestion.fetch_items(
+        select(AttemptQuestion).where(AttemptQuestion.attempt_id == attempt_id).order_by(AttemptQuestion.sequence_number),
+        fieldset), fieldset)
 
 
 # Get all quiz attempts made by given user, sorted from most recent to least recent
 @app.get('/users/<int:user_id>/attempts')
 def get_user_attempts(user_id: int):
-    page = request.args.get('page', 1, type=int)
-    per_page = min(request.args.get('per_page', 20, type=int), 100)
     return QuizAttempt.to_collection_dict(select(QuizAttempt).where(QuizAttempt.user_id == user_id).order_by(QuizAttempt.timestamp.desc()),
-                                          page=page, per_page=per_page,
-                                          endpoint='get_user_attempts', user_id=user_id)
+                                          endpoint='get_user_attempts', descending=True, user_id=user_id,
+                                          fieldset=fieldset_args(QuizAttempt), **pagination_args())
 
 
 # Save a new quiz attempt with the sequence of questions given and the choices chosen by the user
@@ -43,22 +51,214 @@ def add_quiz_attempt(quiz_id: int):
     if not user_id:
         return error_response(status_code=400, message='Missing or invalid user_id')
 
-    attempt_data = request.get_json()
-    questions_with_choice = attempt_data['questions']
+    attempt_data = request.get_json() or {}
+    submission = {'quiz_id': quiz_id, 'user_id': user_id, 'questions': attempt_data.get('questions')}
+
+    submissions, errors = validate_submissions([submission])
+    if errors:
+        return error_response(status_code=400, message='; '.join(errors))
+
+    quiz_attempt, grading = save_submissions(submissions)[0]
+    db.session.commit()
+
+    return {**quiz_attempt.to_dict(), 'grading': grading}, 201
 
-    # Create new quiz attempt
-    quiz_attempt = QuizAttempt(quiz_id=quiz_id, user_id=user_id)
-    db.session.add(quiz_attempt)
-    db.session.flush()
 
-    attempt_questions = [AttemptQuestion(attempt_id=quiz_attempt.id, question_id=question['question_id'],
-                                         sequence_number=index) for index, question in enumerate(questions_with_choice)]
-    user_choices = [UserChoice(attempt_id=quiz_attempt.id, choice_id=question['choice_id'])
-                    for question in questions_with_choice]
+MAX_BATCH_ATTEMPTS = 100
+MAX_BATCH_ANSWERS = 10000
 
-    db.session.bulk_save_objects(attempt_questions)
-    db.session.bulk_save_objects(user_choices)
 
+# Save many attempts in one request. Each item in 'attempts' is either a new attempt:
+#   {"quiz_id": 1, "user_id": 1, "questions": [{"question_id": 1, "choice_id": 2}, ...]}
+# or more answers for an existing attempt, where answering a question again replaces the previous answer:
+#   {"attempt_id": 1, "questions": [{"question_id": 1, "choice_id": 3}, ...]}
+# Either every attempt is saved or, if any of them is invalid, none are
+@app.post('/attempts/batch')
+def add_attempts_batch():
+    attempts_data = (request.get_json() or {}).get('attempts')
+    if not isinstance(attempts_data, list) or not attempts_data:
+        return error_response(status_code=400, message="'attempts' must be a non-empty list")
+    if len(attempts_data) > MAX_BATCH_ATTEMPTS:
+        return error_response(status_code=400, message=f'At most {MAX_BATCH_ATTEMPTS} attempts can be saved at once')
+
+    submissions, errors = validate_submissions(attempts_data)
+    if not errors and sum(len(submission['questions']) for submission in submissions) > MAX_BATCH_ANSWERS:
+        errors.append(f'At most {MAX_BATCH_ANSWERS} questions can be saved at once')
+    if errors:
+        return error_response(status_code=400, message='; '.join(errors))
+
+    saved_attempts = save_submissions(submissions)
     db.session.commit()
 
-    return quiz_attempt.to_dict(), 201
+    attempt_dicts = QuizAttempt.to_dict_list([quiz_attempt for quiz_attempt, _ in saved_attempts])
+    return {'attempts': [{**attempt_dict, 'grading': grading}
+                         for attempt_dict, (_, grading) in zip(attempt_dicts, saved_attempts)]}, 201
+
+
+# Parse attempt submissions and check that they are consistent with the database, with one query each for the
+# existing attempts, the quizzes and users of new attempts, the questions, the questions of the existing attempts
+# and the choices
+# Returns the parsed submissions and a list of error messages
+def validate_submissions(attempts_data: list) -> tuple[list[dict], list[str]]:
+    submissions = []
+    errors = []
+    for index, attempt_data in enumerate(attempts_data):
+        prefix = f'attempts[{index}]'
+        if not isinstance(attempt_data, dict):
+            errors.append(f'{prefix}: must be an object')
+            continue
+
+        submission = {'attempt_id': attempt_data.get('attempt_id'), 'quiz_id': attempt_data.get('quiz_id'),
+                      'user_id': attempt_data.get('user_id'), 'questions': []}
+        if submission['attempt_id'] is None:
+            for field in ['quiz_id', 'user_id']:
+                if not isinstance(submission[field], int):
+                    errors.append(f"{prefix}: '{field}' must be an integer")
+        elif not isinstance(submission['attempt_id'], int):
+            errors.append(f"{prefix}: 'attempt_id' must be an integer")
+
+        questions_data = attempt_data.get('questions')
+        if not isinstance(questions_data, list):
+            errors.append(f"{prefix}: 'questions' must be a list")
+            questions_data = []
+        for question_index, question_data in enumerate(questions_data):
+            question_id = question_data.get('question_id') if isinstance(question_data, dict) else None
+            choice_id = question_data.get('choice_id') if isinstance(question_data, dict) else None
+            if not isinstance(question_id, int) or not (choice_id is None or isinstance(choice_id, int)):
+                errors.append(f"{prefix}.questions[{question_index}]: 'question_id' and 'choice_id' must be integers")
+                continue
+            submission['questions'].append((question_id, choice_id))
+
+        # A new attempt lists each of its questions once, in order
+        question_ids = [question_id for question_id, _ in submission['questions']]
+        if submission['attempt_id'] is None and len(set(question_ids)) != len(question_ids):
+            errors.append(f'{prefix}: each question can only appear once')
+
+        submissions.append(submission)
+
+    if errors:
+        return submissions, errors
+
+    attempt_ids = {submission['attempt_id'] for submission in submissions if submission['attempt_id'] is not None}
+    existing_attempts = dict(db.session.execute(
+        select(QuizAttempt.id, QuizAttempt.quiz_id).where(QuizAttempt.id.in_(attempt_ids))).all()) if attempt_ids else {}
+
+    new_submissions = [submission for submission in submissions if submission['attempt_id'] is None]
+    quiz_ids = {submission['quiz_id'] for submission in new_submissions}
+    user_ids = {submission['user_id'] for submission in new_submissions}
+    existing_quiz_ids = set(db.session.scalars(select(Quiz.id).where(Quiz.id.in_(quiz_ids)))) if quiz_ids else set()
+    existing_user_ids = set(db.session.scalars(select(User.id).where(User.id.in_(user_ids)))) if user_ids else set()
+
+    question_ids = {question_id for submission in submissions for question_id, _ in submission['questions']}
+    question_quizzes = dict(db.session.execute(
+        select(Question.id, Question.quiz_id).where(Question.id.in_(question_ids))).all()) if question_ids else {}
+
+    # Answers to existing attempts can only be for questions that were given in the attempt
+    attempt_question_pairs = {(submission['attempt_id'], question_id) for submission in submissions
+                              if submission['attempt_id'] in existing_attempts for question_id, _ in submission['questions']}
+    existing_attempt_questions = {tuple(row) for row in db.session.execute(
+        select(AttemptQuestion.attempt_id, AttemptQuestion.question_id)
+        .where(tuple_(AttemptQuestion.attempt_id, AttemptQuestion.question_id).in_(attempt_question_pairs)))
+    } if attempt_question_pairs else set()
+
+    choice_ids = {choice_id for submission in submissions for _, choice_id in submission['questions'] if choice_id is not None}
+    choice_questions = dict(db.session.execute(
+        select(Choice.id, Choice.question_id).where(Choice.id.in_(choice_ids))).all()) if choice_ids else {}
+
+    for index, submission in enumerate(submissions):
+        prefix = f'attempts[{index}]'
+        if submission['attempt_id'] is not None:
+            if submission['attempt_id'] not in existing_attempts:
+                errors.append(f"{prefix}: attempt {submission['attempt_id']} does not exist")
+                continue
+            submission['quiz_id'] = existing_attempts[submission['attempt_id']]
+        else:
+            if submission['quiz_id'] not in existing_quiz_ids:
+                errors.append(f"{prefix}: quiz {submission['quiz_id']} does not exist")
+            if submission['user_id'] not in existing_user_ids:
+                errors.append(f"{prefix}: user {submission['user_id']} does not exist")
+
+        for question_index, (question_id, choice_id) in enumerate(submission['questions']):
+            question_prefix = f'{prefix}.questions[{question_index}]'
+            if question_id not in question_quizzes:
+                errors.append(f'{question_prefix}: question {question_id} does not exist')
+            elif question_quizzes[question_id] != submission['quiz_id']:
+                errors.append(f"{question_prefix}: question {question_id} is not in quiz {submission['quiz_id']}")
+            elif submission['attempt_id'] is not None and \
+                    (submission['attempt_id'], question_id) not in existing_attempt_questions:
+                errors.append(f"{question_prefix}: question {question_id} is not in attempt {submission['attempt_id']}")
+            elif choice_id is None:
+                continue
+            elif choice_id not in choice_questions:
+                errors.append(f'{question_prefix}: choice {choice_id} does not exist')
+            elif choice_questions[choice_id] != question_id:
+                errors.append(f'{question_prefix}: choice {choice_id} is not a choice of question {question_id}')
+
+    return submissions, errors
+
+
+# Write validated submissions with bulk inserts and update the scores of the attempts, without committing
+# A question answered again replaces its previous UserChoice in the attempt
+# Returns each attempt with the grading of the answers submitted for it
+def save_submissions(submissions: list[dict]) -> list[tuple[QuizAttempt, dict]]:
+    quiz_attempts = [QuizAttempt(quiz_id=submission['quiz_id'], user_id=submission['user_id'])
+                     if submission['attempt_id'] is None else None for submission in submissions]
+    db.session.add_all([quiz_attempt for quiz_attempt in quiz_attempts if quiz_attempt is not None])
+    db.session.flush()
+
+    existing_attempt_ids = [submission['attempt_id'] for submission in submissions if submission['attempt_id'] is not None]
+    existing_attempts = {quiz_attempt.id: quiz_attempt for quiz_attempt in db.session.scalars(
+        select(QuizAttempt).where(QuizAttempt.id.in_(existing_attempt_ids)))} if existing_attempt_ids else {}
+    quiz_attempts = [quiz_attempt or existing_attempts[submission['attempt_id']]
+                     for quiz_attempt, submission in zip(quiz_attempts, submissions)]
+
+    attempt_questions = []
+    answers = {}  # (attempt_id, question_id) -> choice_id, so the last answer to a question wins
+    for quiz_attempt, submission in zip(quiz_attempts, submissions):
+        for sequence_number, (question_id, choice_id) in enumerate(submission['questions']):
+            if submission['attempt_id'] is None:
+                attempt_questions.append({'attempt_id': quiz_attempt.id, 'question_id': question_id,
+                                          'sequence_number': sequence_number})
+            if choice_id is not None:
+                answers[(quiz_attempt.id, question_id)] = choice_id
+
+    if attempt_questions:
+        db.session.execute(insert(AttemptQuestion), attempt_questions)
+
+    # Count the picks of each choice for ChoiceStat, less the picks of the answers being replaced
+    picks = Counter(answers.values())
+
+    # Remove previous answers to the questions being answered in existing attempts
+    reanswered = [(attempt_id, question_id) for attempt_id, question_id in answers if attempt_id in existing_attempts]
+    if reanswered:
+        previous_choices = db.session.execute(
+            select(UserChoice.attempt_id, UserChoice.choice_id).join(Choice, Choice.id == UserChoice.choice_id)
+            .where(tuple_(UserChoice.attempt_id, Choice.question_id).in_(reanswered))).all()
+        if previous_choices:
+            db.session.execute(delete(UserChoice).where(
+                tuple_(UserChoice.attempt_id, UserChoice.choice_id).in_([tuple(row) for row in previous_choices])))
+            picks.subtract(choice_id for _, choice_id in previous_choices)
+
+    if answers:
+        db.session.execute(insert(UserChoice), [{'attempt_id': attempt_id, 'choice_id': choice_id}
+                                                for (attempt_id, _), choice_id in answers.items()])
+    ChoiceStat.add_picks(picks)
+
+    # Grade the submitted answers against the answer keys of the quizzes
+    quiz_answer_keys = answer_keys.get_many({submission['quiz_id'] for submission in submissions})
+    gradings = [grade_answers(quiz_answer_keys[submission['quiz_id']], submission['questions'])
+                for submission in submissions]
+
+    # Store the scores of the attempts in the same transaction
+    # New attempts are scored from their grading, while existing attempts are recounted since they may have earlier answers
+    for quiz_attempt, submission, grading in zip(quiz_attempts, submissions, gradings):
+        if submission['attempt_id'] is None:
+            quiz_attempt.answered_count = grading['answered_count']
+            quiz_attempt.correct_count = grading['correct_count']
+    previous_correct_counts = {attempt_id: quiz_attempt.correct_count
+                               for attempt_id, quiz_attempt in existing_attempts.items()}
+    if existing_attempts:
+        QuizAttempt.refresh_counts(QuizAttempt.id.in_(existing_attempts.keys()))
+    record_attempts(quiz_attempts, previous_correct_counts)
+
+    return list(zip(quiz_attempts, gradings))
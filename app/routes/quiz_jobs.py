@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from app import app, db
+from app.models import Quiz, QuizJob
+from quiz_generator.question_generator import generate_questions
+
+# Quizzes are generated by a pool of background threads so that the request that creates a job
+# returns immediately instead of holding a worker and a transaction open for the whole generator call
+executor = ThreadPoolExecutor(max_workers=app.config['QUIZ_JOB_WORKERS'], thread_name_prefix='quiz-job')
+
+
+def submit_quiz_job(job: QuizJob):
+    executor.submit(run_quiz_job, job.id)
+
+
+def run_quiz_job(job_id: int):
+    with app.app_context():
+        job = db.session.get(QuizJob, job_id)
+        job.status = QuizJob.RUNNING
+        db.session.commit()
+
+        try:
+            questions_with_choices = generate_questions(
+                subject=job.subject, question_count=job.question_count, choice_count=job.choice_count)
+            quiz = Quiz.add_generated(subject=job.subject, questions_with_choices=questions_with_choices)
+            job.quiz_id = quiz.id
+            job.status = QuizJob.DONE
+        except Exception as error:
+            db.session.rollback()
+            job.status = QuizJob.FAILED
+            job.error = f'Error generating questions: {error}'[:500]
+
+        job.finished_at = datetime.now(tz=timezone.utc)
+        db.session.commit()
+
+
+@app.get('/quiz_jobs/<int:job_id>')
+def get_quiz_job(job_id: int):
+    return db.get_or_404(QuizJob, job_id).to_dict()
@@ -1,90 +1,207 @@
-from flask import request, jsonify
+from flask import request, jsonify, url_for, Response, stream_with_context
 from app import app, db
-from app.models import Quiz, Question, Choice
+from app.models import Quiz, Question, Choice, QuizAttempt, UserChoice, QuizJob
 from app.routes.errors import error_response
-from quiz_generator.question_generator import generate_questions
+from app.routes.pagination import pagination_args, fieldset_args
+from app.routes.quiz_jobs import submit_quiz_job
+from app.grading import answer_keys
+from app.leaderboard import refresh_leaderboard
+from app.response_cache import cached_response, response_cache
+from app.search import find_quizzes
+from app.question_bank import assemble_questions
+from quiz_generator.question_generator import generate_questions, stream_questions
 from sqlalchemy import select
 from sqlalchemy.exc import DataError
 
 
+# Quizzes don't change after they are created, so their responses are cached until they are deleted
 @app.get('/quizzes/<int:quiz_id>')
+@cached_response(lambda quiz_id: [f'quiz:{quiz_id}'])
 def get_quiz(quiz_id: int):
-    return Quiz.query.get_or_404(ident=quiz_id).to_dict()
+    return Quiz.to_dict_or_404(quiz_id, fieldset_args(Quiz))
 
 
 @app.get('/quizzes')
 def get_quizzes():
-    page = request.args.get('page', 1, type=int)
-    # default 10 per page, maximum 100 per page
-    per_page = min(request.args.get('per_page', 20, type=int), 100)
-    return Quiz.to_collection_dict(select(Quiz), page=page, per_page=per_page, endpoint='get_quizzes')
+    return Quiz.to_collection_dict(select(Quiz), endpoint='get_quizzes', fieldset=fieldset_args(Quiz), **pagination_args())
+
+
+# Search quizzes by subject and question text, with the best matches first
+@app.get('/quizzes/search')
+def search_quizzes():
+    q = request.args.get('q', '').strip()
+    if not q:
+        return error_response(status_code=400, message="'q' query parameter is required")
+    args = pagination_args()
+    return find_quizzes(q, endpoint='search_quizzes', cursor=args['cursor'], per_page=args['per_page'])
 
 
 MIN_QUESTIONS = 5
-MAX_QUESTIONS = 20
+MAX_QUESTIONS = 200
 MIN_CHOICES = 2
 MAX_CHOICES = 6
 
 
+# Pass async=true to generate the quiz in the background instead of waiting for it
+# The response is then 202 with a job whose status can be polled at /quiz_jobs/<job_id>
+# Pass stream=true to receive the quiz and each of its questions as NDJSON as soon as they are saved
+# Pass reuse=true to build the quiz from existing questions on the same subject, only generating the questions that are missing
+# With user_id, questions that the user has already seen in their attempts are not reused
 @app.post('/quizzes')
 def create_quiz():
     quiz_data: dict = request.get_json()
+    (subject, question_count, choice_count), error = parse_quiz_request(quiz_data)
+    if error is not None:
+        return error
+
+    if request.args.get('async', 'false').lower() == 'true':
+        job = QuizJob(subject=subject, question_count=question_count, choice_count=choice_count)
+        db.session.add(job)
+        db.session.commit()
+        submit_quiz_job(job)
+        return job.to_dict(), 202, {'Location': url_for('get_quiz_job', job_id=job.id)}
+
+    if request.args.get('stream', 'false').lower() == 'true':
+        return Response(stream_with_context(stream_quiz(subject, question_count, choice_count)),
+                        mimetype='application/x-ndjson')
+
+    # Generate the questions before writing anything, so that no transaction is held open while waiting for the generator
+    reused_count = None
+    try:
+        if request.args.get('reuse', 'false').lower() == 'true':
+            questions_with_choices, reused_count = assemble_questions(
+                subject=subject, question_count=question_count, choice_count=choice_count,
+                user_id=request.args.get('user_id', type=int))
+        else:
+            questions_with_choices = get_generated_questions(
+                subject=subject, question_count=question_count, choice_count=choice_count)
+    except Exception as error:
+        return error_response(status_code=500, message=f"Error generating questions: {error}")
+
+    try:
+        quiz = Quiz.add_generated(subject=subject, questions_with_choices=questions_with_choices)
+    except DataError as error:
+        db.session.rollback()
+        return error_response(status_code=400, message=f"Invalid question or choices: {error}")
+
+    db.session.commit()
+
+    if reused_count is not None:
+        return {**quiz.to_dict(), 'reused_question_count': reused_count}, 201
+    return quiz.to_dict(), 201
+
+
+# Check the body of a request to create a quiz
+# Returns the subject, question_count and choice_count, and None or the error response if the body is invalid
+def parse_quiz_request(quiz_data: dict):
+    if not isinstance(quiz_data, dict):
+        return (None, None, None), error_response(status_code=400, message='The request body must be a JSON object')
     for field in ['subject', 'question_count', 'choice_count']:
         if field not in quiz_data:
-            return error_response(status_code=400, message=f"'{field}' field is required")
+            return (None, None, None), error_response(status_code=400, message=f"'{field}' field is required")
 
     subject = quiz_data['subject']
+    if not isinstance(subject, str):
+        return (None, None, None), error_response(status_code=400, message="'subject' must be a string")
 
     try:
         question_count = int(quiz_data['question_count'])
         choice_count = int(quiz_data['choice_count'])
+    except (TypeError, ValueError):
+        return (None, None, None), error_response(
+            status_code=400, message=f"question_count and choice_count must be integers")
+
+    # Limit the question_count and choice_count that can be requested
+    if question_count < MIN_QUESTIONS or question_count > MAX_QUESTIONS:
+        return (None, None, None), error_response(
+            status_code=400, message=f"Allowed range for question_count: {MIN_QUESTIONS} - {MAX_QUESTIONS}")
+    if choice_count < MIN_CHOICES or choice_count > MAX_CHOICES:
+        return (None, None, None), error_response(
+            status_code=400, message=f"Allowed range for choice_count: {MIN_CHOICES} - {MAX_CHOICES}")
 
-        # Limit the question_count and choice_count that can be requested
-        if question_count < MIN_QUESTIONS or question_count > MAX_QUESTIONS:
-            return error_response(status_code=400, message=f"Allowed range for question_count: {MIN_QUESTIONS} - {MAX_QUESTIONS}")
-        if choice_count < MIN_CHOICES or choice_count > MAX_CHOICES:
-            return error_response(status_code=400, message=f"Allowed range for choice_count: {MIN_CHOICES} - {MAX_CHOICES}")
+    return (subject, question_count, choice_count), None
 
-    except ValueError:
-        return error_response(status_code=400, message=f"question_count and choice_count must be integers")
 
+# The ASGI server (app/asgi.py) generates the questions of requests to create a quiz before passing them to Flask,
+# so that waiting for the generator doesn't hold one of its threads, and stores them (or the error) in the ASGI scope
+PREGENERATED_QUESTIONS = 'quiz_api.pregenerated_questions'
+
+
+def get_generated_questions(subject: str, question_count: int, choice_count: int):
+    pregenerated = request.environ.get('asgi.scope', {}).get(PREGENERATED_QUESTIONS)
+    if pregenerated is None:
+        return generate_questions(subject=subject, question_count=question_count, choice_count=choice_count)
+    if isinstance(pregenerated, Exception):
+        raise pregenerated
+    return pregenerated
+
+
+# Create the quiz, then save and emit each question as soon as the generator produces it
+# Each line is an event: 'quiz' when the quiz is created, 'question' for each question, then 'done' or 'error'
+# If generation fails partway, the questions saved so far are kept
+# The quiz can be read while its questions are being added, so its cached responses and answer key are invalidated
+# after each question is saved, and again when the stream ends
+def stream_quiz(subject: str, question_count: int, choice_count: int):
     quiz = Quiz(subject=subject)
     db.session.add(quiz)
-    db.session.flush()
+    db.session.commit()
+    yield app.json.dumps({'event': 'quiz', 'quiz': quiz.to_dict()}) + '\n'
 
     try:
-        questions_with_choices = generate_questions(
-            subject=subject, question_count=question_count, choice_count=choice_count)
+        for question_data in stream_questions(subject=subject, question_count=question_count, choice_count=choice_count):
+            question = quiz.add_question(question_data)
+            db.session.commit()
+            invalidate_quiz(quiz.id)
+            yield app.json.dumps({'event': 'question', 'question': question.to_dict()}) + '\n'
+    except DataError as error:
+        db.session.rollback()
+        yield app.json.dumps({'event': 'error', 'message': f"Invalid question or choices: {error}"}) + '\n'
+        return
     except Exception as error:
-        return error_response(status_code=500, message=f"Error generating questions: {error}")
+        db.session.rollback()
+        yield app.json.dumps({'event': 'error', 'message': f"Error generating questions: {error}"}) + '\n'
+        return
+    finally:
+        invalidate_quiz(quiz.id)
 
-    for question_data in questions_with_choices:
-        try:
-            question = Question(text=question_data['question'], quiz_id=quiz.id)
-            db.session.add(question)
-            db.session.flush()
+    yield app.json.dumps({'event': 'done', 'quiz': quiz.to_dict()}) + '\n'
 
-            choices = [Choice(text=choice['text'], correct=choice['correct'],
-                            question_id=question.id) for choice in question_data['choices']]
-            db.session.bulk_save_objects(choices)
-        except DataError as error:
-            return error_response(status_code=400, message=f"Invalid question or choices: {error}")
 
-    db.session.commit()
-
-    return quiz.to_dict(), 201
+def invalidate_quiz(quiz_id: int) -> None:
+    answer_keys.invalidate(quiz_id)
+    response_cache.invalidate(f'quiz:{quiz_id}')
 
 
 @app.delete('/quizzes/<int:quiz_id>')
 def delete_quiz(quiz_id: int):
     quiz = Quiz.query.filter(Quiz.id == quiz_id).first_or_404()
+
+    # Deleting the quiz cascades to the UserChoices made on its choices, so the scores of those attempts change
+    affected_attempt_ids = select(UserChoice.attempt_id).join(Choice, Choice.id == UserChoice.choice_id).join(
+        Question, Question.id == Choice.question_id).where(Question.quiz_id == quiz_id).distinct()
+    affected_attempt_ids = db.session.scalars(affected_attempt_ids).all()
+    # Attempts of a deleted quiz no longer count towards the leaderboard
+    affected_user_ids = db.session.scalars(
+        select(QuizAttempt.user_id).where(QuizAttempt.quiz_id == quiz_id).distinct()).all()
+    question_ids = db.session.scalars(select(Question.id).where(Question.quiz_id == quiz_id)).all()
+
     db.session.delete(quiz)
+    db.session.flush()
+    QuizAttempt.refresh_counts(QuizAttempt.id.in_(affected_attempt_ids))
+    refresh_leaderboard(affected_user_ids)
     db.session.commit()
+    answer_keys.invalidate(quiz_id)
+    response_cache.invalidate(f'quiz:{quiz_id}', *[f'question:{question_id}' for question_id in question_ids])
     return '', 204
 
 
 @app.delete('/quizzes')
 def delete_all_quizzes():
     Quiz.query.delete()
+    # All UserChoices are deleted along with the choices of the quizzes
+    QuizAttempt.query.update({QuizAttempt.answered_count: 0, QuizAttempt.correct_count: 0})
+    refresh_leaderboard()
     db.session.commit()
+    answer_keys.invalidate_all()
+    response_cache.invalidate_all()
     return '', 204
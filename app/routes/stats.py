@@ -0,0 +1,28 @@
+from app import app, db
+from app.models import Question, Quiz
+from app.stats import quiz_stats
+from app.pool_metrics import pool_stats
+
+
+# How often each choice of the question was picked, the percentage of correct answers and the discrimination index
+@app.get('/questions/<int:question_id>/stats')
+def get_question_stats(question_id: int):
+    question = db.get_or_404(Question, question_id)
+    stats = quiz_stats(question.quiz_id, [question.id])
+    return {
+        'quiz_id': stats['quiz_id'],
+        'attempt_count': stats['attempt_count'],
+        **stats['questions'][0]
+    }
+
+
+@app.get('/quizzes/<int:quiz_id>/stats')
+def get_quiz_stats(quiz_id: int):
+    db.get_or_404(Quiz, quiz_id)
+    return quiz_stats(quiz_id)
+
+
+# Utilization of the database connection pool of the server process that handles the request
+@app.get('/pool/stats')
+def get_pool_stats():
+    return pool_stats()
@@ -1,43 +1,56 @@
 from app import app, db
-from app.models import UserChoice, Choice
+from app.models import UserChoice, Choice, QuizAttempt
 from flask import request
 from app.routes.errors import error_response
+from app.routes.pagination import collection_response
+from app.routes.quiz_attempts import validate_submissions, save_submissions
+from sqlalchemy import select
 
 
 @app.get('/user_choices')
 def get_all_user_choices():
-    return [user_choice.to_dict() for user_choice in UserChoice.query.all()]
+    return collection_response(UserChoice, select(UserChoice).order_by(*UserChoice.cursor_columns()),
+                               endpoint='get_all_user_choices')
 
 
 # To get list of choices the user made for this attempt
 @app.get('/attempts/<int:attempt_id>/user_choices')
 def get_user_choices_for_attempt(attempt_id: int):
-    return [user_choice.to_dict() for user_choice in UserChoice.query.filter(UserChoice.attempt_id == attempt_id).all()]
+    return UserChoice.to_dict_list(UserChoice.fetch_items(select(UserChoice).where(UserChoice.attempt_id == attempt_id)))
 
 
-# e.g. To get how many users chose each choice for this question
+# To get the choices users made for this question
+# The number of users who chose each choice is available from /questions/<question_id>/stats
 @app.get('/questions/<int:question_id>/user_choices')
 def get_user_choices_for_question(question_id: int):
-    return [user_choice.to_dict() for user_choice in UserChoice.query
-            .join(Choice, Choice.id == UserChoice.choice_id)
-            .filter(Choice.question_id == question_id).all()]
+    return UserChoice.to_dict_list(UserChoice.fetch_items(select(UserChoice)
+                                                          .join(Choice, Choice.id == UserChoice.choice_id)
+                                                          .where(Choice.question_id == question_id)))
 
 
 # e.g. To get list of users who chose this choice
 @app.get('/choices/<int:choice_id>/user_choices')
 def get_user_choices_for_choice(choice_id: int):
-    return [user_choice.to_dict() for user_choice in UserChoice.query.filter(UserChoice.choice_id == choice_id).all()]
+    return UserChoice.to_dict_list(UserChoice.fetch_items(select(UserChoice).where(UserChoice.choice_id == choice_id)))
 
 
 # Call this endpoint to set the choice chosen by the user in a quiz attempt
+# Like answers saved with /attempts/batch, choosing again for a question replaces the earlier choice
 @app.post('/attempts/<int:attempt_id>/user_choices')
 def add_user_choice(attempt_id: int):
     choice_id = request.args.get('choice_id', type=int)
     if not choice_id:
         return error_response(status_code=400, message='Missing or invalid choice_id')
 
-    user_choice = UserChoice(attempt_id=attempt_id, choice_id=choice_id)
-    db.session.add(user_choice)
+    choice = db.get_or_404(Choice, choice_id)
+    db.get_or_404(QuizAttempt, attempt_id)
+
+    # Update the score of the attempt, the pick counts of the choices and the leaderboard in the same transaction
+    submissions, errors = validate_submissions(
+        [{'attempt_id': attempt_id, 'questions': [{'question_id': choice.question_id, 'choice_id': choice_id}]}])
+    if errors:
+        return error_response(status_code=400, message='; '.join(errors))
+    save_submissions(submissions)
     db.session.commit()
 
-    return user_choice.to_dict(), 201
\ No newline at end of file
+    return db.session.get(UserChoice, (choice_id, attempt_id)).to_dict(), 201
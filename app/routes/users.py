@@ -2,6 +2,8 @@ from flask import request
 from app import app, db
 from app.models import User
 from app.routes.errors import error_response
+from app.routes.pagination import collection_response
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
 @app.get('/users')
@@ -10,7 +12,7 @@ def get_users():
     # If username is given as query param, get user by username, else return all users
     if username:
         return User.query.filter(User.username == username).first_or_404().to_dict()
-    return [user.to_dict() for user in User.query.all()]
+    return collection_response(User, select(User).order_by(User.id), endpoint='get_users')
 
 
 @app.get('/users/<int:user_id>')
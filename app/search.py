@@ -0,0 +1,123 @@
+import re
+from sqlalchemy import select, event, text, column, Float, Integer
+from flask import url_for
+from app import db
+from app.models import Quiz, Question, encode_cursor, decode_cursor
+
+# Quizzes are found by their subject or by the text of their questions
+# PostgreSQL searches GIN indexes on the tsvectors of quiz.subject and question.text
+# SQLite searches FTS5 tables that index the same columns and are kept up to date by triggers
+# Matching subjects count for more than matching questions when ranking quizzes
+SUBJECT_WEIGHT = 2
+
+POSTGRESQL_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_quiz_subject_search ON quiz USING GIN (to_tsvector('english', subject))",
+    "CREATE INDEX IF NOT EXISTS ix_question_text_search ON question USING GIN (to_tsvector('english', text))",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_fts USING fts5("
+    "subject, content='quiz', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5("
+    "text, content='question', content_rowid='id', tokenize='porter unicode61')",
+]
+for table, fts_table, text_column in [('quiz', 'quiz_fts', 'subject'), ('question', 'question_fts', 'text')]:
+    delete_row = f"INSERT INTO {fts_table}({fts_table}, rowid, {text_column}) VALUES ('delete', old.id, old.{text_column});"
+    insert_row = f"INSERT INTO {fts_table}(rowid, {text_column}) VALUES (new.id, new.{text_column});"
+    SQLITE_DDL += [
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {table} BEGIN {insert_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {table} BEGIN {delete_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE OF {text_column} ON {table} "
+        f"BEGIN {delete_row} {insert_row} END",
+    ]
+
+# Each query ranks the matching quizzes as (quiz_id, rank)
+POSTGRESQL_SEARCH = f"""
+    SELECT quiz_id, SUM(score) AS rank FROM (
+        SELECT quiz.id AS quiz_id, {SUBJECT_WEIGHT} * ts_rank(to_tsvector('english', quiz.subject), query) AS score
+        FROM quiz, plainto_tsquery('english', :q) AS query
+        WHERE to_tsvector('english', quiz.subject) @@ query
+        UNION ALL
+        SELECT question.quiz_id, MAX(ts_rank(to_tsvector('english', question.text), query))
+        FROM question, plainto_tsquery('english', :q) AS query
+        WHERE to_tsvector('english', question.text) @@ query
+        GROUP BY question.quiz_id
+    ) AS matches GROUP BY quiz_id
+"""
+
+# The rank column of FTS5 tables is the bm25() score, which is lower for better matches, so it is negated
+SQLITE_SEARCH = f"""
+    SELECT quiz_id, SUM(score) AS rank FROM (
+        SELECT quiz_fts.rowid AS quiz_id, -{SUBJECT_WEIGHT} * quiz_fts.rank AS score
+        FROM quiz_fts WHERE quiz_fts MATCH :q
+        UNION ALL
+        SELECT question.quiz_id, MAX(-question_fts.rank)
+        FROM question_fts JOIN question ON question.id = question_fts.rowid
+        WHERE question_fts MATCH :q
+        GROUP BY question.quiz_id
+    ) GROUP BY quiz_id
+"""
+
+# Results are paged through by rank, using the quiz id to break ties
+CURSOR_COLUMNS = [column('rank', Float), column('quiz_id', Integer)]
+
+
+def create_search_index(connection) -> None:
+    if connection.dialect.name == 'postgresql':
+        statements = POSTGRESQL_DDL
+    elif connection.dialect.name == 'sqlite':
+        statements = SQLITE_DDL
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+# Create the search index along with the tables when db.create_all() is called
+@event.listens_for(Question.__table__, 'after_create')
+def create_search_index_after_create(target, connection, **kwargs):
+    create_search_index(connection)
+
+
+# Drop the FTS5 tables along with the tables when db.drop_all() is called, so that a recreated database doesn't match
+# the rows of the dropped one (the PostgreSQL indexes and the triggers are dropped with their tables)
+@event.listens_for(Question.__table__, 'after_drop')
+def drop_search_index_after_drop(target, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        for fts_table in ['quiz_fts', 'question_fts']:
+            connection.execute(text(f'DROP TABLE IF EXISTS {fts_table}'))
+
+
+# Each word of the query must appear in the subject or in a question, and the words are quoted so that
+# FTS5 doesn't interpret them as query syntax
+def sqlite_match_query(q: str) -> str:
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', q))
+
+
+def find_quizzes(q: str, endpoint: str, cursor: str = None, per_page: int = 20) -> dict:
+    postgresql = db.session.get_bind().dialect.name == 'postgresql'
+    params = {'q': q if postgresql else sqlite_match_query(q), 'limit': per_page + 1}
+    statement = f'SELECT quiz_id, rank FROM ({POSTGRESQL_SEARCH if postgresql else SQLITE_SEARCH}) AS results'
+    if cursor:
+        params['rank'], params['quiz_id'] = decode_cursor(cursor, CURSOR_COLUMNS)
+        statement += ' WHERE rank < :rank OR (rank = :rank AND quiz_id < :quiz_id)'
+    statement += ' ORDER BY rank DESC, quiz_id DESC LIMIT :limit'
+
+    # Fetch one extra result to find out if there is a next page
+    results = db.session.execute(text(statement), params).all() if params['q'] else []
+    next_cursor = encode_cursor(results[per_page - 1], CURSOR_COLUMNS) if len(results) > per_page else None
+    results = results[:per_page]
+
+    quizzes = db.session.scalars(select(Quiz).where(Quiz.id.in_([result.quiz_id for result in results]))).all()
+    quiz_dicts = {quiz['id']: quiz for quiz in Quiz.to_dict_list(quizzes)}
+
+    return {
+        'items': [{**quiz_dicts[result.quiz_id], 'rank': result.rank} for result in results if result.quiz_id in quiz_dicts],
+        '_meta': {'q': q, 'per_page': per_page},
+        '_links': {
+            'self': url_for(endpoint, q=q, cursor=cursor, per_page=per_page),
+            'next': url_for(endpoint, q=q, cursor=next_cursor, per_page=per_page) if next_cursor else None,
+            'cursor': cursor,
+            'next_cursor': next_cursor
+        }
+    }
@@ -0,0 +1,92 @@
+import math
+from sqlalchemy import select, func, case
+from app import db
+from app.models import Question, Choice, ChoiceStat, QuizAttempt, UserChoice
+
+# Pick counts are read from the ChoiceStat summary table, so they cost the same no matter how many attempts there are
+# The discrimination index of a question is the share of the top scoring attempts that answered it correctly
+# minus the share of the bottom scoring attempts that did, where each group is this fraction of the attempts of the quiz
+DISCRIMINATION_GROUP_FRACTION = 0.27
+
+
+def percent(count: int, total: int) -> float | None:
+    return round(100 * count / total, 1) if total else None
+
+
+# Stats of the questions of a quiz (or only the given questions of it) and of their choices
+def quiz_stats(quiz_id: int, question_ids: list[int] = None) -> dict:
+    question_filter = [Question.quiz_id == quiz_id]
+    if question_ids is not None:
+        question_filter.append(Question.id.in_(question_ids))
+
+    rows = db.session.execute(
+        select(Question.id, Question.text, Choice.id, Choice.text, Choice.correct,
+               func.coalesce(ChoiceStat.pick_count, 0))
+        .outerjoin(Choice, Choice.question_id == Question.id)
+        .outerjoin(ChoiceStat, ChoiceStat.choice_id == Choice.id)
+        .where(*question_filter).order_by(Question.id, Choice.id))
+
+    questions = {}
+    for question_id, question_text, choice_id, choice_text, correct, pick_count in rows:
+        question = questions.setdefault(question_id, {
+            'question_id': question_id,
+            'text': question_text,
+            'answer_count': 0,
+            'correct_count': 0,
+            'choices': []
+        })
+        if choice_id is None:
+            continue
+        question['answer_count'] += pick_count
+        question['correct_count'] += pick_count if correct else 0
+        question['choices'].append({
+            'choice_id': choice_id,
+            'text': choice_text,
+            'correct': correct,
+            'pick_count': pick_count
+        })
+
+    attempt_count, indexes = discrimination_indexes(quiz_id, question_ids)
+    for question in questions.values():
+        question['percent_correct'] = percent(question['correct_count'], question['answer_count'])
+        question['discrimination_index'] = indexes.get(question['question_id'], 0.0) if indexes is not None else None
+        for choice in question['choices']:
+            choice['percent'] = percent(choice['pick_count'], question['answer_count'])
+
+    return {
+        'quiz_id': quiz_id,
+        'attempt_count': attempt_count,
+        'questions': list(questions.values())
+    }
+
+
+# Compute the discrimination index of the questions of a quiz by ranking its attempts by score in the database
+# and counting the correct answers of the top and bottom groups with a single GROUP BY
+# Returns the number of attempts of the quiz and the indexes by question_id, which are None with fewer than 2 attempts
+def discrimination_indexes(quiz_id: int, question_ids: list[int] = None) -> tuple[int, dict[int, float] | None]:
+    attempt_count = db.session.scalar(
+        select(func.count()).select_from(QuizAttempt).where(QuizAttempt.quiz_id == quiz_id))
+    if attempt_count < 2:
+        return attempt_count, None
+    group_size = math.ceil(attempt_count * DISCRIMINATION_GROUP_FRACTION)
+
+    ranked_attempts = select(
+        QuizAttempt.id,
+        func.row_number().over(order_by=(QuizAttempt.correct_count.desc(), QuizAttempt.id)).label('rank')
+    ).where(QuizAttempt.quiz_id == quiz_id).subquery()
+    in_top_group = ranked_attempts.c.rank <= group_size
+    in_bottom_group = ranked_attempts.c.rank > attempt_count - group_size
+
+    statement = (select(Choice.question_id,
+                        func.sum(case((in_top_group, 1), else_=0)),
+                        func.sum(case((in_bottom_group, 1), else_=0)))
+                 .select_from(ranked_attempts)
+                 .join(UserChoice, UserChoice.attempt_id == ranked_attempts.c.id)
+                 .join(Choice, Choice.id == UserChoice.choice_id)
+                 .where(Choice.correct, in_top_group | in_bottom_group)
+                 .group_by(Choice.question_id))
+    if question_ids is not None:
+        statement = statement.where(Choice.question_id.in_(question_ids))
+
+    return attempt_count, {question_id: round((top_correct - bottom_correct) / group_size, 3)
+                           for question_id, top_correct, bottom_correct in db.session.execute(statement)}
@@ -0,0 +1,217 @@
+# Measure the latency, throughput and SQL statement counts of the hot API endpoints on seeded synthetic data
+# Usage: python -m benchmarks.api [--database-url URL] [--requests N] [--concurrency N] [--output FILE] [--compare FILE]
+#        python -m benchmarks.api --url http://localhost:5000 [--seed --database-url URL] ...
+# By default a temporary SQLite database (or the empty database at --database-url) is seeded with benchmarks.seed
+# and the requests are sent through the Flask test client. With --url they are sent over HTTP to a running server
+# (e.g. gunicorn) instead, which must be serving a database seeded with the same volumes and random seed
+# The results are written as JSON with sorted keys, so that the baselines of two runs can be diffed, or compared
+# with --compare, which prints the change in each measurement
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.seed import DEFAULT_VOLUMES, add_volume_arguments, seed, question_ids, choice_ids
+
+# The number of statements each request runs is read from the Server-Timing header that the app adds
+STATEMENTS_PATTERN = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def list_quizzes(rng: random.Random, volumes: dict):
+    return 'GET', '/quizzes', None
+
+
+def get_quiz(rng: random.Random, volumes: dict):
+    return 'GET', f"/quizzes/{rng.randint(1, volumes['quizzes'])}", None
+
+
+def get_quiz_questions(rng: random.Random, volumes: dict):
+    return 'GET', f"/quizzes/{rng.randint(1, volumes['quizzes'])}/questions", None
+
+
+def list_attempts(rng: random.Random, volumes: dict):
+    return 'GET', '/attempts', None
+
+
+def get_user_attempts(rng: random.Random, volumes: dict):
+    return 'GET', f"/users/{rng.randint(1, volumes['users'])}/attempts", None
+
+
+def submit_attempt(rng: random.Random, volumes: dict):
+    quiz_id = rng.randint(1, volumes['quizzes'])
+    answers = [{'question_id': question_id, 'choice_id': rng.choice(choice_ids(question_id, volumes))}
+               for question_id in question_ids(quiz_id, volumes)]
+    return 'POST', f"/quizzes/{quiz_id}/attempts?user_id={rng.randint(1, volumes['users'])}", {'questions': answers}
+
+
+SCENARIOS = {scenario.__name__: scenario for scenario in
+             [list_quizzes, get_quiz, get_quiz_questions, list_attempts, get_user_attempts, submit_attempt]}
+
+
+# Sends requests through the Flask test client, in the same process
+class TestClient(object):
+    def __init__(self, app) -> None:
+        self.client = app.test_client()
+
+    def send(self, method: str, path: str, body) -> tuple[int, str]:
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, ', '.join(response.headers.getlist('Server-Timing'))
+
+
+# Sends requests over HTTP to a running server, reusing one connection per thread
+class HttpClient(object):
+    def __init__(self, base_url: str) -> None:
+        import requests
+        self.session = requests.Session()
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, method: str, path: str, body) -> tuple[int, str]:
+        response = self.session.request(method, self.base_url + path, json=body)
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[int(percent) - 1]
+
+
+def run_scenario(scenario, make_client, volumes: dict, request_count: int, concurrency: int, warmup: int,
+                 random_seed: int) -> dict:
+    latencies = []
+    statement_counts = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(index: int, count: int, record: bool):
+        nonlocal errors
+        client = make_client()
+        rng = random.Random(f'{scenario.__name__}|{random_seed}|{index}|{record}')
+        for _ in range(count):
+            method, path, body = scenario(rng, volumes)
+            start = time.perf_counter()
+            status_code, server_timing = client.send(method, path, body)
+            latency = time.perf_counter() - start
+            if not record:
+                continue
+            match = STATEMENTS_PATTERN.search(server_timing)
+            with lock:
+                latencies.append(latency)
+                if match:
+                    statement_counts.append(int(match.group(1)))
+                if status_code >= 400:
+                    errors += 1
+
+    def run(count: int, record: bool) -> float:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(worker, index, count // concurrency + (index < count % concurrency), record)
+                       for index in range(concurrency)]
+            for future in futures:
+                future.result()
+        return time.perf_counter() - start
+
+    if warmup:
+        run(warmup, record=False)
+    elapsed = run(request_count, record=True)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        # Counts are missing if the server doesn't add Server-Timing headers (see METRICS_SERVER_TIMING)
+        'statements_per_request': round(statistics.fmean(statement_counts), 2) if statement_counts else None,
+        'max_statements': max(statement_counts) if statement_counts else None
+    }
+
+
+# Print the relative change in each measurement of the scenarios found in both runs
+def compare(baseline: dict, results: dict) -> None:
+    if baseline['config'] != results['config']:
+        print('Warning: the runs used different settings, so their results may not be comparable')
+    print(f"{'scenario':<20} {'measurement':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        for measurement, value in current.items():
+            old_value = previous.get(measurement)
+            if value is None or old_value is None or measurement in ['requests', 'errors'] and value == old_value:
+                continue
+            change = f'{(value - old_value) / old_value * 100:+.1f}%' if old_value else ''
+            print(f'{name:<20} {measurement:<24} {old_value:>10} {value:>10} {change:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot API endpoints on seeded synthetic data')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--url', default=None, help='Base URL of a running server to send requests to')
+    parser.add_argument('--seed', action='store_true', help='Seed the database at --database-url when using --url')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=500, help='Number of measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=50, help='Number of unmeasured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--output', default=None, help='File to write the results to as JSON (printed if not given)')
+    parser.add_argument('--compare', default=None, help='Results of an earlier run to compare with')
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    volumes = {name: getattr(args, name) for name in DEFAULT_VOLUMES}
+    app = None
+    if not args.url or args.seed:
+        # The app reads its configuration when it is imported
+        os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+        os.environ['METRICS_SERVER_TIMING'] = 'true'
+        from app import app
+        with app.app_context():
+            seed_timings = seed(volumes, random_seed=args.random_seed)
+        print('Seeded in ' + ', '.join(f'{seconds}s ({name})' for name, seconds in seed_timings.items()), file=sys.stderr)
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        make_client = lambda: TestClient(app)
+
+    results = {
+        'config': {
+            'target': args.url or 'test client',
+            'database': (args.database_url or 'sqlite').split(':')[0] if not args.url or args.seed else None,
+            'volumes': volumes,
+            'random_seed': args.random_seed,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency
+        },
+        'scenarios': {}
+    }
+    for name in args.scenarios:
+        results['scenarios'][name] = run_scenario(SCENARIOS[name], make_client, volumes, args.requests,
+                                                  args.concurrency, args.warmup, args.random_seed)
+        print(f"{name}: {results['scenarios'][name]}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), results)
+
+
+if __name__ == '__main__':
+    main()
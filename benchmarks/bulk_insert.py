@@ -0,0 +1,57 @@
+# Compare inserting the questions of a quiz one at a time with inserting them in bulk
+# Usage: python -m benchmarks.bulk_insert [--database-url URL] [--repeat N]
+# Uses a temporary SQLite database unless a database URL is given
+# Each quiz takes 8N+1 statements for N questions when they are added one at a time, and 9 statements at every size
+# when they are added in bulk (including the statements of index_questions and the commit's UPDATE of question_count)
+import os
+import time
+import argparse
+import tempfile
+import statistics
+
+SIZES = [5, 10, 20, 50, 100]
+CHOICE_COUNT = 4
+
+
+def make_questions(question_count: int, choice_count: int) -> list[dict]:
+    return [{'question': f'Benchmark question {number}',
+             'choices': [{'text': f'Choice {index}', 'correct': index == 0} for index in range(choice_count)]}
+            for number in range(question_count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inserting quiz questions one at a time and in bulk')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL when it is imported
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    from sqlalchemy import event
+    from app import app, db
+    from app.models import Quiz
+
+    statements = []
+    print(f"{'questions':>9} {'mode':>12} {'statements':>10} {'median ms':>10} {'p95 ms':>8}")
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+
+        for size in SIZES:
+            questions = make_questions(size, CHOICE_COUNT)
+            for mode, bulk in [('per question', False), ('bulk', True)]:
+                timings = []
+                for _ in range(args.repeat):
+                    statements.clear()
+                    start = time.perf_counter()
+                    Quiz.add_generated(subject='benchmark', questions_with_choices=questions, bulk=bulk)
+                    db.session.commit()
+                    timings.append((time.perf_counter() - start) * 1000)
+                    statement_count = len(statements)
+
+                p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+                print(f'{size:>9} {mode:>12} {statement_count:>10} {statistics.median(timings):>10.2f} {p95:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
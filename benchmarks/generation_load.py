@@ -0,0 +1,197 @@
+# Measure how the latency of read requests changes while quizzes are being generated, to compare gunicorn's sync
+# workers with the ASGI server (app/asgi.py)
+# Usage: python -m benchmarks.generation_load --server sync|asgi [--workers N] [--generators N] [--generator-latency S] ...
+#        python -m benchmarks.generation_load --url http://localhost:5000 ...
+# With --server, a temporary SQLite database (or the empty database at --database-url) is seeded with benchmarks.seed,
+# and the server is started on it the same way as entrypoint.sh does, with the local generator backend taking
+# --generator-latency seconds per call. With --url the requests are sent to a running server instead, which must be
+# serving a database seeded with the same volumes and random seed, and should use the local backend
+# The read scenario is run twice: on its own, then while --generators clients keep creating quizzes (each on a new
+# subject, so the generation cache doesn't help). The results are written as JSON like those of benchmarks.api
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import threading
+import subprocess
+from benchmarks.api import SCENARIOS, HttpClient, run_scenario, percentile, compare
+from benchmarks.seed import DEFAULT_VOLUMES, add_volume_arguments, seed
+
+SERVER_COMMANDS = {
+    'sync': ['gunicorn', '--bind', '127.0.0.1:{port}', '--workers', '{workers}', '--timeout', '90', 'app:app'],
+    'asgi': ['uvicorn', 'app.asgi:asgi_app', '--host', '127.0.0.1', '--port', '{port}', '--workers', '{workers}']
+}
+# Seconds to wait for the server to start accepting requests
+STARTUP_TIMEOUT = 30
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(server: str, workers: int, database_url: str, generator_latency: float) -> tuple:
+    port = free_port()
+    command = [part.format(port=port, workers=workers) for part in SERVER_COMMANDS[server]]
+    environment = {**os.environ, 'DATABASE_URL': database_url, 'METRICS_SERVER_TIMING': 'true',
+                   'QUIZ_GENERATOR_BACKEND': 'local', 'QUIZ_GENERATOR_LATENCY': str(generator_latency),
+                   'QUIZ_GENERATOR_JITTER': '0', 'QUIZ_CACHE_SIZE': '0'}
+    process = subprocess.Popen(command, env=environment, stdout=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        if process.poll() is not None:
+            raise SystemExit(f"The server exited with code {process.returncode}: {' '.join(command)}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, url
+        except OSError:
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise SystemExit(f'The server did not start within {STARTUP_TIMEOUT} seconds')
+            time.sleep(0.2)
+
+
+# Clients that each keep creating quizzes, one at a time, until they are stopped
+class GenerationLoad(object):
+    def __init__(self, url: str, generators: int, question_count: int, choice_count: int) -> None:
+        self.url = url
+        self.generators = generators
+        self.question_count = question_count
+        self.choice_count = choice_count
+        self.latencies = []
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self) -> None:
+        self.threads = [threading.Thread(target=self.generate, args=(index,)) for index in range(self.generators)]
+        for thread in self.threads:
+            thread.start()
+
+    # Wait for the quizzes being created to finish
+    def stop(self) -> None:
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+    def generate(self, index: int) -> None:
+        client = HttpClient(self.url)
+        number = 0
+        while not self.stopped.is_set():
+            body = {'subject': f'generation load {index} {number} {time.time_ns()}',
+                    'question_count': self.question_count, 'choice_count': self.choice_count}
+            start = time.perf_counter()
+            status_code, _ = client.send('POST', '/quizzes', body)
+            latency = time.perf_counter() - start
+            with self.lock:
+                self.latencies.append(latency)
+                if status_code >= 400:
+                    self.errors += 1
+            number += 1
+
+    def results(self) -> dict:
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {'requests': 0, 'errors': 0}
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure read latency while quizzes are being generated')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--server', choices=list(SERVER_COMMANDS), help='Start this kind of server to send requests to')
+    target.add_argument('--url', default=None, help='Base URL of a running server to send requests to')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--workers', type=int, default=4, help='Number of server processes')
+    parser.add_argument('--generator-latency', type=float, default=2, help='Seconds taken by each call to the generator')
+    parser.add_argument('--generators', type=int, default=4, help='Number of clients creating quizzes during the load')
+    parser.add_argument('--question-count', type=int, default=5, help='Number of questions of each quiz created')
+    parser.add_argument('--choice-count', type=int, default=4)
+    parser.add_argument('--scenario', choices=list(SCENARIOS), default='get_quiz_questions', help='Read scenario to measure')
+    parser.add_argument('--requests', type=int, default=300, help='Number of measured read requests per phase')
+    parser.add_argument('--warmup', type=int, default=20, help='Number of unmeasured read requests per phase')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of clients sending read requests')
+    parser.add_argument('--output', default=None, help='File to write the results to as JSON (printed if not given)')
+    parser.add_argument('--compare', default=None, help='Results of an earlier run to compare with')
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    volumes = {name: getattr(args, name) for name in DEFAULT_VOLUMES}
+    process = None
+    url = args.url
+    if args.server:
+        # The app reads its configuration when it is imported
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+        os.environ['DATABASE_URL'] = database_url
+        from app import app
+        with app.app_context():
+            seed(volumes, random_seed=args.random_seed)
+        process, url = start_server(args.server, args.workers, database_url, args.generator_latency)
+
+    results = {
+        'config': {
+            'target': args.server or args.url,
+            'workers': args.workers if args.server else None,
+            'generator_latency': args.generator_latency if args.server else None,
+            'generators': args.generators,
+            'question_count': args.question_count,
+            'volumes': volumes,
+            'random_seed': args.random_seed,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency
+        },
+        'scenarios': {}
+    }
+    scenario = SCENARIOS[args.scenario]
+    make_client = lambda: HttpClient(url)
+    try:
+        results['scenarios'][args.scenario] = run_scenario(
+            scenario, make_client, volumes, args.requests, args.concurrency, args.warmup, args.random_seed)
+        print(f"{args.scenario}: {results['scenarios'][args.scenario]}", file=sys.stderr)
+
+        load = GenerationLoad(url, args.generators, args.question_count, args.choice_count)
+        load.start()
+        try:
+            name = f'{args.scenario}_during_generation'
+            results['scenarios'][name] = run_scenario(
+                scenario, make_client, volumes, args.requests, args.concurrency, args.warmup, args.random_seed)
+            print(f"{name}: {results['scenarios'][name]}", file=sys.stderr)
+        finally:
+            load.stop()
+        results['generation'] = load.results()
+        print(f"create_quiz: {results['generation']}", file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Fill an empty database with synthetic users, quizzes, questions, choices and attempts for benchmarking
+# Usage: python -m benchmarks.seed [--database-url URL] [--users N] [--quizzes N] [--questions N] [--choices N] [--attempts N]
+# Rows are bulk inserted with explicit ids, so the same volumes and random seed always produce the same data,
+# and the ids of the questions and choices of each quiz can be computed without querying the database
+import os
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_VOLUMES = {'users': 100, 'quizzes': 200, 'questions': 10, 'choices': 4, 'attempts': 2000}
+SUBJECTS = ['algebra', 'biology', 'chemistry', 'geography', 'history', 'literature', 'music', 'physics', 'astronomy', 'art']
+# Number of rows inserted per statement
+BATCH_SIZE = 5000
+# Attempts are spread over this many days before the time of seeding
+ATTEMPT_DAYS = 90
+
+
+def question_ids(quiz_id: int, volumes: dict) -> range:
+    first = (quiz_id - 1) * volumes['questions'] + 1
+    return range(first, first + volumes['questions'])
+
+
+def choice_ids(question_id: int, volumes: dict) -> range:
+    first = (question_id - 1) * volumes['choices'] + 1
+    return range(first, first + volumes['choices'])
+
+
+# The first choice of each question is the correct one
+def is_correct(choice_id: int, volumes: dict) -> bool:
+    return (choice_id - 1) % volumes['choices'] == 0
+
+
+def add_volume_arguments(parser: argparse.ArgumentParser) -> None:
+    for name, default in DEFAULT_VOLUMES.items():
+        parser.add_argument(f'--{name}', type=int, default=default,
+                            help=f'Number of {name}' + (' per quiz' if name == 'questions' else
+                                                        ' per question' if name == 'choices' else ''))
+    parser.add_argument('--random-seed', type=int, default=0)
+
+
+def insert_batches(table, rows) -> None:
+    from sqlalchemy import insert
+    from app import db
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(insert(table), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(table), batch)
+
+
+# Must be called in an app context, with an empty database
+def seed(volumes: dict, random_seed: int = 0) -> dict:
+    from sqlalchemy import select, insert, func, text
+    from app import db
+    from app.models import User, Quiz, Question, Choice, QuizAttempt, AttemptQuestion, UserChoice, ChoiceStat
+    from app.leaderboard import refresh_leaderboard
+
+    if db.session.scalar(select(func.count()).select_from(Quiz)) or db.session.scalar(select(func.count()).select_from(User)):
+        raise SystemExit('The benchmark database must be empty')
+
+    rng = random.Random(random_seed)
+    now = datetime.now(tz=timezone.utc)
+    timings = {}
+
+    start = time.perf_counter()
+    insert_batches(User.__table__, ({'id': user_id, 'username': f'benchmark_user_{user_id}'}
+                                    for user_id in range(1, volumes['users'] + 1)))
+    insert_batches(Quiz.__table__, ({'id': quiz_id, 'subject': SUBJECTS[quiz_id % len(SUBJECTS)],
+                                     'created_at': now - timedelta(days=ATTEMPT_DAYS, minutes=quiz_id),
+                                     'question_count': volumes['questions']}
+                                    for quiz_id in range(1, volumes['quizzes'] + 1)))
+    insert_batches(Question.__table__, (
+        {'id': question_id, 'quiz_id': quiz_id,
+         'text': f'Question {number + 1} about {SUBJECTS[quiz_id % len(SUBJECTS)]} in quiz {quiz_id}'}
+        for quiz_id in range(1, volumes['quizzes'] + 1)
+        for number, question_id in enumerate(question_ids(quiz_id, volumes))))
+    insert_batches(Choice.__table__, (
+        {'id': choice_id, 'question_id': question_id, 'text': f'Choice {number + 1} of question {question_id}',
+         'correct': is_correct(choice_id, volumes)}
+        for question_id in range(1, volumes['quizzes'] * volumes['questions'] + 1)
+        for number, choice_id in enumerate(choice_ids(question_id, volumes))))
+    timings['quizzes'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    attempts = [{'id': attempt_id, 'quiz_id': rng.randint(1, volumes['quizzes']), 'user_id': rng.randint(1, volumes['users']),
+                 'timestamp': now - timedelta(seconds=rng.randrange(ATTEMPT_DAYS * 24 * 3600))}
+                for attempt_id in range(1, volumes['attempts'] + 1)]
+    insert_batches(QuizAttempt.__table__, attempts)
+    insert_batches(AttemptQuestion.__table__, (
+        {'attempt_id': attempt['id'], 'question_id': question_id, 'sequence_number': number}
+        for attempt in attempts for number, question_id in enumerate(question_ids(attempt['quiz_id'], volumes))))
+    insert_batches(UserChoice.__table__, (
+        {'attempt_id': attempt['id'], 'choice_id': rng.choice(choice_ids(question_id, volumes))}
+        for attempt in attempts for question_id in question_ids(attempt['quiz_id'], volumes)))
+    timings['attempts'] = time.perf_counter() - start
+
+    # Fill in the data that the API keeps up to date as attempts are saved
+    start = time.perf_counter()
+    QuizAttempt.refresh_counts()
+    db.session.execute(insert(ChoiceStat).from_select(
+        ['choice_id', 'pick_count'],
+        select(UserChoice.choice_id, func.count()).group_by(UserChoice.choice_id)))
+    refresh_leaderboard()
+    # Rows inserted with explicit ids don't advance PostgreSQL's sequences, so move them past the seeded ids
+    if db.session.get_bind().dialect.name == 'postgresql':
+        for table in [User.__table__, Quiz.__table__, Question.__table__, Choice.__table__, QuizAttempt.__table__]:
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                                    f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}), false)"))
+    db.session.commit()
+    timings['derived'] = time.perf_counter() - start
+
+    return {name: round(seconds, 3) for name, seconds in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill an empty database with synthetic data for benchmarking')
+    parser.add_argument('--database-url', default=None)
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL when it is imported
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    from app import app
+
+    volumes = {name: getattr(args, name) for name in DEFAULT_VOLUMES}
+    with app.app_context():
+        timings = seed(volumes, random_seed=args.random_seed)
+    print(f'Seeded {volumes} in ' + ', '.join(f'{seconds}s ({name})' for name, seconds in timings.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,4 +3,97 @@ import os
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config(object):
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f"sqlite:///{os.path.join(basedir, 'app.db')}"
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or f"sqlite:///{os.path.join(basedir, 'app.db')}"
+
+    # Number of background threads that run quiz generation jobs in each server process
+    QUIZ_JOB_WORKERS = int(os.getenv('QUIZ_JOB_WORKERS', 4))
+
+    # Number of quiz answer keys to keep in memory for grading attempts, and for how many seconds
+    ANSWER_KEY_CACHE_SIZE = int(os.getenv('ANSWER_KEY_CACHE_SIZE', 1024))
+    ANSWER_KEY_CACHE_TTL = int(os.getenv('ANSWER_KEY_CACHE_TTL', 600))
+
+    # Responses of get_quiz, get_quiz_questions and get_question_choices are cached in memory, up to this many bytes
+    # of response bodies, for this many seconds. Set RESPONSE_CACHE_REDIS_URL to share the cache between server processes
+    # (requires the redis package). Clients may reuse responses for RESPONSE_CACHE_MAX_AGE seconds before revalidating them
+    # Without Redis, a change made through one process doesn't invalidate the responses cached by the others, so they are
+    # only kept for RESPONSE_CACHE_MAX_AGE seconds by default, as long as clients may already serve outdated responses
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL')
+    RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', 60))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 3600 if RESPONSE_CACHE_REDIS_URL else RESPONSE_CACHE_MAX_AGE))
+
+    # Number of threads that run Flask in each process of the ASGI server (app/asgi.py). Requests that are waiting
+    # for the quiz generator don't use one, so this only needs to cover the requests that are using the database
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', 10))
+
+    # Add Server-Timing headers with the time spent running SQL statements and handling the request to every response
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'false').lower() == 'true'
+
+    # Connection pool of each server process (not used for SQLite). Each process opens up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections, waiting up to DB_POOL_TIMEOUT seconds for one to be returned
+    # when all of them are in use. Connections are replaced after DB_POOL_RECYCLE seconds, and tested before
+    # they are used if DB_POOL_PRE_PING is set, so that connections broken by a failover or restart are not used
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', -1))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'
+    # Statements that run for longer than this many milliseconds are cancelled by PostgreSQL (0 to disable)
+    DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 0))
+
+    # Journal mode and synchronous setting of SQLite connections. WAL lets readers run alongside a writer,
+    # and NORMAL only syncs to disk at checkpoints, which is safe in WAL mode
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    # Milliseconds to wait for a lock held by another connection before failing with 'database is locked'
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+
+
+class DevelopmentConfig(Config):
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'true').lower() == 'true'
+
+
+class ProductionConfig(Config):
+    # Keep fewer idle connections per gunicorn worker so that starting every worker at once doesn't exhaust the
+    # database's connection limit, replace connections before the server or a proxy drops idle ones, and test
+    # connections before they are used so that a failover only fails the requests that were in flight
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 30000))
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or 'sqlite://'
+    # Durability doesn't matter for a test database
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'OFF')
+
+
+# The preset to use is chosen by the APP_ENV environment variable
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig
+}
+
+
+# Options for SQLAlchemy's create_engine() from the DB_* settings
+def engine_options(config) -> dict:
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # SQLite connections are cheap to open and the pool that SQLAlchemy picks for SQLite doesn't accept these options
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        # Reuse the most recently returned connection so that unneeded connections stay idle and get recycled
+        'pool_use_lifo': True
+    }
+    if config['DB_STATEMENT_TIMEOUT'] and config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+    return options
@@ -1,3 +1,8 @@
 #!/bin/bash
 flask db upgrade
+# With SERVER_MODE=asgi, serve the app with uvicorn (see app/asgi.py), so that requests waiting for the quiz generator
+# don't hold a worker. The number of processes is set with WEB_CONCURRENCY
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec uvicorn app.asgi:asgi_app --host 0.0.0.0 --port 5000
+fi
 exec gunicorn --bind :5000 app:app --timeout 90
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""add index on lowercase quiz subject
+
+Revision ID: 0a7e3c5b9d14
+Revises: f2b8d6a4c913
+Create Date: 2026-10-18 20:11:05.530742
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7e3c5b9d14'
+down_revision = 'f2b8d6a4c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The index may already exist if the tables were created by db.create_all()
+    op.create_index('ix_quiz_subject_lower', 'quiz', [sa.text('lower(subject)')], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_quiz_subject_lower', table_name='quiz')
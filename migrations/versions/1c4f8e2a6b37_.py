@@ -0,0 +1,56 @@
+"""add question signatures for near-duplicate detection
+
+Revision ID: 1c4f8e2a6b37
+Revises: 0a7e3c5b9d14
+Create Date: 2026-10-18 21:26:48.340159
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c4f8e2a6b37'
+down_revision = '0a7e3c5b9d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() runs when the app is imported, so the tables and column may already exist on a new database
+    inspector = sa.inspect(op.get_bind())
+    if not any(column['name'] == 'canonical_id' for column in inspector.get_columns('question')):
+        # Add the column in place rather than with batch_alter_table, which recreates the table on SQLite
+        # and would cascade-delete the rows that reference it. SQLite can't add the foreign key to an existing table
+        op.add_column('question', sa.Column('canonical_id', sa.Integer(), nullable=True))
+        if op.get_bind().dialect.name != 'sqlite':
+            op.create_foreign_key('question_canonical_id_fkey', 'question', 'question',
+                                  ['canonical_id'], ['id'], ondelete='SET NULL')
+    op.create_index(op.f('ix_question_canonical_id'), 'question', ['canonical_id'], unique=False, if_not_exists=True)
+
+    if not inspector.has_table('question_signature'):
+        op.create_table('question_signature',
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('question_id')
+        )
+    if not inspector.has_table('question_bucket'):
+        op.create_table('question_bucket',
+        sa.Column('bucket', sa.BigInteger(), nullable=False),
+        sa.Column('question_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['question_id'], ['question.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bucket', 'question_id')
+        )
+    op.create_index(op.f('ix_question_bucket_question_id'), 'question_bucket', ['question_id'], unique=False,
+                    if_not_exists=True)
+    # Existing questions are indexed by `flask cluster-duplicates`
+
+
+def downgrade():
+    op.drop_table('question_bucket')
+    op.drop_table('question_signature')
+    op.drop_index(op.f('ix_question_canonical_id'), table_name='question')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('question_canonical_id_fkey', 'question', type_='foreignkey')
+    op.drop_column('question', 'canonical_id')
@@ -0,0 +1,52 @@
+"""store question and score counts
+
+Revision ID: 4c2e9a7d1b35
+Revises: 0bec4039211e
+Create Date: 2026-10-18 09:12:04.513201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2e9a7d1b35'
+down_revision = '0bec4039211e'
+branch_labels = None
+depends_on = None
+
+
+def column_exists(table_name, column_name):
+    # db.create_all() runs when the app is imported, so the columns may already exist on a new database
+    columns = sa.inspect(op.get_bind()).get_columns(table_name)
+    return any(column['name'] == column_name for column in columns)
+
+
+def upgrade():
+    if not column_exists('quiz', 'question_count'):
+        with op.batch_alter_table('quiz', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('question_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+        if not column_exists('quiz_attempt', 'answered_count'):
+            batch_op.add_column(sa.Column('answered_count', sa.Integer(), server_default='0', nullable=False))
+        if not column_exists('quiz_attempt', 'correct_count'):
+            batch_op.add_column(sa.Column('correct_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill the counts of existing rows
+    op.execute(
+        'UPDATE quiz SET question_count = '
+        '(SELECT COUNT(*) FROM question WHERE question.quiz_id = quiz.id)')
+    op.execute(
+        'UPDATE quiz_attempt SET '
+        'answered_count = (SELECT COUNT(*) FROM user_choice WHERE user_choice.attempt_id = quiz_attempt.id), '
+        'correct_count = (SELECT COUNT(*) FROM user_choice JOIN choice ON choice.id = user_choice.choice_id '
+        'WHERE user_choice.attempt_id = quiz_attempt.id AND choice.correct)')
+
+
+def downgrade():
+    # Drop the columns in place rather than with batch_alter_table, which recreates the tables on SQLite
+    # and would cascade-delete the rows that reference them
+    op.drop_column('quiz_attempt', 'correct_count')
+    op.drop_column('quiz_attempt', 'answered_count')
+    op.drop_column('quiz', 'question_count')
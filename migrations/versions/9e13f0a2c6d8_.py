@@ -0,0 +1,28 @@
+"""index quiz attempts for cursor pagination
+
+Revision ID: 9e13f0a2c6d8
+Revises: 4c2e9a7d1b35
+Create Date: 2026-10-18 11:40:27.108356
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9e13f0a2c6d8'
+down_revision = '4c2e9a7d1b35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() runs when the app is imported, so the indexes may already exist on a new database
+    op.create_index('ix_quiz_attempt_timestamp_id', 'quiz_attempt', ['timestamp', 'id'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_quiz_attempt_user_id_timestamp_id', 'quiz_attempt', ['user_id', 'timestamp', 'id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_quiz_attempt_user_id_timestamp_id', table_name='quiz_attempt')
+    op.drop_index('ix_quiz_attempt_timestamp_id', table_name='quiz_attempt')
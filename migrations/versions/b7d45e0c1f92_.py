@@ -0,0 +1,40 @@
+"""add quiz jobs
+
+Revision ID: b7d45e0c1f92
+Revises: 9e13f0a2c6d8
+Create Date: 2026-10-18 14:03:51.662410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d45e0c1f92'
+down_revision = '9e13f0a2c6d8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() runs when the app is imported, so the table may already exist on a new database
+    if sa.inspect(op.get_bind()).has_table('quiz_job'):
+        return
+
+    op.create_table('quiz_job',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('subject', sa.String(length=25), nullable=False),
+    sa.Column('question_count', sa.Integer(), nullable=False),
+    sa.Column('choice_count', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('quiz_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('quiz_job')
@@ -0,0 +1,37 @@
+"""add choice stats
+
+Revision ID: d3a81f5c7e20
+Revises: b7d45e0c1f92
+Create Date: 2026-10-18 16:27:40.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a81f5c7e20'
+down_revision = 'b7d45e0c1f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() runs when the app is imported, so the table may already exist, but without the counts of existing rows
+    if not sa.inspect(op.get_bind()).has_table('choice_stat'):
+        op.create_table('choice_stat',
+        sa.Column('choice_id', sa.Integer(), nullable=False),
+        sa.Column('pick_count', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['choice_id'], ['choice.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('choice_id')
+        )
+
+    # Backfill the pick counts from the existing user choices
+    op.execute('DELETE FROM choice_stat')
+    op.execute(
+        'INSERT INTO choice_stat (choice_id, pick_count) '
+        'SELECT choice_id, COUNT(*) FROM user_choice GROUP BY choice_id')
+
+
+def downgrade():
+    op.drop_table('choice_stat')
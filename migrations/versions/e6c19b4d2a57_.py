@@ -0,0 +1,105 @@
+"""add leaderboard stats
+
+Revision ID: e6c19b4d2a57
+Revises: d3a81f5c7e20
+Create Date: 2026-10-18 17:45:12.904318
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c19b4d2a57'
+down_revision = 'd3a81f5c7e20'
+branch_labels = None
+depends_on = None
+
+SORT_COLUMNS = ('best_score', 'average_score', 'attempt_count', 'best_streak')
+
+
+# Copied from app.leaderboard, so that this migration keeps doing the same thing if that changes
+# Lengths of the streak ending on the last of the given days and of the longest streak, given distinct days in order
+def streaks(days):
+    current_streak = best_streak = 0
+    previous_day = None
+    for day in days:
+        current_streak = current_streak + 1 if previous_day and (day - previous_day).days == 1 else 1
+        best_streak = max(best_streak, current_streak)
+        previous_day = day
+    return current_streak, best_streak
+
+
+def stats_columns():
+    return [
+        sa.Column('attempt_count', sa.Integer(), nullable=False),
+        sa.Column('best_score', sa.Float(), nullable=False),
+        sa.Column('average_score', sa.Float(), nullable=False),
+        sa.Column('current_streak', sa.Integer(), nullable=False),
+        sa.Column('best_streak', sa.Integer(), nullable=False),
+        sa.Column('last_attempt_date', sa.Date(), nullable=False),
+    ]
+
+
+def upgrade():
+    # db.create_all() runs when the app is imported, so the tables may already exist, but without the stats of existing attempts
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('user_stat'):
+        op.create_table('user_stat',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        *stats_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['user_account.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+    if not inspector.has_table('user_subject_stat'):
+        op.create_table('user_subject_stat',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=25), nullable=False),
+        *stats_columns(),
+        sa.ForeignKeyConstraint(['user_id'], ['user_account.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'subject')
+        )
+    for column in SORT_COLUMNS:
+        op.create_index(f'ix_user_stat_{column}', 'user_stat', [column, 'user_id'], if_not_exists=True)
+        op.create_index(f'ix_user_subject_stat_subject_{column}', 'user_subject_stat',
+                        ['subject', column, 'user_id'], if_not_exists=True)
+
+    # Backfill the stats from the existing attempts
+    rows = op.get_bind().execute(sa.text(
+        'SELECT quiz_attempt.user_id, quiz.subject, date(quiz_attempt.timestamp) AS day, COUNT(*), '
+        'MAX(CASE WHEN quiz.question_count > 0 THEN quiz_attempt.correct_count * 100.0 / quiz.question_count ELSE 0 END), '
+        'SUM(CASE WHEN quiz.question_count > 0 THEN quiz_attempt.correct_count * 100.0 / quiz.question_count ELSE 0 END) '
+        'FROM quiz_attempt JOIN quiz ON quiz.id = quiz_attempt.quiz_id '
+        'WHERE quiz_attempt.user_id IS NOT NULL '
+        'GROUP BY quiz_attempt.user_id, quiz.subject, day ORDER BY day')).all()
+
+    user_stats, subject_stats = {}, {}
+    for user_id, subject, day, attempt_count, best_score, total_score in rows:
+        day = day if isinstance(day, date) else date.fromisoformat(day)
+        for stats in (user_stats.setdefault(user_id, {'user_id': user_id, 'days': []}),
+                      subject_stats.setdefault((user_id, subject), {'user_id': user_id, 'subject': subject, 'days': []})):
+            stats['attempt_count'] = stats.get('attempt_count', 0) + attempt_count
+            stats['best_score'] = max(stats.get('best_score', 0), best_score)
+            stats['total_score'] = stats.get('total_score', 0) + total_score
+            if not stats['days'] or stats['days'][-1] != day:
+                stats['days'].append(day)
+
+    metadata = sa.MetaData()
+    user_stat = sa.Table('user_stat', metadata, sa.Column('user_id', sa.Integer()), *stats_columns())
+    user_subject_stat = sa.Table('user_subject_stat', metadata, sa.Column('user_id', sa.Integer()),
+                                 sa.Column('subject', sa.String(length=25)), *stats_columns())
+    for table, table_rows in ((user_stat, user_stats.values()), (user_subject_stat, subject_stats.values())):
+        for stats in table_rows:
+            days = stats.pop('days')
+            stats['average_score'] = stats.pop('total_score') / stats['attempt_count']
+            stats['current_streak'], stats['best_streak'] = streaks(days)
+            stats['last_attempt_date'] = days[-1]
+
+        op.execute(table.delete())
+        op.bulk_insert(table, list(table_rows))
+
+
+def downgrade():
+    op.drop_table('user_subject_stat')
+    op.drop_table('user_stat')
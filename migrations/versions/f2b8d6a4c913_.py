@@ -0,0 +1,68 @@
+"""add quiz search index
+
+Revision ID: f2b8d6a4c913
+Revises: e6c19b4d2a57
+Create Date: 2026-10-18 19:02:33.287645
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d6a4c913'
+down_revision = 'e6c19b4d2a57'
+branch_labels = None
+depends_on = None
+
+# Copied from app.search, so that this migration keeps creating the same index if that changes
+POSTGRESQL_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_quiz_subject_search ON quiz USING GIN (to_tsvector('english', subject))",
+    "CREATE INDEX IF NOT EXISTS ix_question_text_search ON question USING GIN (to_tsvector('english', text))",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_fts USING fts5("
+    "subject, content='quiz', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5("
+    "text, content='question', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS quiz_fts_insert AFTER INSERT ON quiz BEGIN "
+    "INSERT INTO quiz_fts(rowid, subject) VALUES (new.id, new.subject); END",
+    "CREATE TRIGGER IF NOT EXISTS quiz_fts_delete AFTER DELETE ON quiz BEGIN "
+    "INSERT INTO quiz_fts(quiz_fts, rowid, subject) VALUES ('delete', old.id, old.subject); END",
+    "CREATE TRIGGER IF NOT EXISTS quiz_fts_update AFTER UPDATE OF subject ON quiz BEGIN "
+    "INSERT INTO quiz_fts(quiz_fts, rowid, subject) VALUES ('delete', old.id, old.subject); "
+    "INSERT INTO quiz_fts(rowid, subject) VALUES (new.id, new.subject); END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_insert AFTER INSERT ON question BEGIN "
+    "INSERT INTO question_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_delete AFTER DELETE ON question BEGIN "
+    "INSERT INTO question_fts(question_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS question_fts_update AFTER UPDATE OF text ON question BEGIN "
+    "INSERT INTO question_fts(question_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO question_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+
+
+def upgrade():
+    # The index may already exist if the tables were created by db.create_all()
+    if op.get_bind().dialect.name == 'postgresql':
+        for statement in POSTGRESQL_DDL:
+            op.execute(statement)
+    elif op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+
+    # Index the existing rows (PostgreSQL indexes them when the indexes are created)
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("INSERT INTO quiz_fts(quiz_fts) VALUES ('rebuild')")
+        op.execute("INSERT INTO question_fts(question_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_question_text_search')
+        op.execute('DROP INDEX IF EXISTS ix_quiz_subject_search')
+    elif op.get_bind().dialect.name == 'sqlite':
+        for fts_table in ['question_fts', 'quiz_fts']:
+            for trigger in ['insert', 'delete', 'update']:
+                op.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{trigger}')
+            op.execute(f'DROP TABLE IF EXISTS {fts_table}')
@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import time
+import random
+import logging
+import threading
+from dotenv import load_dotenv
+load_dotenv()
+
+dirname = os.path.dirname(__file__)
+logger = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+RESPONSE_SAMPLE = os.path.join(dirname, 'response_sample.json')
+
+with open(RESPONSE_SAMPLE, 'r') as file:
+    QUIZ_SAMPLE_STRING = json.dumps(json.load(file))
+
+
+# A backend produces the raw response text for a request to generate questions,
+# which should be a JSON list in the format of response_sample.json
+# Large requests are split into chunks, and chunk is the index of the chunk being generated,
+# which backends should use to vary the questions they produce for the same subject
+# generate_async is used by the ASGI server (app/asgi.py), and by default runs generate in a thread, so backends
+# whose client can wait for the model without holding a thread should override it
+class GeneratorBackend(object):
+    name = None
+
+    def generate(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        raise NotImplementedError
+
+    async def generate_async(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        return await asyncio.to_thread(self.generate, subject=subject, question_count=question_count,
+                                       choice_count=choice_count, chunk=chunk)
+
+
+# Generates questions with Google's Gemini API
+# The client is configured and the model created once, on first use, and reused for every request after that
+class GeminiBackend(GeneratorBackend):
+    name = 'gemini'
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, model_name: str = 'gemini-pro') -> None:
+        self.api_key = api_key
+        self.model_name = model_name
+        self.model = None
+        self.lock = threading.Lock()
+
+    def get_model(self):
+        with self.lock:
+            if self.model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self.model = genai.GenerativeModel(self.model_name)
+            return self.model
+
+    def prompt(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        prompt = (f"Given the subject below, generate a series of {question_count} quiz questions on the subject."
+                  f"Each question should have {choice_count} options. There should be only 1 correct answer."
+                  f"Format your response as a JSON list as per the following example:\n"
+                  f"{QUIZ_SAMPLE_STRING}"
+                  f"\nThe subject is as follows: {subject}")
+        if chunk:
+            prompt += (f"\nThis is batch number {chunk + 1} of questions on this subject, "
+                       f"so focus on different aspects of the subject than the earlier batches would.")
+        return prompt
+
+    def generate(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        try:
+            return self.get_model().generate_content(self.prompt(subject, question_count, choice_count, chunk)).text
+        except Exception:
+            logger.exception('Error generating response from gemini')
+            raise
+
+    async def generate_async(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        try:
+            response = await self.get_model().generate_content_async(
+                self.prompt(subject, question_count, choice_count, chunk))
+            return response.text
+        except Exception:
+            logger.exception('Error generating response from gemini')
+            raise
+
+
+QUESTION_TEMPLATES = [
+    'Which of the following best describes {topic} in {subject}?',
+    'What is the main purpose of {topic} in {subject}?',
+    'Which statement about {topic} in {subject} is true?',
+    'In {subject}, what is {topic} most commonly used for?',
+    'Which of these is an example of {topic} in {subject}?',
+]
+TOPICS = ['terminology', 'history', 'key figures', 'core principles', 'common practice',
+          'measurement', 'classification', 'notable events', 'tools', 'applications']
+
+
+# Generates template-based questions locally, without any network access, for development and load testing
+# The same request always produces the same questions, and latency (plus up to jitter) seconds
+# of synthetic latency can be added to each request to simulate the model's response time
+class LocalBackend(GeneratorBackend):
+    name = 'local'
+
+    def __init__(self, latency: float = 0, jitter: float = 0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+
+    def generate(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        rng = random.Random(f'{subject}|{question_count}|{choice_count}|{chunk}')
+        if self.latency or self.jitter:
+            time.sleep(self.latency + rng.uniform(0, self.jitter))
+        return self.build_questions(rng, subject, question_count, choice_count, chunk)
+
+    async def generate_async(self, subject: str, question_count: int, choice_count: int, chunk: int = 0) -> str:
+        rng = random.Random(f'{subject}|{question_count}|{choice_count}|{chunk}')
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + rng.uniform(0, self.jitter))
+        return self.build_questions(rng, subject, question_count, choice_count, chunk)
+
+    def build_questions(self, rng: random.Random, subject: str, question_count: int, choice_count: int, chunk: int) -> str:
+        questions = []
+        for number in range(1, question_count + 1):
+            topic = TOPICS[rng.randrange(len(TOPICS))]
+            template = QUESTION_TEMPLATES[rng.randrange(len(QUESTION_TEMPLATES))]
+            correct_index = rng.randrange(choice_count)
+            questions.append({
+                'question': f'{template.format(topic=topic, subject=subject)} (#{chunk + 1}.{number})',
+                'choices': [{'text': f'{subject} {topic} option {index + 1}', 'correct': index == correct_index}
+                            for index in range(choice_count)]
+            })
+        return json.dumps(questions)
+
+
+BACKENDS = {backend.name: backend for backend in [GeminiBackend, LocalBackend]}
+
+backend = None
+backend_lock = threading.Lock()
+
+
+# The backend is chosen with the QUIZ_GENERATOR_BACKEND environment variable (gemini by default) and created once
+# The local backend's latency is set with QUIZ_GENERATOR_LATENCY and QUIZ_GENERATOR_JITTER (in seconds)
+def get_backend() -> GeneratorBackend:
+    global backend
+    with backend_lock:
+        if backend is None:
+            name = os.getenv('QUIZ_GENERATOR_BACKEND', GeminiBackend.name)
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown quiz generator backend '{name}', expected one of: {', '.join(BACKENDS)}")
+            if name == LocalBackend.name:
+                backend = LocalBackend(latency=float(os.getenv('QUIZ_GENERATOR_LATENCY', 0)),
+                                       jitter=float(os.getenv('QUIZ_GENERATOR_JITTER', 0)))
+            else:
+                backend = BACKENDS[name]()
+        return backend
+
+
+# Replace the backend, e.g. to use a LocalBackend with a particular latency in a benchmark
+def set_backend(new_backend: GeneratorBackend) -> None:
+    global backend
+    with backend_lock:
+        backend = new_backend
@@ -0,0 +1,177 @@
+import copy
+import json
+import asyncio
+import time
+import threading
+from concurrent.futures import Future
+from cachetools import TTLCache
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Text, Float, select, delete, insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+# The insert constructs of the dialects that support INSERT ... ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+# Normalize the subject so that requests differing only in case or spacing share a cache entry
+def cache_key(subject: str, question_count: int, choice_count: int) -> str:
+    normalized_subject = ' '.join(subject.lower().split())
+    return f'{normalized_subject}|{question_count}|{choice_count}'
+
+
+# Optional second cache tier that persists generated question sets in a database, so that they survive restarts
+# and are shared between server processes
+# Use a separate database (e.g. a SQLite file) rather than the app database, which is managed by Alembic
+class DatabaseCacheStore(object):
+    def __init__(self, url: str, ttl: float) -> None:
+        self.ttl = ttl
+        self.engine = create_engine(url)
+        metadata = MetaData()
+        self.table = Table('generation_cache', metadata,
+                           Column('key', String(300), primary_key=True),
+                           Column('value', Text, nullable=False),
+                           Column('expires_at', Float, nullable=False, index=True))
+        metadata.create_all(self.engine)
+
+    def get(self, key: str):
+        with self.engine.connect() as connection:
+            value = connection.scalar(select(self.table.c.value).where(
+                self.table.c.key == key, self.table.c.expires_at > time.time()))
+        return json.loads(value) if value is not None else None
+
+    # Concurrent sets of the same key (e.g. from several server processes) must not conflict, so the row is upserted
+    # on databases that support it
+    def set(self, key: str, value) -> None:
+        row = {'key': key, 'value': json.dumps(value), 'expires_at': time.time() + self.ttl}
+        with self.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.expires_at <= time.time()))
+            dialect = connection.dialect.name
+            if dialect in UPSERT_INSERTS:
+                statement = UPSERT_INSERTS[dialect](self.table).values(**row)
+                connection.execute(statement.on_conflict_do_update(
+                    index_elements=[self.table.c.key],
+                    set_={'value': statement.excluded.value, 'expires_at': statement.excluded.expires_at}))
+            else:
+                connection.execute(delete(self.table).where(self.table.c.key == key))
+                connection.execute(insert(self.table).values(**row))
+
+
+# Caches generated question sets in memory (LRU with a TTL) and optionally in a DatabaseCacheStore
+# Concurrent requests for the same key are coalesced so that only one of them calls the generator
+class GenerationCache(object):
+    def __init__(self, maxsize: int = 256, ttl: float = 3600, store: DatabaseCacheStore = None) -> None:
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl) if maxsize > 0 else None
+        self.store = store
+        self.lock = threading.Lock()
+        self.in_flight: dict[str, Future] = {}
+        self.metrics = {'memory_hits': 0, 'store_hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0}
+
+    def get_or_generate(self, key: str, generate):
+        value, future, leader = self.claim(key)
+        if future is None:
+            return value
+        # Another request is already generating this key, so wait for its result
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            value = self.store.get(key) if self.store else None
+            if value is not None:
+                self.increment('store_hits')
+            else:
+                self.increment('misses')
+                value = generate()
+                if self.store:
+                    self.write_store(key, value)
+            self.resolve(key, future, value)
+            return copy.deepcopy(value)
+        except BaseException as error:
+            self.fail(key, future, error)
+            raise
+
+    # Same as get_or_generate, for an async generate function. Waiting for the result of a concurrent request (from
+    # a thread or another task) doesn't block the event loop, and the store is read and written in a thread
+    # If the task is cancelled (e.g. the client disconnected), requests waiting for it fail with CancelledError
+    async def get_or_generate_async(self, key: str, generate):
+        value, future, leader = self.claim(key)
+        if future is None:
+            return value
+        # Shielded so that cancelling a waiting task doesn't cancel the Future that other requests are waiting for
+        if not leader:
+            return copy.deepcopy(await asyncio.shield(asyncio.wrap_future(future)))
+
+        try:
+            value = await asyncio.to_thread(self.store.get, key) if self.store else None
+            if value is not None:
+                self.increment('store_hits')
+            else:
+                self.increment('misses')
+                value = await generate()
+                if self.store:
+                    await asyncio.to_thread(self.write_store, key, value)
+            self.resolve(key, future, value)
+            return copy.deepcopy(value)
+        except BaseException as error:
+            self.fail(key, future, error)
+            raise
+
+    # Return a copy of the value in memory and no Future, or the Future of the request that is generating the key
+    # and whether it is the caller (who should then generate the value and resolve or fail the Future)
+    def claim(self, key: str):
+        with self.lock:
+            value = self.memory.get(key) if self.memory is not None else None
+            if value is not None:
+                self.metrics['memory_hits'] += 1
+                return copy.deepcopy(value), None, False
+
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+            else:
+                self.metrics['coalesced'] += 1
+            return None, future, leader
+
+    # The questions were generated, so failing to also save them in the store shouldn't fail the requests for them
+    def write_store(self, key: str, value) -> None:
+        try:
+            self.store.set(key, value)
+        except Exception as error:
+            print('Error saving generated questions to the cache store:', error)
+
+    def resolve(self, key: str, future: Future, value) -> None:
+        with self.lock:
+            if self.memory is not None:
+                self.memory[key] = value
+            del self.in_flight[key]
+        future.set_result(value)
+
+    def fail(self, key: str, future: Future, error: Exception) -> None:
+        with self.lock:
+            self.metrics['errors'] += 1
+            del self.in_flight[key]
+        future.set_exception(error)
+
+    # Look up a key without generating it on a miss (only the memory tier is checked)
+    def get(self, key: str):
+        with self.lock:
+            value = self.memory.get(key) if self.memory is not None else None
+            self.metrics['memory_hits' if value is not None else 'misses'] += 1
+        return copy.deepcopy(value) if value is not None else None
+
+    def put(self, key: str, value) -> None:
+        with self.lock:
+            if self.memory is not None:
+                self.memory[key] = value
+
+    def increment(self, metric: str) -> None:
+        with self.lock:
+            self.metrics[metric] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {**self.metrics, 'size': len(self.memory) if self.memory is not None else 0}
+
+    def clear(self) -> None:
+        with self.lock:
+            if self.memory is not None:
+                self.memory.clear()
@@ -0,0 +1,91 @@
+import os
+import re
+import random
+import struct
+import hashlib
+from array import array
+
+# Near-duplicate questions are found by comparing MinHash signatures of the shingles (runs of consecutive words)
+# of their normalized text, which estimate the Jaccard similarity of the shingle sets
+# Word shingles are used rather than character shingles so that questions that differ in a single important word
+# (e.g. 'What is 7 times 8?' and 'What is 7 times 9?') are not considered near-duplicates
+# Signatures are split into bands, and questions that share a band are candidates, so finding the candidates
+# for a question only needs one lookup per band instead of a comparison with every other question
+SHINGLE_SIZE = 2
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS_PER_BAND = SIGNATURE_SIZE // BANDS
+# Questions whose estimated similarity is at least this are near-duplicates
+DUPLICATE_THRESHOLD = float(os.getenv('QUIZ_DEDUP_THRESHOLD', 0.8))
+
+MAX_HASH = (1 << 32) - 1
+PRIME = (1 << 61) - 1
+_random = random.Random(0)
+HASH_PARAMETERS = [(_random.randrange(1, PRIME), _random.randrange(0, PRIME)) for _ in range(SIGNATURE_SIZE)]
+
+
+def normalize(text: str) -> str:
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def shingles(text: str) -> set[str]:
+    words = normalize(text).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
+
+
+def signature(text: str) -> tuple[int, ...]:
+    hashes = [stable_hash(shingle) for shingle in shingles(text)]
+    return tuple(min(((a * value + b) % PRIME) & MAX_HASH for value in hashes) for a, b in HASH_PARAMETERS)
+
+
+# Estimated Jaccard similarity of the shingles of two texts, from their signatures
+def similarity(signature_a, signature_b) -> float:
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / SIGNATURE_SIZE
+
+
+# The LSH bucket of each band of a signature, as signed 64-bit integers so that they can be stored in a BIGINT column
+def buckets(signature) -> list[int]:
+    return [int.from_bytes(hashlib.blake2b(
+        struct.pack(f'<I{ROWS_PER_BAND}I', band, *signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]),
+        digest_size=8).digest(), 'little', signed=True) for band in range(BANDS)]
+
+
+def pack_signature(signature) -> bytes:
+    return array('I', signature).tobytes()
+
+
+def unpack_signature(data: bytes) -> tuple[int, ...]:
+    return tuple(array('I', data))
+
+
+# In-memory LSH index, for finding near-duplicates among questions that are not stored yet
+class NearDuplicateIndex(object):
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD) -> None:
+        self.threshold = threshold
+        self.buckets: dict[int, list] = {}
+
+    # Return the key of an indexed text that the signature is a near-duplicate of, or None
+    def find(self, text_signature):
+        for bucket in buckets(text_signature):
+            for key, other_signature in self.buckets.get(bucket, ()):
+                if similarity(text_signature, other_signature) >= self.threshold:
+                    return key
+        return None
+
+    def add(self, key, text_signature) -> None:
+        for bucket in buckets(text_signature):
+            self.buckets.setdefault(bucket, []).append((key, text_signature))
+
+    # Add the text unless it is a near-duplicate of an indexed text, and return whether it was added
+    def add_if_new(self, text: str) -> bool:
+        text_signature = signature(text)
+        if self.find(text_signature) is not None:
+            return False
+        self.add(text, text_signature)
+        return True
@@ -1,52 +1,242 @@
 import os
 import json
+import time
+import asyncio
 import jsonschema
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from quiz_generator.backends import get_backend
+from quiz_generator.cache import GenerationCache, DatabaseCacheStore, cache_key
+from quiz_generator.dedup import NearDuplicateIndex
 load_dotenv()
 
 dirname = os.path.dirname(__file__)
 
-GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-RESPONSE_SAMPLE = os.path.join(dirname, 'response_sample.json')
 RESPONSE_SCHEMA = os.path.join(dirname, 'response_schema.json')
 
+with open(RESPONSE_SCHEMA, 'r') as schema_file:
+    SCHEMA = json.load(schema_file)
 
+# Generated question sets are cached for QUIZ_CACHE_TTL seconds, in memory (set QUIZ_CACHE_SIZE=0 to disable)
+# and optionally in the database at QUIZ_CACHE_DATABASE_URL
+QUIZ_CACHE_SIZE = int(os.getenv('QUIZ_CACHE_SIZE', 256))
+QUIZ_CACHE_TTL = float(os.getenv('QUIZ_CACHE_TTL', 3600))
+QUIZ_CACHE_DATABASE_URL = os.getenv('QUIZ_CACHE_DATABASE_URL')
+
+generation_cache = GenerationCache(
+    maxsize=QUIZ_CACHE_SIZE, ttl=QUIZ_CACHE_TTL,
+    store=DatabaseCacheStore(QUIZ_CACHE_DATABASE_URL, ttl=QUIZ_CACHE_TTL) if QUIZ_CACHE_DATABASE_URL else None)
+
+
+# Requests for more than QUIZ_GENERATOR_CHUNK_SIZE questions are split into chunks that are generated concurrently,
+# with at most QUIZ_GENERATOR_CONCURRENCY chunks being generated at a time across all requests
+QUIZ_GENERATOR_CHUNK_SIZE = int(os.getenv('QUIZ_GENERATOR_CHUNK_SIZE', 10))
+QUIZ_GENERATOR_CONCURRENCY = int(os.getenv('QUIZ_GENERATOR_CONCURRENCY', 8))
+# Number of rounds of generating chunks, so failed chunks are retried up to this number minus one times
+MAX_CHUNK_ROUNDS = 3
+
+chunk_executor = ThreadPoolExecutor(max_workers=QUIZ_GENERATOR_CONCURRENCY, thread_name_prefix='quiz-chunk')
+# The same limit for the chunks generated on the event loop of the ASGI server (app/asgi.py)
+chunk_semaphore = asyncio.Semaphore(QUIZ_GENERATOR_CONCURRENCY)
+
+
+# Identical requests (after normalizing the subject) are served from generation_cache,
+# and concurrent identical requests share a single call to the model
 def generate_questions(subject: str, question_count: int, choice_count: int):
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-pro')
+    return generation_cache.get_or_generate(
+        cache_key(subject, question_count, choice_count),
+        lambda: generate_in_chunks(subject=subject, question_count=question_count, choice_count=choice_count))
+
+
+# Generate the chunks of a large request concurrently, so that it takes about as long as generating a single chunk
+def generate_in_chunks(subject: str, question_count: int, choice_count: int):
+    return [question for questions in iter_question_chunks(subject, question_count, choice_count) for question in questions]
+
+
+# Yield the new questions of each chunk as soon as that chunk has been generated and validated
+# Near-duplicates of questions generated earlier in the request are dropped, and only the chunks that failed
+# (plus any new chunks needed to make up for dropped questions) are generated again in the next round
+# Requests that fit in a single chunk go through the same rounds, so that their dropped questions are replaced too
+def iter_question_chunks(subject: str, question_count: int, choice_count: int):
+    seen_questions = NearDuplicateIndex()
+    remaining = question_count
+    next_chunk = 0
+    failed_chunks = []  # (chunk, size) pairs
+    last_error = None
+
+    for _ in range(MAX_CHUNK_ROUNDS):
+        if remaining <= 0:
+            break
+
+        chunks, next_chunk = plan_chunks(failed_chunks, remaining, next_chunk)
+        futures = {chunk_executor.submit(request_questions, subject=subject, question_count=size,
+                                         choice_count=choice_count, chunk=chunk): (chunk, size)
+                   for chunk, size in chunks}
+
+        failed_chunks = []
+        for future in as_completed(futures):
+            try:
+                chunk_questions = future.result()
+            except Exception as error:
+                last_error = error
+                failed_chunks.append(futures[future])
+                continue
+
+            new_questions = take_new_questions(chunk_questions, remaining, seen_questions)
+            remaining -= len(new_questions)
+            if new_questions:
+                yield new_questions
+
+    check_complete(question_count, remaining, last_error)
+
+
+# Fail requests that didn't get all of their questions after MAX_CHUNK_ROUNDS, so that a short set of questions is
+# neither returned as if it were complete nor cached. Streamed requests keep the questions they were already given
+def check_complete(question_count: int, remaining: int, last_error: Exception) -> None:
+    if remaining <= 0:
+        return
+    if remaining == question_count:
+        if last_error is not None:
+            raise last_error
+        raise ValueError('generator returned no questions')
+    raise ValueError(f'generator returned only {question_count - remaining} of {question_count} questions') from last_error
+
+
+# The chunks to generate in a round: the failed chunks of the last round, then new chunks for whatever they do not cover
+# Returns the (chunk, size) pairs and the index of the next new chunk
+def plan_chunks(failed_chunks: list, remaining: int, next_chunk: int):
+    chunks = list(failed_chunks)
+    shortfall = remaining - sum(size for _, size in failed_chunks)
+    while shortfall > 0:
+        size = min(shortfall, QUIZ_GENERATOR_CHUNK_SIZE)
+        chunks.append((next_chunk, size))
+        next_chunk += 1
+        shortfall -= size
+    return chunks, next_chunk
+
+
+# The questions of a chunk that are not near-duplicates of questions already taken, up to the number still needed
+def take_new_questions(chunk_questions: list, remaining: int, seen_questions: NearDuplicateIndex) -> list:
+    new_questions = []
+    for question in chunk_questions:
+        if len(new_questions) < remaining and seen_questions.add_if_new(question['question']):
+            new_questions.append(question)
+    return new_questions
+
 
-    with open(RESPONSE_SAMPLE, 'r') as file:
-        quiz_sample = json.load(file)
-        quiz_sample_string = json.dumps(quiz_sample)
+# Same as generate_questions, for the ASGI server, where waiting for the backend (or for a concurrent identical
+# request) must not block the event loop
+async def generate_questions_async(subject: str, question_count: int, choice_count: int):
+    return await generation_cache.get_or_generate_async(
+        cache_key(subject, question_count, choice_count),
+        lambda: generate_in_chunks_async(subject=subject, question_count=question_count, choice_count=choice_count))
 
-    prompt = (f"Given the subject below, generate a series of {question_count} quiz questions on the subject."
-              f"Each question should have {choice_count} options. There should be only 1 correct answer."
-              f"Format your response as a JSON list as per the following example:\n"
-              f"{quiz_sample_string}"
-              f"\nThe subject is as follows: {subject}")
 
+# Same as generate_in_chunks, with the chunks of each round generated concurrently on the event loop
+async def generate_in_chunks_async(subject: str, question_count: int, choice_count: int):
+    seen_questions = NearDuplicateIndex()
+    questions = []
+    remaining = question_count
+    next_chunk = 0
+    failed_chunks = []
+    last_error = None
+
+    for _ in range(MAX_CHUNK_ROUNDS):
+        if remaining <= 0:
+            break
+
+        chunks, next_chunk = plan_chunks(failed_chunks, remaining, next_chunk)
+        results = await asyncio.gather(*[request_chunk_async(subject=subject, question_count=size,
+                                                             choice_count=choice_count, chunk=chunk)
+                                         for chunk, size in chunks], return_exceptions=True)
+
+        failed_chunks = []
+        for (chunk, size), result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                last_error = result
+                failed_chunks.append((chunk, size))
+                continue
+
+            new_questions = take_new_questions(result, remaining, seen_questions)
+            remaining -= len(new_questions)
+            questions.extend(new_questions)
+
+    check_complete(question_count, remaining, last_error)
+    return questions
+
+
+async def request_chunk_async(subject: str, question_count: int, choice_count: int, chunk: int):
+    async with chunk_semaphore:
+        return await request_questions_async(
+            subject=subject, question_count=question_count, choice_count=choice_count, chunk=chunk)
+
+
+# Yield the questions for a request as they are generated, for clients that want to see them before all are ready
+# Uses generation_cache like generate_questions, but does not coalesce with concurrent identical requests
+def stream_questions(subject: str, question_count: int, choice_count: int):
+    key = cache_key(subject, question_count, choice_count)
+    cached_questions = generation_cache.get(key)
+    if cached_questions is not None:
+        yield from cached_questions
+        return
+
+    questions = []
+    for chunk_questions in iter_question_chunks(subject, question_count, choice_count):
+        questions.extend(chunk_questions)
+        yield from chunk_questions
+    generation_cache.put(key, questions)
+
+
+# Functions that are called with the name of the backend, how many seconds a call to it took and whether it succeeded,
+# after every call to the backend
+backend_call_observers = []
+
+
+# Ask the backend to generate the questions, without going through the cache
+def request_questions(subject: str, question_count: int, choice_count: int, chunk: int = 0):
+    backend = get_backend()
+    started_at = time.perf_counter()
+    succeeded = False
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text
-    except Exception as error:
-        print(f'Error generating response from gemini:', error)
-        raise error
+        response_text = backend.generate(
+            subject=subject, question_count=question_count, choice_count=choice_count, chunk=chunk)
+        succeeded = True
+    finally:
+        notify_observers(backend.name, time.perf_counter() - started_at, succeeded)
+    return parse_response(response_text)
+
+
+async def request_questions_async(subject: str, question_count: int, choice_count: int, chunk: int = 0):
+    backend = get_backend()
+    started_at = time.perf_counter()
+    succeeded = False
+    try:
+        response_text = await backend.generate_async(
+            subject=subject, question_count=question_count, choice_count=choice_count, chunk=chunk)
+        succeeded = True
+    finally:
+        notify_observers(backend.name, time.perf_counter() - started_at, succeeded)
+    return parse_response(response_text)
+
+
+def notify_observers(backend_name: str, duration: float, succeeded: bool) -> None:
+    for observer in backend_call_observers:
+        observer(backend_name, duration, succeeded)
+
 
-    # Check if gemini returned output in correct format
+# Check if the backend returned output in correct format
+def parse_response(response_text: str):
     try:
         output_json = json.loads(response_text)
         validate_output(output_json)
         return output_json
-    except (json.JSONDecodeError or jsonschema.ValidationError) as error:
+    except (json.JSONDecodeError, jsonschema.ValidationError) as error:
         print('Invalid output:', error)
         raise error
 
 
 def validate_output(output):
-    with open(RESPONSE_SCHEMA, 'r') as schema_file:
-        schema = json.load(schema_file)
-    jsonschema.validate(instance=output, schema=schema)
+    jsonschema.validate(instance=output, schema=SCHEMA)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,22 @@
+import os
+import pytest
+
+# The app reads its configuration when it is imported, so select the testing preset (an in-memory SQLite database)
+# before any test imports it
+os.environ['APP_ENV'] = 'testing'
+os.environ.pop('DATABASE_URL', None)
+
+
+@pytest.fixture
+def app():
+    from app import app, db
+    from app.grading import answer_keys
+    from app.response_cache import response_cache
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Ids are reused by every test, so nothing can be cached from an earlier test
+        answer_keys.invalidate_all()
+        response_cache.invalidate_all()
+        yield app
+        db.session.remove()
@@ -0,0 +1,35 @@
+# Build the data that tests need through the models and the API, inside the app context of the app fixture
+from sqlalchemy import select
+from app import db
+from app.models import User, Quiz, Question, Choice
+
+
+def add_users(count: int) -> list[int]:
+    users = [User(username=f'user {number}') for number in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return [user.id for user in users]
+
+
+# Add a quiz with a question for each text, whose first choice is the correct one unless correct is given
+# Returns the id of the quiz and the ids of its questions, in order
+def add_quiz(subject: str, question_texts: list[str], choice_count: int = 3, correct: int = 0) -> tuple[int, list[int]]:
+    questions_with_choices = [
+        {'question': text,
+         'choices': [{'text': f'{text} choice {number}', 'correct': number == correct} for number in range(choice_count)]}
+        for text in question_texts]
+    quiz = Quiz.add_generated(subject, questions_with_choices)
+    db.session.commit()
+    question_ids = db.session.scalars(select(Question.id).where(Question.quiz_id == quiz.id).order_by(Question.id))
+    return quiz.id, list(question_ids)
+
+
+# Ids of the choices of the question, in the order they were added (so the first one is the correct one)
+def choice_ids(question_id: int) -> list[int]:
+    return list(db.session.scalars(select(Choice.id).where(Choice.question_id == question_id).order_by(Choice.id)))
+
+
+# Save an attempt at the quiz through the API, answering each question in answers with the choice it maps to
+def add_attempt(app, quiz_id: int, user_id: int, answers: dict[int, int]):
+    questions = [{'question_id': question_id, 'choice_id': choice_id} for question_id, choice_id in answers.items()]
+    return app.test_client().post(f'/quizzes/{quiz_id}/attempts?user_id={user_id}', json={'questions': questions})
@@ -0,0 +1,76 @@
+import pytest
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+@pytest.fixture
+def quizzes(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('attempts', ['first', 'second'])
+    _, other_question_ids = add_quiz('other', ['third'])
+    return {'user_id': user_id, 'quiz_id': quiz_id, 'question_ids': question_ids,
+            'other_question_id': other_question_ids[0]}
+
+
+def post_batch(app, attempts: list):
+    return app.test_client().post('/attempts/batch', json={'attempts': attempts})
+
+
+def attempt_count() -> int:
+    from app import db
+    from app.models import QuizAttempt
+    return db.session.query(QuizAttempt).count()
+
+
+# Each case is a list of (question_id, choice_id) made from the fixture, and the error it causes
+INVALID_QUESTIONS = {
+    'unknown question': (lambda q: [(999, None)], 'question 999 does not exist'),
+    'question of another quiz': (lambda q: [(q['other_question_id'], None)], 'is not in quiz'),
+    'repeated question': (lambda q: [(q['question_ids'][0], None), (q['question_ids'][0], None)],
+                          'each question can only appear once'),
+    'unknown choice': (lambda q: [(q['question_ids'][0], 999)], 'choice 999 does not exist'),
+    'choice of another question': (lambda q: [(q['question_ids'][0], choice_ids(q['question_ids'][1])[0])],
+                                   'is not a choice of question')
+}
+
+
+@pytest.mark.parametrize('case', INVALID_QUESTIONS)
+def test_invalid_batch_is_rejected(app, quizzes, case):
+    make_questions, error = INVALID_QUESTIONS[case]
+    valid_attempt = {'quiz_id': quizzes['quiz_id'], 'user_id': quizzes['user_id'],
+                     'questions': [{'question_id': quizzes['question_ids'][0]}]}
+    invalid_attempt = {'quiz_id': quizzes['quiz_id'], 'user_id': quizzes['user_id'],
+                       'questions': [{'question_id': question_id, 'choice_id': choice_id}
+                                     for question_id, choice_id in make_questions(quizzes)]}
+    response = post_batch(app, [valid_attempt, invalid_attempt])
+    assert response.status_code == 400
+    assert 'attempts[1]' in response.json['message'] and error in response.json['message']
+    # None of the attempts are saved
+    assert attempt_count() == 0
+
+
+def test_answer_to_question_not_in_attempt_is_rejected(app, quizzes):
+    first_id, second_id = quizzes['question_ids']
+    assert add_attempt(app, quizzes['quiz_id'], quizzes['user_id'], {first_id: None}).status_code == 201
+    response = post_batch(app, [{'attempt_id': 1, 'questions': [{'question_id': second_id,
+                                                                 'choice_id': choice_ids(second_id)[0]}]}])
+    assert response.status_code == 400
+    assert f'question {second_id} is not in attempt 1' in response.json['message']
+
+
+# Answering a question of an existing attempt again replaces the previous answer
+def test_answer_replaces_previous_answer(app, quizzes):
+    from app import db
+    from app.models import UserChoice
+    first_id, second_id = quizzes['question_ids']
+    first_choice_ids = choice_ids(first_id)
+    assert add_attempt(app, quizzes['quiz_id'], quizzes['user_id'],
+                       {first_id: first_choice_ids[1], second_id: None}).status_code == 201
+
+    # The last answer to a question in a submission wins
+    questions = [{'question_id': first_id, 'choice_id': first_choice_ids[2]},
+                 {'question_id': first_id, 'choice_id': first_choice_ids[0]}]
+    response = post_batch(app, [{'attempt_id': 1, 'questions': questions}])
+    assert response.status_code == 201
+    attempt = response.json['attempts'][0]
+    assert (attempt['answered_count'], attempt['correct_count']) == (1, 1)
+    assert db.session.query(UserChoice.choice_id).all() == [(first_choice_ids[0],)]
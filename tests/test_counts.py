@@ -0,0 +1,73 @@
+from sqlalchemy import text
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+# The counts of rows that existed before the count columns were added are filled in by the migration
+def test_migration_backfills_counts(app):
+    from flask_migrate import stamp, upgrade
+    from app import db
+    # Go back to the schema before the migration (the earlier migrations expect the tables to have been created already)
+    for table_name, column_name in [('quiz', 'question_count'), ('quiz_attempt', 'answered_count'),
+                                    ('quiz_attempt', 'correct_count')]:
+        db.session.execute(text(f'ALTER TABLE {table_name} DROP COLUMN {column_name}'))
+    db.session.commit()
+    stamp(revision='0bec4039211e')
+    statements = [
+        "INSERT INTO user_account (id, username) VALUES (1, 'user')",
+        "INSERT INTO quiz (id, subject, created_at) VALUES (1, 'counts', '2026-01-01 00:00:00')",
+        "INSERT INTO question (id, text, quiz_id) VALUES (1, 'first', 1), (2, 'second', 1)",
+        "INSERT INTO choice (id, text, correct, question_id) VALUES (1, 'a', 1, 1), (2, 'b', 0, 1), (3, 'c', 1, 2)",
+        "INSERT INTO quiz_attempt (id, timestamp, quiz_id, user_id) VALUES (1, '2026-01-01 00:00:00', 1, 1)",
+        "INSERT INTO attempt_question (attempt_id, question_id, sequence_number) VALUES (1, 1, 0), (1, 2, 1)",
+        "INSERT INTO user_choice (attempt_id, choice_id) VALUES (1, 2), (1, 3)"
+    ]
+    for statement in statements:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+    try:
+        upgrade(revision='4c2e9a7d1b35')
+        assert db.session.execute(text('SELECT question_count FROM quiz')).all() == [(2,)]
+        assert db.session.execute(text('SELECT answered_count, correct_count FROM quiz_attempt')).all() == [(2, 1)]
+    finally:
+        db.session.rollback()
+        db.drop_all()
+        db.session.execute(text('DROP TABLE IF EXISTS alembic_version'))
+        db.session.commit()
+
+
+def test_refresh_counts(app):
+    from app import db
+    from app.models import QuizAttempt, UserChoice
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('counts', ['first', 'second', 'third'])
+    assert add_attempt(app, quiz_id, user_id, {question_ids[0]: choice_ids(question_ids[0])[0],
+                                                question_ids[1]: None, question_ids[2]: None}).status_code == 201
+
+    # Add answers without updating the counts
+    db.session.add_all([UserChoice(attempt_id=1, choice_id=choice_ids(question_ids[1])[0]),
+                        UserChoice(attempt_id=1, choice_id=choice_ids(question_ids[2])[1])])
+    db.session.commit()
+    QuizAttempt.refresh_counts(QuizAttempt.id == 1)
+    db.session.commit()
+    quiz_attempt = db.session.get(QuizAttempt, 1)
+    assert (quiz_attempt.answered_count, quiz_attempt.correct_count) == (3, 2)
+
+
+# The stored counts are kept up to date as questions are answered and quizzes are deleted
+def test_counts_follow_changes(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('counts', ['first', 'second'])
+    client = app.test_client()
+    assert client.get(f'/quizzes/{quiz_id}').json['question_count'] == 2
+
+    response = add_attempt(app, quiz_id, user_id, {question_ids[0]: choice_ids(question_ids[0])[1], question_ids[1]: None})
+    assert (response.json['answered_count'], response.json['correct_count']) == (1, 0)
+    assert client.post(f'/attempts/1/user_choices?choice_id={choice_ids(question_ids[1])[0]}').status_code == 201
+    attempt = client.get('/attempts/1').json
+    assert (attempt['answered_count'], attempt['correct_count']) == (2, 1)
+
+    # The answers are deleted along with the choices
+    assert client.delete('/choices').status_code == 204
+    attempt = client.get('/attempts/1').json
+    assert (attempt['answered_count'], attempt['correct_count']) == (0, 0)
@@ -0,0 +1,52 @@
+from quiz_generator import dedup
+from tests.helpers import add_quiz
+
+QUESTION = 'Which planet in the solar system has the largest number of known moons?'
+# Shares 11 of its 12 shingles with QUESTION (an estimated similarity of about 0.95)
+EXTENDED_QUESTION = 'Which planet in the solar system has the largest number of known moons today?'
+# Shares 10 of the 13 shingles of the two questions (about 0.77)
+REWORDED_QUESTION = 'Which planet in the solar system has the largest number of known natural moons?'
+
+
+def test_case_and_punctuation_are_ignored():
+    assert dedup.signature(QUESTION) == dedup.signature('which PLANET in the solar system, has the largest number of '
+                                                        'known moons')
+
+
+def test_similarity_threshold():
+    assert dedup.similarity(dedup.signature(QUESTION), dedup.signature(EXTENDED_QUESTION)) >= dedup.DUPLICATE_THRESHOLD
+    assert dedup.similarity(dedup.signature(QUESTION), dedup.signature(REWORDED_QUESTION)) < dedup.DUPLICATE_THRESHOLD
+    # Questions that differ in a single important word are not near-duplicates
+    assert dedup.similarity(dedup.signature('What is 7 times 8?'), dedup.signature('What is 7 times 9?')) < \
+        dedup.DUPLICATE_THRESHOLD
+
+
+def test_index_finds_near_duplicates_above_its_threshold():
+    index = dedup.NearDuplicateIndex()
+    assert index.add_if_new(QUESTION)
+    assert not index.add_if_new(EXTENDED_QUESTION)
+    assert index.add_if_new(REWORDED_QUESTION)
+
+    strict_index = dedup.NearDuplicateIndex(threshold=0.99)
+    assert strict_index.add_if_new(QUESTION)
+    assert strict_index.add_if_new(EXTENDED_QUESTION)
+
+
+# Generated questions that are near-duplicates of questions already taken are dropped
+def test_generated_near_duplicates_are_dropped():
+    from quiz_generator.question_generator import take_new_questions
+    seen_questions = dedup.NearDuplicateIndex()
+    chunk = [{'question': text, 'choices': []} for text in [QUESTION, EXTENDED_QUESTION, REWORDED_QUESTION, 'Another?']]
+    assert [question['question'] for question in take_new_questions(chunk, 5, seen_questions)] == \
+        [QUESTION, REWORDED_QUESTION, 'Another?']
+    assert take_new_questions([{'question': QUESTION.lower(), 'choices': []}], 5, seen_questions) == []
+
+
+# Stored questions point to the earliest question they are a near-duplicate of, within a quiz and across quizzes
+def test_stored_questions_get_canonical_ids(app):
+    from app import db
+    from app.models import Question
+    _, (question_id, reworded_id) = add_quiz('astronomy', [QUESTION, REWORDED_QUESTION])
+    _, (extended_id, exact_id) = add_quiz('planets', [EXTENDED_QUESTION, QUESTION.upper()])
+    canonical_ids = dict(db.session.query(Question.id, Question.canonical_id))
+    assert canonical_ids == {question_id: None, reworded_id: None, extended_id: question_id, exact_id: question_id}
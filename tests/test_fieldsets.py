@@ -0,0 +1,45 @@
+import pytest
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+@pytest.mark.parametrize('path, message', [
+    ('/questions?fields=id,answer', 'Unknown fields: answer. Allowed fields: canonical_id, id, quiz_id, text'),
+    ('/questions?expand=choices,quiz', 'Unknown expand: quiz. Allowed expand: choices'),
+    ('/quizzes?expand=questions', 'Unknown expand: questions. Allowed expand: none'),
+    ('/quizzes/1?fields=owner', 'Unknown fields: owner'),
+    ('/attempts/1/questions?expand=choices', 'Unknown expand: choices'),
+])
+def test_unknown_names_are_rejected(app, path, message):
+    add_quiz('fieldsets', ['first'])
+    response = app.test_client().get(path)
+    assert response.status_code == 400
+    assert message in response.json['message']
+
+
+def test_fields_and_expand_pick_what_is_returned(app):
+    quiz_id, question_ids = add_quiz('fieldsets', ['first', 'second'])
+    client = app.test_client()
+
+    response = client.get('/questions?fields=id, text&expand=&per_page=1').json
+    assert response['items'] == [{'id': question_ids[0], 'text': 'first'}]
+    # Links to other pages keep the fieldset
+    assert 'fields=id,text' in response['_links']['next'] and 'expand=' in response['_links']['next']
+
+    items = client.get(f'/quizzes/{quiz_id}/questions?fields=text&seed=1').json['items']
+    assert sorted(item['text'] for item in items) == ['first', 'second']
+    assert all(set(item) == {'text', 'choices', 'choices_count'} for item in items)
+
+    # An empty fields= returns all the fields
+    assert set(client.get(f'/quizzes/{quiz_id}?fields=').json) >= {'id', 'subject', 'question_count'}
+
+
+def test_expanded_attempt_questions(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('fieldsets', ['first'])
+    assert add_attempt(app, quiz_id, user_id, {question_ids[0]: choice_ids(question_ids[0])[0]}).status_code == 201
+    client = app.test_client()
+
+    item, = client.get('/attempts/1/questions?expand=user_choice').json
+    assert 'question' not in item and item['user_choice']['correct']
+    item, = client.get('/attempts/1/questions?fields=sequence_number&expand=').json
+    assert item == {'sequence_number': 0}
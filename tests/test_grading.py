@@ -0,0 +1,38 @@
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+def test_grade_answers():
+    from app.grading import grade_answers
+    answer_key = {1: frozenset({10}), 2: frozenset({20, 21}), 3: frozenset()}
+    grading = grade_answers(answer_key, [(1, 10), (2, 22), (3, 30)])
+    assert [question['correct'] for question in grading['questions']] == [True, False, False]
+    assert grading['questions'][1]['correct_choice_ids'] == [20, 21]
+    assert (grading['answered_count'], grading['correct_count'], grading['question_count']) == (3, 1, 3)
+
+
+def test_unanswered_questions_are_not_counted_as_answered():
+    from app.grading import grade_answers
+    grading = grade_answers({1: frozenset({10}), 2: frozenset({20})}, [(1, None), (2, 20)])
+    assert grading['questions'][0] == {'question_id': 1, 'choice_id': None, 'correct': False, 'correct_choice_ids': [10]}
+    assert (grading['answered_count'], grading['correct_count'], grading['question_count']) == (1, 1, 2)
+
+
+# Questions without a correct choice are still questions of the quiz, which can't be answered correctly
+def test_question_without_correct_choice_is_counted(app):
+    from app import db
+    from app.models import Choice
+    from app.grading import answer_keys
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('grading', ['first', 'second', 'third'])
+    db.session.query(Choice).filter(Choice.question_id == question_ids[2]).update({Choice.correct: False})
+    db.session.commit()
+    answer_keys.invalidate(quiz_id)
+
+    assert answer_keys.get(quiz_id) == {question_ids[0]: frozenset({choice_ids(question_ids[0])[0]}),
+                                        question_ids[1]: frozenset({choice_ids(question_ids[1])[0]}),
+                                        question_ids[2]: frozenset()}
+    first_choices = {question_id: choice_ids(question_id)[0] for question_id in question_ids}
+    response = add_attempt(app, quiz_id, user_id, first_choices)
+    grading = response.json['grading']
+    assert (grading['answered_count'], grading['correct_count'], grading['question_count']) == (3, 2, 3)
+    assert grading['questions'][2]['correct_choice_ids'] == []
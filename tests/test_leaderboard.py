@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+def today() -> date:
+    return datetime.now(tz=timezone.utc).date()
+
+
+def stats_dict(stats) -> dict:
+    return {'attempt_count': stats.attempt_count, 'best_score': stats.best_score,
+            'average_score': pytest.approx(stats.average_score), 'current_streak': stats.current_streak,
+            'best_streak': stats.best_streak, 'last_attempt_date': stats.last_attempt_date}
+
+
+def store_stats(user_id: int, subject: str, **values):
+    from app import db
+    from app.models import UserStat, UserSubjectStat
+    db.session.add_all([UserStat(user_id=user_id, **values), UserSubjectStat(user_id=user_id, subject=subject, **values)])
+    db.session.commit()
+
+
+def stored_stats(user_id: int, subject: str) -> tuple[dict, dict]:
+    from app import db
+    from app.models import UserStat, UserSubjectStat
+    db.session.expire_all()
+    return (stats_dict(db.session.get(UserStat, user_id)),
+            stats_dict(db.session.get(UserSubjectStat, (user_id, subject))))
+
+
+def test_streaks():
+    from app.leaderboard import streaks
+    days = [date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3), date(2026, 1, 5), date(2026, 1, 6)]
+    assert streaks(days) == (2, 3)
+    assert streaks([date(2026, 1, 1)]) == (1, 1)
+
+
+# An attempt on the day after the last one extends the stored streak, and another one on the same day doesn't
+def test_attempt_extends_stored_streak(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('streaks', ['first', 'second'])
+    store_stats(user_id, 'streaks', attempt_count=1, best_score=50.0, average_score=50.0, current_streak=2,
+                best_streak=2, last_attempt_date=today() - timedelta(days=1))
+
+    correct_answers = {question_id: choice_ids(question_id)[0] for question_id in question_ids}
+    assert add_attempt(app, quiz_id, user_id, correct_answers).status_code == 201
+    expected = {'attempt_count': 2, 'best_score': 100.0, 'average_score': 75.0, 'current_streak': 3,
+                'best_streak': 3, 'last_attempt_date': today()}
+    assert stored_stats(user_id, 'streaks') == (expected, expected)
+
+    assert add_attempt(app, quiz_id, user_id, {}).status_code == 201
+    expected = {**expected, 'attempt_count': 3, 'average_score': 50.0}
+    assert stored_stats(user_id, 'streaks') == (expected, expected)
+
+
+def test_attempt_after_a_gap_restarts_streak(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('streaks', ['first', 'second'])
+    store_stats(user_id, 'streaks', attempt_count=4, best_score=100.0, average_score=100.0, current_streak=4,
+                best_streak=4, last_attempt_date=today() - timedelta(days=2))
+
+    assert add_attempt(app, quiz_id, user_id, {question_ids[0]: choice_ids(question_ids[0])[0]}).status_code == 201
+    expected = {'attempt_count': 5, 'best_score': 100.0, 'average_score': 90.0, 'current_streak': 1,
+                'best_streak': 4, 'last_attempt_date': today()}
+    assert stored_stats(user_id, 'streaks') == (expected, expected)
+
+
+# The stats applied attempt by attempt are the same as the stats recomputed from all attempts
+def test_recorded_attempts_match_recomputed_stats(app):
+    from app import db
+    from app.leaderboard import refresh_leaderboard
+    user_ids = add_users(2)
+    quiz_id, question_ids = add_quiz('history', ['first', 'second', 'third'])
+    other_quiz_id, other_question_ids = add_quiz('geography', ['fourth'])
+
+    answers = [{question_id: choice_ids(question_id)[number % 2] for question_id in question_ids[:number + 1]}
+               for number in range(3)]
+    for user_id in user_ids:
+        for attempt_answers in answers:
+            assert add_attempt(app, quiz_id, user_id, attempt_answers).status_code == 201
+    assert add_attempt(app, other_quiz_id, user_ids[0], {other_question_ids[0]: None}).status_code == 201
+    # Answer a question of an existing attempt correctly, which was answered wrongly, along with a new attempt
+    correct_choice_id = choice_ids(question_ids[1])[0]
+    response = app.test_client().post('/attempts/batch', json={'attempts': [
+        {'attempt_id': 2, 'questions': [{'question_id': question_ids[1], 'choice_id': correct_choice_id}]},
+        {'quiz_id': quiz_id, 'user_id': user_ids[1], 'questions': [{'question_id': question_ids[1]}]}
+    ]})
+    assert response.status_code == 201
+
+    keys = [(user_ids[0], 'history'), (user_ids[1], 'history'), (user_ids[0], 'geography')]
+    recorded = [stored_stats(user_id, subject) for user_id, subject in keys]
+    refresh_leaderboard()
+    db.session.commit()
+    assert recorded == [stored_stats(user_id, subject) for user_id, subject in keys]
+
+
+# A score that goes down may lower the best score, so the user's stats are recomputed from their attempts
+def test_lowered_score_is_recomputed(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('scores', ['first', 'second'])
+    correct_answers = {question_id: choice_ids(question_id)[0] for question_id in question_ids}
+    assert add_attempt(app, quiz_id, user_id, correct_answers).status_code == 201
+
+    wrong_choice_id = choice_ids(question_ids[0])[1]
+    assert app.test_client().post(f'/attempts/1/user_choices?choice_id={wrong_choice_id}').status_code == 201
+    user_stats, subject_stats = stored_stats(user_id, 'scores')
+    assert user_stats['best_score'] == subject_stats['best_score'] == 50.0
+    assert user_stats['attempt_count'] == 1
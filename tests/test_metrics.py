@@ -0,0 +1,28 @@
+import pytest
+
+
+# Number of requests recorded in the latency histogram for the endpoint and status (metrics are kept for the process)
+def request_count(app, endpoint: str, status: int) -> int:
+    series = f'http_request_duration_seconds_count{{method="GET",endpoint="{endpoint}",status="{status}"}} '
+    for line in app.test_client().get('/metrics').get_data(as_text=True).splitlines():
+        if line.startswith(series):
+            return int(line[len(series):])
+    return 0
+
+
+def test_requests_are_recorded(app):
+    count = request_count(app, 'get_quizzes', 200)
+    app.test_client().get('/quizzes')
+    assert request_count(app, 'get_quizzes', 200) == count + 1
+
+
+# Exceptions are propagated in the testing preset, so after_request handlers don't run for them
+def test_unhandled_exceptions_are_recorded_as_500(app, monkeypatch):
+    def fail():
+        raise RuntimeError('view failed')
+
+    monkeypatch.setitem(app.view_functions, 'get_users', fail)
+    count = request_count(app, 'get_users', 500)
+    with pytest.raises(RuntimeError):
+        app.test_client().get('/users')
+    assert request_count(app, 'get_users', 500) == count + 1
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import event
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+SMALL = {'users': 2, 'questions': 3, 'attempts': 2}
+LARGE = {'users': 10, 'questions': 12, 'attempts': 40}
+
+
+# Number of SQL statements run by a GET request to the path
+def count_statements(app, path: str) -> int:
+    from app import db
+    statements = []
+
+    def count(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = app.test_client().get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def statement_counts(app, volumes: dict, path: str) -> int:
+    from app import db
+    db.drop_all()
+    db.create_all()
+    user_ids = add_users(volumes['users'])
+    quiz_id, question_ids = add_quiz('query counts', [f'question {number}' for number in range(volumes['questions'])])
+    for number in range(volumes['attempts']):
+        # Each attempt answers every question, with a different choice from the previous attempt
+        answers = {question_id: choice_ids(question_id)[number % 3] for question_id in question_ids}
+        assert add_attempt(app, quiz_id, user_ids[number % len(user_ids)], answers).status_code == 201
+    return count_statements(app, path)
+
+
+# The number of statements run by each endpoint doesn't depend on how many attempts, questions or answers it returns
+@pytest.mark.parametrize('path', ['/attempts?per_page=100', '/quizzes/1/attempts?per_page=100', '/attempts/1/questions'])
+def test_query_count_is_constant(app, path):
+    assert statement_counts(app, SMALL, path) == statement_counts(app, LARGE, path)
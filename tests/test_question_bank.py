@@ -0,0 +1,57 @@
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+def sampled_texts(subject: str, question_count: int, choice_count: int = 3, user_id: int = None) -> set[str]:
+    from app.question_bank import sample_questions
+    questions = sample_questions(subject, question_count, choice_count, user_id=user_id)
+    assert all(len(question['choices']) == choice_count for question in questions)
+    return {question['question'] for question in questions}
+
+
+def mark_near_duplicate(question_id: int, canonical_id: int):
+    from app import db
+    from app.models import Question
+    db.session.get(Question, question_id).canonical_id = canonical_id
+    db.session.commit()
+
+
+def test_samples_questions_with_matching_choices(app):
+    add_quiz('Astronomy', ['first', 'second', 'third'])
+    add_quiz('ASTRONOMY', ['fourth'], choice_count=4)
+    add_quiz('Biology', ['fifth'])
+    assert sampled_texts(' Astronomy ', 5) == {'first', 'second', 'third'}
+    assert sampled_texts('astronomy', 5, choice_count=4) == {'fourth'}
+    assert len(sampled_texts('astronomy', 2)) == 2
+
+
+# Only one question of each group of near-duplicates or of questions with the same text is picked
+def test_picks_one_question_per_group(app):
+    _, question_ids = add_quiz('astronomy', ['first', 'first again', 'second'])
+    add_quiz('astronomy', ['second'])
+    mark_near_duplicate(question_ids[1], question_ids[0])
+    for _ in range(10):
+        texts = sampled_texts('astronomy', 5)
+        assert len(texts) == 2 and 'second' in texts
+
+
+# Questions the user has seen are left out, along with their near-duplicates and questions with the same text
+def test_leaves_out_questions_seen_by_user(app):
+    user_id, other_user_id = add_users(2)
+    quiz_id, question_ids = add_quiz('astronomy', ['seen', 'near-duplicate of seen', 'unseen'])
+    add_quiz('astronomy', ['seen'])
+    mark_near_duplicate(question_ids[1], question_ids[0])
+    assert add_attempt(app, quiz_id, user_id, {question_ids[0]: choice_ids(question_ids[0])[0]}).status_code == 201
+
+    assert sampled_texts('astronomy', 5, user_id=user_id) == {'unseen'}
+    assert len(sampled_texts('astronomy', 5, user_id=other_user_id)) == 2
+
+
+# When too few of the sampled candidates can be picked, the other candidates are searched too
+def test_falls_back_to_all_candidates(app, monkeypatch):
+    from app import question_bank
+    monkeypatch.setattr(question_bank, 'SAMPLE_BATCH_FACTOR', 1)
+    monkeypatch.setattr(question_bank, 'MIN_SAMPLE_BATCH', 1)
+    add_quiz('astronomy', [f'question {number}' for number in range(10)], choice_count=4)
+    add_quiz('astronomy', ['three choices'])
+    for _ in range(10):
+        assert sampled_texts('astronomy', 1) == {'three choices'}
@@ -0,0 +1,53 @@
+from tests.helpers import add_quiz
+
+
+def search(app, q: str, **args) -> dict:
+    response = app.test_client().get('/quizzes/search', query_string={'q': q, **args})
+    assert response.status_code == 200
+    return response.json
+
+
+def test_subject_matches_rank_above_question_matches(app):
+    history_id, _ = add_quiz('Roman history', ['Who was the first emperor?'])
+    geography_id, _ = add_quiz('Geography', ['Where did the Roman roads lead?', 'What is the capital of Italy?'])
+    add_quiz('Chemistry', ['What is the symbol of gold?'])
+
+    results = search(app, 'roman')['items']
+    assert [quiz['id'] for quiz in results] == [history_id, geography_id]
+    assert results[0]['rank'] > results[1]['rank']
+    # Words are stemmed, and every word of the query must match
+    assert [quiz['id'] for quiz in search(app, 'roads lead')['items']] == [geography_id]
+    assert search(app, 'roman gold')['items'] == []
+
+
+# Characters that are query syntax for FTS5 are searched for as words
+def test_query_syntax_is_not_interpreted(app):
+    quiz_id, _ = add_quiz('Logic', ['Is NOT a AND b true?'])
+    assert [quiz['id'] for quiz in search(app, 'NOT "a" AND b*')['items']] == [quiz_id]
+    assert search(app, '"*')['items'] == []
+
+
+def test_cursor_pages_through_all_results(app):
+    quiz_ids = [add_quiz(f'Music {number}', [f'Which note is number {number}?'])[0] for number in range(5)]
+    all_results = [quiz['id'] for quiz in search(app, 'music', per_page=10)['items']]
+    assert sorted(all_results) == quiz_ids
+
+    paged_results = []
+    page = search(app, 'music', per_page=2, cursor='')
+    while True:
+        assert len(page['items']) <= 2
+        paged_results += [quiz['id'] for quiz in page['items']]
+        if not page['_links']['next_cursor']:
+            break
+        page = search(app, 'music', per_page=2, cursor=page['_links']['next_cursor'])
+    assert paged_results == all_results
+
+
+# The search index is dropped along with the tables, so it doesn't match quizzes of a dropped database
+def test_recreated_database_has_new_index(app):
+    from app import db
+    add_quiz('Roman history', ['Who was the first emperor?'])
+    db.drop_all()
+    db.create_all()
+    add_quiz('Chemistry', ['What is the symbol of gold?'])
+    assert search(app, 'roman')['items'] == []
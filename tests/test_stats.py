@@ -0,0 +1,53 @@
+from tests.helpers import add_users, add_quiz, choice_ids, add_attempt
+
+
+def pick_counts() -> dict:
+    from app import db
+    from app.models import ChoiceStat
+    db.session.expire_all()
+    return {stat.choice_id: stat.pick_count for stat in db.session.query(ChoiceStat)}
+
+
+def test_add_picks_upserts_counts(app):
+    from app import db
+    from app.models import ChoiceStat
+    _, question_ids = add_quiz('stats', ['first'])
+    first, second, third = choice_ids(question_ids[0])
+    ChoiceStat.add_picks({first: 2, second: 1, third: 0})
+    ChoiceStat.add_picks({first: 1, second: -1})
+    db.session.commit()
+    assert pick_counts() == {first: 3, second: 0}
+
+
+# Answering a question again moves its pick from the previous choice to the new one
+def test_reanswering_moves_pick(app):
+    user_id, = add_users(1)
+    quiz_id, question_ids = add_quiz('stats', ['first'])
+    first, second, _ = choice_ids(question_ids[0])
+    assert add_attempt(app, quiz_id, user_id, {question_ids[0]: first}).status_code == 201
+    assert app.test_client().post(f'/attempts/1/user_choices?choice_id={second}').status_code == 201
+    assert pick_counts() == {first: 0, second: 1}
+
+    stats = app.test_client().get(f'/questions/{question_ids[0]}/stats').json
+    assert (stats['answer_count'], stats['correct_count'], stats['percent_correct']) == (1, 0, 0.0)
+    assert [choice['pick_count'] for choice in stats['choices']] == [0, 1, 0]
+
+
+def test_discrimination_index(app):
+    user_ids = add_users(4)
+    quiz_id, (first_id, second_id) = add_quiz('stats', ['first', 'second'])
+    right = {question_id: choice_ids(question_id)[0] for question_id in (first_id, second_id)}
+    wrong = {question_id: choice_ids(question_id)[1] for question_id in (first_id, second_id)}
+    client = app.test_client()
+    assert client.get(f'/quizzes/{quiz_id}/stats').json['questions'][0]['discrimination_index'] is None
+
+    # Ranked by score, the attempts are: both right, only the first right, only the second right, none right
+    # With 4 attempts the top and bottom groups each have 2 of them
+    for user_id, answers in zip(user_ids, [right, {first_id: right[first_id], second_id: wrong[second_id]},
+                                           {first_id: wrong[first_id], second_id: right[second_id]}, wrong]):
+        assert add_attempt(app, quiz_id, user_id, answers).status_code == 201
+
+    stats = client.get(f'/quizzes/{quiz_id}/stats').json
+    assert stats['attempt_count'] == 4
+    assert {question['question_id']: question['discrimination_index'] for question in stats['questions']} == \
+        {first_id: 1.0, second_id: 0.0}